@@ -3,163 +3,100 @@
 LLMモデルのパフォーマンス分析とランキング機能
 """
 
+import math
 from typing import Dict, List, Optional
 
-import pandas as pd
+from database import DatabaseManager, FixedStockAnalysis, StockSelectionAnalysis
+from request_timing import RequestTiming
 
-from database import DatabaseManager
+# 履歴ページの1ページあたりの表示件数
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
 
 class ModelAnalytics:
     """LLMモデルの統計分析クラス"""
 
     @staticmethod
-    def get_model_performance_ranking() -> List[Dict]:
-        """モデル別パフォーマンスランキングを取得"""
+    @RequestTiming.timed("analytics")
+    def get_model_performance_ranking(
+        aggregates: Optional[Dict[str, Dict[str, Dict]]] = None,
+    ) -> List[Dict]:
+        """モデル別パフォーマンスランキングを取得（モデル別集計テーブルから算出）"""
         try:
-            # データを取得
-            fixed_df = DatabaseManager.load_fixed_stock_data()
-            selection_df = DatabaseManager.load_stock_selection_data()
-
-            # AIモデル情報を取得
-            ai_models = DatabaseManager.get_ai_models()
-            model_mapping = {
-                model["model_code"]: model["display_name"] for model in ai_models
-            }
+            if aggregates is None:
+                aggregates = DatabaseManager.get_model_aggregates()
 
-            model_stats = {}
-
-            # 固定銘柄分析データの統計
-            if not fixed_df.empty:
-                for model_id in fixed_df["model_id"].unique():
-                    model_data = fixed_df[fixed_df["model_id"] == model_id]
-
-                    if model_id not in model_stats:
-                        model_stats[model_id] = {
-                            "model_name": model_mapping.get(model_id, model_id),
-                            "fixed_analyses": 0,
-                            "selection_analyses": 0,
-                            "total_analyses": 0,
-                            "fixed_win_rate": 0,
-                            "selection_win_rate": 0,
-                            "overall_win_rate": 0,
-                            "avg_prediction_accuracy": 0,
-                            "avg_return_rate": 0,
-                            "total_profit_loss": 0,
-                            "best_trade_return": 0,
-                            "worst_trade_return": 0,
-                        }
-
-                    # 固定銘柄分析の統計
-                    model_stats[model_id]["fixed_analyses"] = len(model_data)
-                    model_stats[model_id]["fixed_win_rate"] = (
-                        model_data["return_rate"] > 0
-                    ).mean() * 100
-                    model_stats[model_id]["avg_prediction_accuracy"] = model_data[
-                        "prediction_accuracy"
-                    ].mean()
-
-                    # 全体統計に加算
-                    fixed_returns = model_data["return_rate"].tolist()
-                    fixed_profits = model_data["profit_loss"].sum()
-
-                    model_stats[model_id]["avg_return_rate"] = model_data[
-                        "return_rate"
-                    ].mean()
-                    model_stats[model_id]["total_profit_loss"] += fixed_profits
-
-                    if fixed_returns:
-                        model_stats[model_id]["best_trade_return"] = max(
-                            model_stats[model_id]["best_trade_return"],
-                            max(fixed_returns),
-                        )
-                        model_stats[model_id]["worst_trade_return"] = min(
-                            model_stats[model_id]["worst_trade_return"],
-                            min(fixed_returns),
-                        )
-
-            # 銘柄選定分析データの統計
-            if not selection_df.empty:
-                for model_id in selection_df["model_id"].unique():
-                    model_data = selection_df[selection_df["model_id"] == model_id]
-
-                    if model_id not in model_stats:
-                        model_stats[model_id] = {
-                            "model_name": model_mapping.get(model_id, model_id),
-                            "fixed_analyses": 0,
-                            "selection_analyses": 0,
-                            "total_analyses": 0,
-                            "fixed_win_rate": 0,
-                            "selection_win_rate": 0,
-                            "overall_win_rate": 0,
-                            "avg_prediction_accuracy": 0,
-                            "avg_return_rate": 0,
-                            "total_profit_loss": 0,
-                            "best_trade_return": 0,
-                            "worst_trade_return": 0,
-                        }
-
-                    # 銘柄選定分析の統計
-                    model_stats[model_id]["selection_analyses"] = len(model_data)
-                    model_stats[model_id]["selection_win_rate"] = (
-                        model_data["return_rate"] > 0
-                    ).mean() * 100
-
-                    # 全体統計に加算（平均を再計算）
-                    all_returns = []
-                    all_profits = 0
-
-                    # 固定銘柄分析のデータも含める
-                    if not fixed_df.empty and model_id in fixed_df["model_id"].values:
-                        fixed_model_data = fixed_df[fixed_df["model_id"] == model_id]
-                        all_returns.extend(fixed_model_data["return_rate"].tolist())
-                        all_profits += fixed_model_data["profit_loss"].sum()
-
-                    # 銘柄選定分析のデータを追加
-                    all_returns.extend(model_data["return_rate"].tolist())
-                    all_profits += model_data["profit_loss"].sum()
-
-                    if all_returns:
-                        model_stats[model_id]["avg_return_rate"] = sum(
-                            all_returns
-                        ) / len(all_returns)
-                        model_stats[model_id]["overall_win_rate"] = (
-                            sum(1 for r in all_returns if r > 0)
-                            / len(all_returns)
-                            * 100
-                        )
-                        model_stats[model_id]["best_trade_return"] = max(all_returns)
-                        model_stats[model_id]["worst_trade_return"] = min(all_returns)
-
-                    model_stats[model_id]["total_profit_loss"] = all_profits
-
-            # 総分析数を計算
-            for model_id in model_stats:
-                model_stats[model_id]["total_analyses"] = (
-                    model_stats[model_id]["fixed_analyses"]
-                    + model_stats[model_id]["selection_analyses"]
-                )
+            # AIモデルの表示名マッピングを取得（キャッシュ済み）
+            model_mapping = DatabaseManager.get_model_mapping()
+
+            fixed_aggregates = aggregates["fixed"]
+            selection_aggregates = aggregates["selection"]
 
-            # ランキング用のリストに変換
             ranking = []
-            for model_id, stats in model_stats.items():
+            for model_id in list(
+                dict.fromkeys(list(fixed_aggregates) + list(selection_aggregates))
+            ):
+                fixed = fixed_aggregates.get(model_id)
+                selection = selection_aggregates.get(model_id)
+                parts = [part for part in (fixed, selection) if part]
+
+                fixed_analyses = fixed["count"] if fixed else 0
+                selection_analyses = selection["count"] if selection else 0
+                total_analyses = fixed_analyses + selection_analyses
+                total_wins = sum(part["win_count"] for part in parts)
+
+                fixed_win_rate = (
+                    fixed["win_count"] / fixed_analyses * 100 if fixed_analyses else 0
+                )
+                selection_win_rate = (
+                    selection["win_count"] / selection_analyses * 100
+                    if selection_analyses
+                    else 0
+                )
+
+                avg_prediction_accuracy = 0
+                if fixed and fixed["prediction_accuracy_count"]:
+                    avg_prediction_accuracy = (
+                        fixed["sum_prediction_accuracy"]
+                        / fixed["prediction_accuracy_count"]
+                    )
+
+                # 騰落率の標準偏差（二乗和から算出）
+                avg_return_rate = (
+                    sum(part["sum_return_rate"] for part in parts) / total_analyses
+                )
+                return_variance = (
+                    sum(part["sum_sq_return_rate"] for part in parts) / total_analyses
+                    - avg_return_rate**2
+                )
+
                 ranking.append(
                     {
                         "model_id": model_id,
-                        "model_name": stats["model_name"],
-                        "total_analyses": stats["total_analyses"],
-                        "fixed_analyses": stats["fixed_analyses"],
-                        "selection_analyses": stats["selection_analyses"],
-                        "overall_win_rate": round(stats["overall_win_rate"], 1),
-                        "fixed_win_rate": round(stats["fixed_win_rate"], 1),
-                        "selection_win_rate": round(stats["selection_win_rate"], 1),
-                        "avg_prediction_accuracy": round(
-                            stats["avg_prediction_accuracy"], 1
+                        "model_name": model_mapping.get(model_id, model_id),
+                        "total_analyses": total_analyses,
+                        "fixed_analyses": fixed_analyses,
+                        "selection_analyses": selection_analyses,
+                        "overall_win_rate": round(
+                            total_wins / total_analyses * 100, 1
+                        ),
+                        "fixed_win_rate": round(fixed_win_rate, 1),
+                        "selection_win_rate": round(selection_win_rate, 1),
+                        "avg_prediction_accuracy": round(avg_prediction_accuracy, 1),
+                        "avg_return_rate": round(avg_return_rate, 2),
+                        "return_rate_std": round(
+                            math.sqrt(max(return_variance, 0.0)), 2
+                        ),
+                        "total_profit_loss": round(
+                            sum(part["sum_profit_loss"] for part in parts), 0
+                        ),
+                        "best_trade_return": round(
+                            max(part["max_return_rate"] for part in parts), 2
+                        ),
+                        "worst_trade_return": round(
+                            min(part["min_return_rate"] for part in parts), 2
                         ),
-                        "avg_return_rate": round(stats["avg_return_rate"], 2),
-                        "total_profit_loss": round(stats["total_profit_loss"], 0),
-                        "best_trade_return": round(stats["best_trade_return"], 2),
-                        "worst_trade_return": round(stats["worst_trade_return"], 2),
                     }
                 )
 
@@ -173,6 +110,7 @@ class ModelAnalytics:
             return []
 
     @staticmethod
+    @RequestTiming.timed("analytics")
     def get_filtered_data(
         data_type: str = "all",
         model_id: Optional[str] = None,
@@ -182,96 +120,105 @@ class ModelAnalytics:
         max_return: Optional[float] = None,
         sort_by: str = "created_at",
         sort_order: str = "desc",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        fixed_cursor: Optional[str] = None,
+        selection_cursor: Optional[str] = None,
+        aggregates: Optional[Dict[str, Dict[str, Dict]]] = None,
     ) -> Dict:
-        """フィルタ条件に基づいてデータを取得"""
-        try:
-            fixed_df = DatabaseManager.load_fixed_stock_data()
-            selection_df = DatabaseManager.load_stock_selection_data()
+        """フィルタ条件に基づいてデータを取得（SQLでフィルタ・ソートし1ページ分のみ読み込み）
 
-            # AIモデル情報を取得
-            ai_models = DatabaseManager.get_ai_models()
-            model_mapping = {
-                model["model_code"]: model["display_name"] for model in ai_models
-            }
+        モデル以外の絞り込みがない場合、件数は集計テーブル（aggregates）から求める。
+        """
+        empty_page = {"records": [], "next_cursor": None, "total": 0}
+        try:
+            # AIモデルの表示名マッピングを取得（キャッシュ済み）
+            model_mapping = DatabaseManager.get_model_mapping()
+
+            # 期間・騰落率の絞り込みがなければ件数は集計テーブルと一致する
+            counts_from_summary = not (
+                start_date or end_date or min_return is not None or max_return is not None
+            )
+            if counts_from_summary and aggregates is None:
+                aggregates = DatabaseManager.get_model_aggregates()
+
+            def load_page(model, analysis_type, cursor):
+                total = None
+                if counts_from_summary and aggregates[analysis_type]:
+                    total = sum(
+                        stat["count"]
+                        for stat_model_id, stat in aggregates[analysis_type].items()
+                        if not model_id or stat_model_id == model_id
+                    )
 
-            # フィルタリング処理
-            def apply_filters(df):
-                if df.empty:
-                    return df
-
-                # モデルIDでフィルタリング
-                if model_id:
-                    df = df[df["model_id"] == model_id]
-
-                # 日付範囲でフィルタリング
-                if start_date:
-                    start_date_obj = pd.to_datetime(start_date)
-                    df = df[pd.to_datetime(df["execution_date"]) >= start_date_obj]
-
-                if end_date:
-                    end_date_obj = pd.to_datetime(end_date)
-                    df = df[pd.to_datetime(df["execution_date"]) <= end_date_obj]
-
-                # 騰落率範囲でフィルタリング
-                if min_return is not None:
-                    df = df[df["return_rate"] >= min_return]
-
-                if max_return is not None:
-                    df = df[df["return_rate"] <= max_return]
-
-                return df
-
-            # データタイプに応じてフィルタリング
-            if data_type == "fixed":
-                fixed_df = apply_filters(fixed_df)
-                selection_df = pd.DataFrame()
-            elif data_type == "selection":
-                selection_df = apply_filters(selection_df)
-                fixed_df = pd.DataFrame()
-            else:  # "all"
-                fixed_df = apply_filters(fixed_df)
-                selection_df = apply_filters(selection_df)
-
-            # モデル名を追加
-            if not fixed_df.empty:
-                fixed_df["model_display_name"] = (
-                    fixed_df["model_id"].map(model_mapping).fillna(fixed_df["model_id"])
+                conditions = DatabaseManager.analysis_filter_conditions(
+                    model,
+                    model_id=model_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    min_return=min_return,
+                    max_return=max_return,
                 )
-                # ソート処理
-                if sort_by in fixed_df.columns:
-                    ascending = sort_order == "asc"
-                    fixed_df = fixed_df.sort_values(by=sort_by, ascending=ascending)
-
-            if not selection_df.empty:
-                selection_df["model_display_name"] = (
-                    selection_df["model_id"]
-                    .map(model_mapping)
-                    .fillna(selection_df["model_id"])
+                page = DatabaseManager.load_analysis_page(
+                    model,
+                    conditions,
+                    sort_by=sort_by,
+                    sort_order=sort_order,
+                    page_size=page_size,
+                    cursor=cursor,
+                    total=total,
+                    count_key=(
+                        analysis_type,
+                        model_id,
+                        start_date,
+                        end_date,
+                        min_return,
+                        max_return,
+                    ),
                 )
-                # ソート処理
-                if sort_by in selection_df.columns:
-                    ascending = sort_order == "asc"
-                    selection_df = selection_df.sort_values(
-                        by=sort_by, ascending=ascending
+                # モデル名を追加
+                for record in page["records"]:
+                    record["model_display_name"] = model_mapping.get(
+                        record["model_id"], record["model_id"]
                     )
+                return page
+
+            # データタイプに応じて取得
+            fixed_page = (
+                load_page(FixedStockAnalysis, "fixed", fixed_cursor)
+                if data_type in ("all", "fixed")
+                else empty_page
+            )
+            selection_page = (
+                load_page(StockSelectionAnalysis, "selection", selection_cursor)
+                if data_type in ("all", "selection")
+                else empty_page
+            )
 
             return {
-                "fixed_data": fixed_df.to_dict("records") if not fixed_df.empty else [],
-                "selection_data": selection_df.to_dict("records")
-                if not selection_df.empty
-                else [],
-                "total_records": len(fixed_df) + len(selection_df),
+                "fixed_data": fixed_page["records"],
+                "selection_data": selection_page["records"],
+                "fixed_next_cursor": fixed_page["next_cursor"],
+                "selection_next_cursor": selection_page["next_cursor"],
+                "total_records": fixed_page["total"] + selection_page["total"],
             }
 
         except Exception as e:
             print(f"フィルタリングエラー: {str(e)}")
-            return {"fixed_data": [], "selection_data": [], "total_records": 0}
+            return {
+                "fixed_data": [],
+                "selection_data": [],
+                "fixed_next_cursor": None,
+                "selection_next_cursor": None,
+                "total_records": 0,
+            }
 
     @staticmethod
-    def get_model_comparison_chart_data() -> Dict:
+    @RequestTiming.timed("analytics")
+    def get_model_comparison_chart_data(ranking: Optional[List[Dict]] = None) -> Dict:
         """モデル比較チャート用のデータを取得"""
         try:
-            ranking = ModelAnalytics.get_model_performance_ranking()
+            if ranking is None:
+                ranking = ModelAnalytics.get_model_performance_ranking()
 
             if not ranking:
                 return {"labels": [], "win_rates": [], "accuracies": [], "returns": []}
@@ -291,3 +238,25 @@ class ModelAnalytics:
         except Exception as e:
             print(f"チャートデータ取得エラー: {str(e)}")
             return {"labels": [], "win_rates": [], "accuracies": [], "returns": []}
+
+    @staticmethod
+    @RequestTiming.timed("analytics")
+    def get_history_page_data(**filters) -> Dict:
+        """履歴分析ページに必要なデータを1回の読み込みでまとめて取得"""
+        ai_models = DatabaseManager.get_ai_models()
+        aggregates = DatabaseManager.get_model_aggregates()
+
+        filtered_data = ModelAnalytics.get_filtered_data(aggregates=aggregates, **filters)
+        model_ranking = ModelAnalytics.get_model_performance_ranking(
+            aggregates=aggregates
+        )
+
+        return {
+            "filtered_data": filtered_data,
+            "model_ranking": model_ranking,
+            "chart_data": ModelAnalytics.get_model_comparison_chart_data(
+                ranking=model_ranking
+            ),
+            "stats": DatabaseManager.get_summary_stats(aggregates=aggregates),
+            "ai_models": ai_models,
+        }
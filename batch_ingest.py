@@ -0,0 +1,319 @@
+"""
+分析データの一括登録
+週次のLLM回答など複数の固定銘柄分析・銘柄選定分析をJSONでまとめて受け付け、
+全銘柄の株価を1回でまとめて取得して計算し、1トランザクションで保存する
+
+サンプル銘柄以外で株価を取得できなかったレコードは、価格を補完せずにエラーとする
+"""
+
+import re
+from datetime import date, datetime, timedelta
+from typing import Annotated, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pydantic import AfterValidator, BaseModel, Field, field_validator, model_validator
+
+from stock_analyzer import SAMPLE_STOCK_CODES, StockAnalyzer
+from trading_calendar import TradingCalendar
+
+# 銘柄選定分析の分析期間 -> 売却日までの日数
+ANALYSIS_PERIOD_DAYS = {
+    "1週間": 7,
+    "1ヶ月": 30,
+    "3ヶ月": 90,
+    "6ヶ月": 180,
+    "1年": 365,
+}
+
+# 1リクエストで受け付ける最大件数
+MAX_BATCH_RECORDS = 500
+
+
+def normalize_stock_code(stock_code: str) -> str:
+    """銘柄コードの整形（数字のみ取り出し、4桁でなければValueError）"""
+    stock_code = re.sub(r"[^0-9]", "", stock_code.strip())
+    if len(stock_code) != 4:
+        raise ValueError("銘柄コードは4桁の数字で入力してください。")
+    return stock_code
+
+
+StockCode = Annotated[str, AfterValidator(normalize_stock_code)]
+
+
+class FixedStockRecord(BaseModel):
+    """固定銘柄分析（最高値・最安値・週末終値の予測）1件"""
+
+    model_id: str = Field(min_length=1)
+    stock_code: StockCode
+    buy_date: date
+    sell_date: date
+    predicted_high: float = Field(gt=0)
+    predicted_low: float = Field(gt=0)
+    predicted_close: float = Field(gt=0)
+    notes: str = ""
+
+    @model_validator(mode="after")
+    def check_predictions(self) -> "FixedStockRecord":
+        if self.predicted_low > self.predicted_high:
+            raise ValueError("最安値は最高値より低い値を入力してください。")
+        if not self.predicted_low <= self.predicted_close <= self.predicted_high:
+            raise ValueError("週末終値予想は最安値と最高値の間の値を入力してください。")
+        if self.buy_date >= self.sell_date:
+            raise ValueError("売却日は購入日より後の日付を選択してください。")
+        return self
+
+
+class StockSelectionRecord(BaseModel):
+    """銘柄選定分析（LLMが選んだ銘柄）1件"""
+
+    analysis_period: str
+    model_id: str = Field(min_length=1)
+    stock_code: StockCode
+    selection_reason: str = Field(min_length=1)
+    buy_date: date
+    notes: str = ""
+
+    @field_validator("analysis_period")
+    @classmethod
+    def check_analysis_period(cls, value: str) -> str:
+        if value not in ANALYSIS_PERIOD_DAYS:
+            raise ValueError("有効な分析期間を選択してください。")
+        return value
+
+    @property
+    def sell_date(self) -> date:
+        return self.buy_date + timedelta(days=ANALYSIS_PERIOD_DAYS[self.analysis_period])
+
+
+class BatchSubmission(BaseModel):
+    """一括登録のリクエスト"""
+
+    fixed_stock: List[FixedStockRecord] = []
+    stock_selection: List[StockSelectionRecord] = []
+
+    @model_validator(mode="after")
+    def check_size(self) -> "BatchSubmission":
+        total = len(self.fixed_stock) + len(self.stock_selection)
+        if total == 0:
+            raise ValueError("登録するデータがありません。")
+        if total > MAX_BATCH_RECORDS:
+            raise ValueError(f"一度に登録できるのは{MAX_BATCH_RECORDS}件までです。")
+        return self
+
+
+class BatchIngest:
+    """一括登録の株価取得・計算"""
+
+    @staticmethod
+    def price_windows(submission: BatchSubmission) -> Dict[str, Tuple[str, str]]:
+        """銘柄コード -> 全レコードの期間をまとめた(開始日, 終了日)"""
+        windows: Dict[str, Tuple[date, date]] = {}
+        records = [*submission.fixed_stock, *submission.stock_selection]
+        for record in records:
+            start, end = windows.get(
+                record.stock_code, (record.buy_date, record.sell_date)
+            )
+            windows[record.stock_code] = (
+                min(start, record.buy_date),
+                max(end, record.sell_date),
+            )
+        return {
+            stock_code: (start.isoformat(), end.isoformat())
+            for stock_code, (start, end) in windows.items()
+        }
+
+    @staticmethod
+    def build_rows(
+        submission: BatchSubmission, bars_by_code: Dict[str, pd.DataFrame]
+    ) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """保存する行を計算し、(固定銘柄分析, 銘柄選定分析, エラー)を返す
+
+        bars_by_codeはprice_windowsの期間でStockAnalyzer.load_bars_bulkが読み込んだ株価。
+        """
+        execution_date = datetime.now()
+        errors: List[Dict] = []
+
+        # 全レコードの購入日・売却日の株価を1回で解決
+        records = [*submission.fixed_stock, *submission.stock_selection]
+        prices, actual_dates = StockAnalyzer.get_prices_bulk(
+            [record.stock_code for record in records],
+            [record.buy_date.isoformat() for record in records]
+            + [record.sell_date.isoformat() for record in records],
+            bars_by_code,
+        )
+
+        fixed_rows = []
+        for index, record in enumerate(submission.fixed_stock):
+            try:
+                fixed_rows.append(
+                    BatchIngest._fixed_stock_row(
+                        record,
+                        prices,
+                        actual_dates,
+                        bars_by_code.get(record.stock_code),
+                        execution_date,
+                    )
+                )
+            except ValueError as e:
+                errors.append(
+                    {"section": "fixed_stock", "index": index, "message": str(e)}
+                )
+
+        selection_rows = []
+        for index, record in enumerate(submission.stock_selection):
+            try:
+                selection_rows.append(
+                    BatchIngest._stock_selection_row(
+                        record, prices, actual_dates, execution_date
+                    )
+                )
+            except ValueError as e:
+                errors.append(
+                    {"section": "stock_selection", "index": index, "message": str(e)}
+                )
+
+        BatchIngest._score_fixed_rows(fixed_rows)
+        return fixed_rows, selection_rows, errors
+
+    @staticmethod
+    def _resolve_prices(
+        prices: pd.DataFrame,
+        actual_dates: pd.DataFrame,
+        stock_code: str,
+        buy_date: str,
+        sell_date: str,
+    ) -> Tuple[float, str, float, str]:
+        """購入日・売却日（またはその直後の営業日）の株価を取得（取得できなければValueError）"""
+        buy_price = prices.at[buy_date, stock_code]
+        if pd.isna(buy_price):
+            raise ValueError(f"銘柄コード {stock_code} の購入日の株価データを取得できませんでした。")
+
+        sell_price = prices.at[sell_date, stock_code]
+        if pd.isna(sell_price):
+            raise ValueError(f"銘柄コード {stock_code} の売却日の株価データを取得できませんでした。")
+
+        return (
+            float(buy_price),
+            actual_dates.at[buy_date, stock_code],
+            float(sell_price),
+            actual_dates.at[sell_date, stock_code],
+        )
+
+    @staticmethod
+    def _fixed_stock_row(
+        record: FixedStockRecord,
+        prices: pd.DataFrame,
+        actual_dates: pd.DataFrame,
+        bars: Optional[pd.DataFrame],
+        execution_date: datetime,
+    ) -> Dict:
+        """固定銘柄分析の1行（精度・スコアは_score_fixed_rowsでまとめて計算）"""
+        buy_date = record.buy_date.isoformat()
+        sell_date = record.sell_date.isoformat()
+        buy_price, actual_buy_date, sell_price, actual_sell_date = (
+            BatchIngest._resolve_prices(
+                prices, actual_dates, record.stock_code, buy_date, sell_date
+            )
+        )
+
+        if record.stock_code in SAMPLE_STOCK_CODES:
+            actual_high, actual_low = StockAnalyzer._get_sample_high_low(
+                buy_price, sell_price
+            )
+        else:
+            high, low = StockAnalyzer.get_period_high_lows(
+                bars, np.array([buy_date]), np.array([sell_date])
+            )
+            actual_high, actual_low = float(high[0]), float(low[0])
+            if np.isnan(actual_high) or np.isnan(actual_low):
+                # フォールバック: 購入・売却価格から推定
+                actual_high = max(buy_price, sell_price) * 1.01
+                actual_low = min(buy_price, sell_price) * 0.99
+
+        return {
+            "execution_date": execution_date,
+            "model_id": record.model_id,
+            "stock_code": record.stock_code,
+            "buy_date": actual_buy_date,
+            "buy_price": buy_price,
+            "sell_date": actual_sell_date,
+            "sell_price": sell_price,
+            "predicted_high": record.predicted_high,
+            "predicted_low": record.predicted_low,
+            "predicted_close": record.predicted_close,
+            "predicted_price": record.predicted_close,
+            "actual_high": actual_high,
+            "actual_low": actual_low,
+            "profit_loss": sell_price - buy_price,
+            "period_days": TradingCalendar.period_days(record.buy_date, record.sell_date),
+            "notes": record.notes,
+        }
+
+    @staticmethod
+    def _score_fixed_rows(rows: List[Dict]) -> None:
+        """騰落率・各予測精度・総合スコアを配列単位で計算して各行に設定"""
+        if not rows:
+            return
+
+        def column(name: str) -> List[float]:
+            return [row[name] for row in rows]
+
+        return_rates = StockAnalyzer.calculate_return_rates(
+            column("buy_price"), column("sell_price")
+        )
+        close_accuracies = StockAnalyzer.calculate_prediction_accuracies(
+            column("sell_price"), column("predicted_close")
+        )
+        high_accuracies = StockAnalyzer.calculate_prediction_accuracies(
+            column("actual_high"), column("predicted_high")
+        )
+        low_accuracies = StockAnalyzer.calculate_prediction_accuracies(
+            column("actual_low"), column("predicted_low")
+        )
+        overall_scores = StockAnalyzer.calculate_overall_prediction_scores(
+            high_accuracies, low_accuracies, close_accuracies
+        )
+
+        for position, row in enumerate(rows):
+            row["return_rate"] = float(return_rates[position])
+            row["prediction_accuracy"] = float(close_accuracies[position])
+            row["high_prediction_accuracy"] = float(high_accuracies[position])
+            row["low_prediction_accuracy"] = float(low_accuracies[position])
+            row["overall_prediction_score"] = float(overall_scores[position])
+
+    @staticmethod
+    def _stock_selection_row(
+        record: StockSelectionRecord,
+        prices: pd.DataFrame,
+        actual_dates: pd.DataFrame,
+        execution_date: datetime,
+    ) -> Dict:
+        """銘柄選定分析の1行"""
+        buy_price, actual_buy_date, sell_price, actual_sell_date = (
+            BatchIngest._resolve_prices(
+                prices,
+                actual_dates,
+                record.stock_code,
+                record.buy_date.isoformat(),
+                record.sell_date.isoformat(),
+            )
+        )
+
+        return {
+            "execution_date": execution_date,
+            "analysis_period": record.analysis_period,
+            "model_id": record.model_id,
+            "stock_code": record.stock_code,
+            "selection_reason": record.selection_reason,
+            "buy_date": actual_buy_date,
+            "buy_price": buy_price,
+            "sell_date": actual_sell_date,
+            "sell_price": sell_price,
+            "profit_loss": sell_price - buy_price,
+            "return_rate": StockAnalyzer.calculate_return_rate(buy_price, sell_price),
+            "period_days": TradingCalendar.period_days(
+                actual_buy_date, actual_sell_date
+            ),
+            "notes": record.notes,
+        }
@@ -0,0 +1,352 @@
+"""
+性能ベンチマーク
+合成した分析データをベンチマーク用DBに投入し、履歴ページの集計・一覧取得、
+各エクスポート、スコア計算の処理時間を規模別に計測してJSONに保存する
+
+株価は合成データプロバイダを使用するため、ネットワークには接続しない。
+ベンチマーク用DBの分析データは毎回削除して投入し直すため、本番DBは指定しないこと。
+
+コマンドラインから実行:
+    python benchmark.py [--rows 1000 100000 1000000] [--repeat 5]
+                        [--output ./benchmark_results.json]
+    python benchmark.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+# ベンチマーク用DB（DATABASE_URLとは別に指定し、本番DBを誤って初期化しないようにする）
+BENCHMARK_DATABASE_URL = os.getenv("BENCHMARK_DATABASE_URL", "sqlite:///./benchmark.db")
+os.environ["DATABASE_URL"] = BENCHMARK_DATABASE_URL
+
+import numpy as np
+
+from analytics import ModelAnalytics
+from database import DatabaseManager, engine
+from main import (
+    export_ai_models,
+    export_all_data,
+    export_fixed_stock,
+    export_stock_selection,
+)
+from price_providers import build_price_provider, set_price_provider
+from stock_analyzer import PriceContext, StockAnalyzer
+from synthetic_history import SyntheticHistory
+
+# 計測する規模（両テーブルの合計行数）
+BENCHMARK_ROWS = [1000, 100000, 1000000]
+
+# 各処理の計測回数
+BENCHMARK_REPEAT = 5
+
+# 結果の保存先
+BENCHMARK_OUTPUT_PATH = "./benchmark_results.json"
+
+# 投入データの乱数シード
+SEED = 0
+
+# 比較時に遅くなったとみなす比率
+REGRESSION_THRESHOLD = 1.2
+
+# 株価参照の計測に使う銘柄コード
+PRICE_LOOKUP_STOCK_CODES = [str(code) for code in range(1301, 1301 + 200)]
+
+
+class Benchmark:
+    """処理時間の計測"""
+
+    @staticmethod
+    def measure(
+        name: str, func: Callable[[], object], repeat: int, rows: int
+    ) -> Dict:
+        """関数をrepeat回実行し、処理時間（ミリ秒）の統計を返す"""
+        # 処理中のログ出力は計測のばらつきになるため捨てる
+        with contextlib.redirect_stdout(io.StringIO()):
+            # 1回目はキャッシュ・接続の準備を含むため計測に含めない
+            detail = func()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                detail = func()
+                timings.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            "name": name,
+            "rows": rows,
+            "repeat": repeat,
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "detail": detail,
+        }
+        print(f"  {name}: {result['median_ms']:.1f}ms (min {result['min_ms']:.1f}ms)")
+        return result
+
+    @staticmethod
+    def seed(rows: int) -> None:
+        """分析データを削除し、合成分析履歴rows行（両テーブルの合計）を投入"""
+        fixed_rows = rows // 2
+        SyntheticHistory.populate(
+            fixed_rows=fixed_rows,
+            selection_rows=rows - fixed_rows,
+            seed=SEED,
+            truncate=True,
+        )
+
+    @staticmethod
+    def run_scale(rows: int, repeat: int) -> List[Dict]:
+        """1つの規模でデータを投入し、全ての処理を計測"""
+        print(f"📦 {rows}行を投入中...")
+        started = time.perf_counter()
+        Benchmark.seed(rows)
+        print(f"   投入完了: {time.perf_counter() - started:.1f}秒")
+
+        model_id = DatabaseManager.get_ai_models()[0]["model_code"]
+        results = []
+
+        def add(name: str, func: Callable[[], object]) -> None:
+            results.append(Benchmark.measure(name, func, repeat, rows))
+
+        add(
+            "get_model_performance_ranking",
+            lambda: len(ModelAnalytics.get_model_performance_ranking()),
+        )
+        add("get_summary_stats", lambda: DatabaseManager.get_summary_stats())
+        for name, filters in (
+            ("get_filtered_data", {}),
+            ("get_filtered_data[model_id]", {"model_id": model_id}),
+            (
+                "get_filtered_data[date_return]",
+                {"start_date": "2024-04-01", "end_date": "2024-06-30", "min_return": 0.0},
+            ),
+            (
+                "get_filtered_data[sort_return_rate]",
+                {"sort_by": "return_rate", "sort_order": "asc"},
+            ),
+        ):
+            add(
+                name,
+                lambda filters=filters: ModelAnalytics.get_filtered_data(**filters)[
+                    "total_records"
+                ],
+            )
+        add(
+            "get_history_page_data",
+            lambda: ModelAnalytics.get_history_page_data()["filtered_data"][
+                "total_records"
+            ],
+        )
+
+        for name, endpoint in (
+            ("/export/fixed-stock?format=csv", lambda: export_fixed_stock(export_format="csv")),
+            (
+                "/export/fixed-stock?format=parquet",
+                lambda: export_fixed_stock(export_format="parquet"),
+            ),
+            (
+                "/export/stock-selection?format=csv",
+                lambda: export_stock_selection(export_format="csv"),
+            ),
+            (
+                "/export/stock-selection?format=parquet",
+                lambda: export_stock_selection(export_format="parquet"),
+            ),
+            ("/export/all?format=csv", lambda: export_all_data(export_format="csv")),
+            (
+                "/export/ai-models?format=parquet",
+                lambda: export_ai_models(export_format="parquet"),
+            ),
+        ):
+            add(name, lambda endpoint=endpoint: asyncio.run(Benchmark._download(endpoint)))
+
+        results.extend(Benchmark.run_scoring(rows, repeat))
+        return results
+
+    @staticmethod
+    async def _download(endpoint: Callable) -> int:
+        """エクスポートのレスポンスを最後まで読み出し、バイト数を返す"""
+        response = await endpoint()
+        if response.status_code != 200:
+            raise RuntimeError(f"エクスポートに失敗しました: {response.status_code}")
+
+        # FileResponseは一時ファイル、StreamingResponseはチャンクを読み出す
+        path = getattr(response, "path", None)
+        if path is not None:
+            size = os.path.getsize(path)
+            await response.background()
+            return size
+
+        size = 0
+        async for chunk in response.body_iterator:
+            size += len(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+        return size
+
+    @staticmethod
+    def run_scoring(rows: int, repeat: int) -> List[Dict]:
+        """スコア計算（1件ずつ・配列単位）と合成株価での株価参照を計測"""
+        rng = np.random.default_rng(SEED)
+        buy_price = rng.uniform(500, 10000, rows)
+        sell_price = buy_price * (1 + rng.normal(0.002, 0.05, rows))
+        predicted = sell_price * rng.uniform(0.9, 1.1, rows)
+        scalar_rows = list(zip(buy_price.tolist(), sell_price.tolist(), predicted.tolist()))
+
+        def score_scalar() -> int:
+            for buy, sell, prediction in scalar_rows:
+                StockAnalyzer.calculate_return_rate(buy, sell)
+                accuracy = StockAnalyzer.calculate_prediction_accuracy(sell, prediction)
+                StockAnalyzer.calculate_overall_prediction_score(
+                    accuracy, accuracy, accuracy
+                )
+            return len(scalar_rows)
+
+        def score_arrays() -> int:
+            StockAnalyzer.calculate_return_rates(buy_price, sell_price)
+            accuracy = StockAnalyzer.calculate_prediction_accuracies(sell_price, predicted)
+            StockAnalyzer.calculate_overall_prediction_scores(accuracy, accuracy, accuracy)
+            return rows
+
+        lookups = min(rows, 1000)
+        start = datetime(2024, 1, 4)
+        stock_codes = [PRICE_LOOKUP_STOCK_CODES[i % len(PRICE_LOOKUP_STOCK_CODES)] for i in range(lookups)]
+
+        def price_lookups() -> int:
+            contexts = {
+                stock_code: PriceContext(stock_code, "2024-01-01", "2024-12-31")
+                for stock_code in set(stock_codes)
+            }
+            for position, stock_code in enumerate(stock_codes):
+                buy_date = start + timedelta(days=position % 300)
+                sell_date = buy_date + timedelta(days=7)
+                context = contexts[stock_code]
+                context.get_closest_business_day_price(buy_date.strftime("%Y-%m-%d"))
+                context.get_period_high_low_prices(
+                    buy_date.strftime("%Y-%m-%d"), sell_date.strftime("%Y-%m-%d")
+                )
+            return lookups
+
+        return [
+            Benchmark.measure("scoring[scalar]", score_scalar, repeat, rows),
+            Benchmark.measure("scoring[arrays]", score_arrays, repeat, rows),
+            Benchmark.measure("price_context[synthetic]", price_lookups, repeat, lookups),
+        ]
+
+    @staticmethod
+    def run(rows_list: List[int], repeat: int, output_path: str) -> Dict:
+        """全ての規模で計測し、結果をJSONに保存"""
+        # 株価は合成データを使用（ネットワークに接続しない）
+        set_price_provider(build_price_provider("synthetic"))
+        DatabaseManager.init_database()
+
+        results = []
+        for rows in rows_list:
+            results.extend(Benchmark.run_scale(rows, repeat))
+
+        report = {
+            "commit": Benchmark._git_commit(),
+            "created_at": datetime.now().isoformat(),
+            "database": engine.dialect.name,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "results": results,
+        }
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 結果を保存しました: {output_path}")
+        return report
+
+    @staticmethod
+    def compare(base_path: str, target_path: str) -> bool:
+        """2つの結果の中央値を比較して表示（遅くなった処理があればFalse）"""
+        with open(base_path, encoding="utf-8") as f:
+            base = json.load(f)
+        with open(target_path, encoding="utf-8") as f:
+            target = json.load(f)
+
+        base_results = {
+            (result["name"], result["rows"]): result for result in base["results"]
+        }
+        print(f"比較: {base.get('commit')} -> {target.get('commit')}")
+
+        regressed = False
+        for result in target["results"]:
+            previous = base_results.get((result["name"], result["rows"]))
+            if previous is None or not previous["median_ms"]:
+                continue
+            ratio = result["median_ms"] / previous["median_ms"]
+            mark = ""
+            if ratio >= REGRESSION_THRESHOLD:
+                mark = " ⚠️"
+                regressed = True
+            print(
+                f"  {result['name']} ({result['rows']}行): "
+                f"{previous['median_ms']:.1f}ms -> {result['median_ms']:.1f}ms "
+                f"(x{ratio:.2f}){mark}"
+            )
+        return not regressed
+
+    @staticmethod
+    def _git_commit() -> Optional[str]:
+        """現在のコミットID（取得できない場合はNone）"""
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except Exception:
+            return None
+
+
+def main() -> None:
+    """コマンドラインからベンチマークを実行"""
+    parser = argparse.ArgumentParser(
+        description="履歴分析・エクスポート・スコア計算の処理時間を規模別に計測"
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=BENCHMARK_ROWS,
+        help=f"投入する行数（両テーブルの合計、デフォルト: {BENCHMARK_ROWS}）",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=BENCHMARK_REPEAT,
+        help=f"各処理の計測回数（デフォルト: {BENCHMARK_REPEAT}）",
+    )
+    parser.add_argument(
+        "--output",
+        default=BENCHMARK_OUTPUT_PATH,
+        help="結果（JSON）の保存先",
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASE", "TARGET"),
+        help="2つの結果ファイルを比較（計測は行わない）",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        if not Benchmark.compare(*args.compare):
+            raise SystemExit(1)
+        return
+
+    Benchmark.run(args.rows, args.repeat, args.output)
+
+
+if __name__ == "__main__":
+    main()
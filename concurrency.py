@@ -0,0 +1,57 @@
+"""
+ブロッキング処理の実行管理
+yfinanceやSQLAlchemyの同期I/Oをイベントループ外のスレッドプールで実行する
+"""
+
+import functools
+import os
+from typing import AsyncIterator, Callable, Dict, Iterator, TypeVar
+
+from anyio import CapacityLimiter, to_thread
+
+from request_timing import RequestTiming
+
+T = TypeVar("T")
+
+# 同時実行数の上限（環境変数で調整可能）
+STOCK_IO_CONCURRENCY = int(os.getenv("STOCK_IO_CONCURRENCY", "4"))
+DB_IO_CONCURRENCY = int(os.getenv("DB_IO_CONCURRENCY", "10"))
+
+_limiters: Dict[str, CapacityLimiter] = {}
+
+
+def _get_limiter(name: str, total_tokens: int) -> CapacityLimiter:
+    """用途別の同時実行数リミッターを取得（イベントループ上で遅延生成）"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = CapacityLimiter(total_tokens)
+        _limiters[name] = limiter
+    return limiter
+
+
+async def run_stock_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """株価取得（yfinance）をスレッドプールで実行"""
+    limiter = _get_limiter("stock", STOCK_IO_CONCURRENCY)
+    return await to_thread.run_sync(
+        RequestTiming.profiled(functools.partial(func, *args, **kwargs)),
+        limiter=limiter,
+    )
+
+
+async def run_db_io(func: Callable[..., T], *args, **kwargs) -> T:
+    """データベース処理をスレッドプールで実行"""
+    limiter = _get_limiter("db", DB_IO_CONCURRENCY)
+    return await to_thread.run_sync(
+        RequestTiming.profiled(functools.partial(func, *args, **kwargs)),
+        limiter=limiter,
+    )
+
+
+async def iterate_db_io(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """DBを読み進める同期イテレータを、要素ごとにスレッドプールで進める"""
+    sentinel = object()
+    while True:
+        item = await run_db_io(next, iterator, sentinel)
+        if item is sentinel:
+            break
+        yield item
@@ -0,0 +1,383 @@
+"""
+エクスポートモジュール
+分析データをサーバーサイドカーソルで読み進めながらCSV・Parquet・Arrow IPCを逐次生成する
+
+コマンドラインからも実行可能:
+    python exporter.py --format parquet --output-dir ./exports
+"""
+
+import argparse
+import csv
+import heapq
+import io
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer
+
+from database import (
+    AIModel,
+    DatabaseManager,
+    FixedStockAnalysis,
+    StockSelectionAnalysis,
+)
+
+# 1チャンクあたりの読み込み行数
+EXPORT_CHUNK_SIZE = 5000
+
+# 列指向形式: 形式名 -> (拡張子, Content-Type)
+COLUMNAR_FORMATS = {
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+}
+
+# Parquetの圧縮方式
+PARQUET_COMPRESSION = "zstd"
+
+# 列指向形式でエクスポートできるテーブル
+EXPORT_TABLES = {
+    "fixed_stock_analysis": FixedStockAnalysis,
+    "stock_selection_analysis": StockSelectionAnalysis,
+    "ai_models": AIModel,
+}
+
+# (データのキー, CSVヘッダー)
+FIXED_EXPORT_FIELDS: List[Tuple[str, str]] = [
+    ("id", "ID"),
+    ("execution_date", "実行日"),
+    ("model_display_name", "LLMモデル"),
+    ("stock_code", "銘柄コード"),
+    ("buy_date", "購入日"),
+    ("buy_price", "購入価格"),
+    ("sell_date", "売却日"),
+    ("sell_price", "売却価格"),
+    ("predicted_price", "予測価格"),
+    ("profit_loss", "损益"),
+    ("return_rate", "騰落率(%)"),
+    ("prediction_accuracy", "予測精度(%)"),
+    ("period_days", "保有期間(日)"),
+    ("notes", "備考"),
+    ("created_at", "作成日時"),
+]
+
+SELECTION_EXPORT_FIELDS: List[Tuple[str, str]] = [
+    ("id", "ID"),
+    ("execution_date", "実行日"),
+    ("analysis_period", "分析期間"),
+    ("model_display_name", "LLMモデル"),
+    ("stock_code", "銘柄コード"),
+    ("selection_reason", "選定理由"),
+    ("buy_date", "購入日"),
+    ("buy_price", "購入価格"),
+    ("sell_date", "売却日"),
+    ("sell_price", "売却価格"),
+    ("profit_loss", "损益"),
+    ("return_rate", "騰落率(%)"),
+    ("period_days", "保有期間(日)"),
+    ("notes", "備考"),
+    ("created_at", "作成日時"),
+]
+
+ALL_EXPORT_FIELDS: List[Tuple[str, str]] = [
+    ("id", "ID"),
+    ("analysis_type", "分析タイプ"),
+    ("execution_date", "実行日"),
+    ("model_display_name", "LLMモデル"),
+    ("stock_code", "銘柄コード"),
+    ("buy_date", "購入日"),
+    ("buy_price", "購入価格"),
+    ("sell_date", "売却日"),
+    ("sell_price", "売却価格"),
+    ("predicted_price", "予測価格"),
+    ("profit_loss", "损益"),
+    ("return_rate", "騰落率(%)"),
+    ("prediction_accuracy", "予測精度(%)"),
+    ("analysis_period", "分析期間"),
+    ("selection_reason", "選定理由"),
+    ("period_days", "保有期間(日)"),
+    ("notes", "備考"),
+    ("created_at", "作成日時"),
+]
+
+# DBから読み込む列（表示名に変換するためmodel_idを含める）
+FIXED_EXPORT_COLUMNS = [
+    "id",
+    "execution_date",
+    "model_id",
+    "stock_code",
+    "buy_date",
+    "buy_price",
+    "sell_date",
+    "sell_price",
+    "predicted_price",
+    "profit_loss",
+    "return_rate",
+    "prediction_accuracy",
+    "period_days",
+    "notes",
+    "created_at",
+]
+
+SELECTION_EXPORT_COLUMNS = [
+    "id",
+    "execution_date",
+    "analysis_period",
+    "model_id",
+    "stock_code",
+    "selection_reason",
+    "buy_date",
+    "buy_price",
+    "sell_date",
+    "sell_price",
+    "profit_loss",
+    "return_rate",
+    "period_days",
+    "notes",
+    "created_at",
+]
+
+
+class AnalysisExporter:
+    """分析データのストリーミングエクスポート"""
+
+    @staticmethod
+    def stream_fixed_stock_csv(
+        conditions: List, model_mapping: Mapping[str, str]
+    ) -> Iterator[bytes]:
+        """固定銘柄分析データのCSVをチャンクごとに生成"""
+        chunks = DatabaseManager.iter_table_rows(
+            FixedStockAnalysis,
+            FIXED_EXPORT_COLUMNS,
+            conditions,
+            chunk_size=EXPORT_CHUNK_SIZE,
+        )
+        return AnalysisExporter._stream_csv(
+            FIXED_EXPORT_FIELDS,
+            AnalysisExporter._with_display_name(chunks, model_mapping),
+        )
+
+    @staticmethod
+    def stream_stock_selection_csv(
+        conditions: List, model_mapping: Mapping[str, str]
+    ) -> Iterator[bytes]:
+        """銘柄選定分析データのCSVをチャンクごとに生成"""
+        chunks = DatabaseManager.iter_table_rows(
+            StockSelectionAnalysis,
+            SELECTION_EXPORT_COLUMNS,
+            conditions,
+            chunk_size=EXPORT_CHUNK_SIZE,
+        )
+        return AnalysisExporter._stream_csv(
+            SELECTION_EXPORT_FIELDS,
+            AnalysisExporter._with_display_name(chunks, model_mapping),
+        )
+
+    @staticmethod
+    def stream_all_csv(model_mapping: Mapping[str, str]) -> Iterator[bytes]:
+        """両テーブルを作成日時の降順でマージしながら統合CSVを生成"""
+        fixed_rows = AnalysisExporter._labeled_rows(
+            DatabaseManager.iter_table_rows(
+                FixedStockAnalysis,
+                FIXED_EXPORT_COLUMNS,
+                chunk_size=EXPORT_CHUNK_SIZE,
+            ),
+            "固定銘柄分析",
+        )
+        selection_rows = AnalysisExporter._labeled_rows(
+            DatabaseManager.iter_table_rows(
+                StockSelectionAnalysis,
+                SELECTION_EXPORT_COLUMNS,
+                chunk_size=EXPORT_CHUNK_SIZE,
+            ),
+            "銘柄選定分析",
+        )
+
+        # 各テーブルはcreated_atの降順で読み込まれるため、マージだけで全体が整列する
+        merged = heapq.merge(
+            fixed_rows,
+            selection_rows,
+            key=lambda row: row["created_at"] or datetime.min,
+            reverse=True,
+        )
+        return AnalysisExporter._stream_csv(
+            ALL_EXPORT_FIELDS,
+            AnalysisExporter._with_display_name(
+                AnalysisExporter._rechunk(merged, EXPORT_CHUNK_SIZE), model_mapping
+            ),
+        )
+
+    @staticmethod
+    def _labeled_rows(chunks: Iterable[List[Dict]], analysis_type: str) -> Iterator[Dict]:
+        """チャンクを1行ずつに展開し、分析タイプを付与"""
+        for rows in chunks:
+            for row in rows:
+                row["analysis_type"] = analysis_type
+                yield row
+
+    @staticmethod
+    def _rechunk(rows: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+        """行のイテレータを一定件数ごとのチャンクにまとめる"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _with_display_name(
+        chunks: Iterable[List[Dict]], model_mapping: Mapping[str, str]
+    ) -> Iterator[List[Dict]]:
+        """model_idをLLMモデルの表示名に変換"""
+        for rows in chunks:
+            for row in rows:
+                row["model_display_name"] = model_mapping.get(
+                    row["model_id"], row["model_id"]
+                )
+            yield rows
+
+    @staticmethod
+    def _stream_csv(
+        fields: List[Tuple[str, str]], chunks: Iterable[List[Dict]]
+    ) -> Iterator[bytes]:
+        """ヘッダー行とデータ行をUTF-8（BOM付き）のCSVチャンクとして生成"""
+        keys = [key for key, _ in fields]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        # Excelで文字化けしないようBOMを先頭に付与
+        buffer.write("\ufeff")
+        writer.writerow([header for _, header in fields])
+        yield AnalysisExporter._drain(buffer)
+
+        for rows in chunks:
+            writer.writerows(
+                [AnalysisExporter._format_value(row.get(key)) for key in keys]
+                for row in rows
+            )
+            yield AnalysisExporter._drain(buffer)
+
+    @staticmethod
+    def _drain(buffer: io.StringIO) -> bytes:
+        """バッファの内容をエンコードして取り出し、バッファを空にする"""
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return data
+
+    @staticmethod
+    def _format_value(value) -> Optional[object]:
+        """CSV出力用に値を整形（Noneは空欄）"""
+        if value is None:
+            return ""
+        return value
+
+    @staticmethod
+    def write_columnar(
+        model, fmt: str, path: str, conditions: Optional[List] = None
+    ) -> int:
+        """テーブルを型付きの列指向ファイル（Parquet / Arrow IPC）に書き出し、行数を返す
+
+        Parquetはzstdで圧縮する。Arrow IPCはメモリマップでゼロコピー読み込みできるよう
+        非圧縮のファイル形式で書き出す。
+        """
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"未対応のエクスポート形式です: {fmt}")
+
+        pa = AnalysisExporter._import_pyarrow()
+        schema = AnalysisExporter._arrow_schema(model)
+        chunks = DatabaseManager.iter_table_rows(
+            model, schema.names, conditions, chunk_size=EXPORT_CHUNK_SIZE
+        )
+
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            writer = pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION)
+        else:
+            writer = pa.ipc.new_file(path, schema)
+
+        row_count = 0
+        try:
+            for rows in chunks:
+                writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+                row_count += len(rows)
+        finally:
+            writer.close()
+
+        return row_count
+
+    @staticmethod
+    def _arrow_schema(model):
+        """SQLAlchemyモデルの列定義からArrowスキーマを作成"""
+        pa = AnalysisExporter._import_pyarrow()
+
+        fields = []
+        for column in model.__table__.columns:
+            if isinstance(column.type, Boolean):
+                arrow_type = pa.bool_()
+            elif isinstance(column.type, Integer):
+                arrow_type = pa.int64()
+            elif isinstance(column.type, Float):
+                arrow_type = pa.float64()
+            elif isinstance(column.type, DateTime):
+                arrow_type = pa.timestamp("us")
+            elif isinstance(column.type, Date):
+                arrow_type = pa.date32()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(column.name, arrow_type))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _import_pyarrow():
+        """pyarrowを必要になった時点で読み込む（CSVのみの利用では不要）"""
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc  # noqa: F401
+        except ImportError as e:
+            raise RuntimeError(
+                "Parquet / Arrow形式のエクスポートにはpyarrowが必要です"
+            ) from e
+        return pa
+
+
+def main() -> None:
+    """コマンドラインから分析テーブルを列指向形式でエクスポート"""
+    parser = argparse.ArgumentParser(
+        description="分析テーブルをParquet / Arrow IPC形式でエクスポート"
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(COLUMNAR_FORMATS),
+        default="parquet",
+        help="出力形式（デフォルト: parquet）",
+    )
+    parser.add_argument(
+        "--table",
+        choices=sorted(EXPORT_TABLES),
+        action="append",
+        help="出力するテーブル（複数指定可、省略時は全テーブル）",
+    )
+    parser.add_argument(
+        "--output-dir", default="./exports", help="出力先ディレクトリ"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension, _ = COLUMNAR_FORMATS[args.format]
+
+    for table_name in args.table or list(EXPORT_TABLES):
+        path = os.path.join(args.output_dir, f"{table_name}_{timestamp}{extension}")
+        row_count = AnalysisExporter.write_columnar(
+            EXPORT_TABLES[table_name], args.format, path
+        )
+        print(f"✅ {table_name}: {row_count} 件 -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,108 @@
-import io
+import asyncio
+import cProfile
+import os
+import tempfile
 from datetime import datetime, timedelta
 from typing import Optional
+from urllib.parse import urlencode
 
-import pandas as pd
 import uvicorn
-from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
-from fastapi.templating import Jinja2Templates
-
-from analytics import ModelAnalytics
-from database import DatabaseManager
-from stock_analyzer import StockAnalyzer
+from fastapi import FastAPI, Form, Query, Request
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
+from starlette.background import BackgroundTask
+
+from analytics import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ModelAnalytics
+from batch_ingest import ANALYSIS_PERIOD_DAYS, BatchIngest, BatchSubmission
+from concurrency import iterate_db_io, run_db_io, run_stock_io
+from database import (
+    AIModel,
+    DatabaseManager,
+    FixedStockAnalysis,
+    StockSelectionAnalysis,
+    engine,
+)
+from exporter import COLUMNAR_FORMATS, AnalysisExporter
+from preview_cache import PreviewCache
+from request_timing import REQUEST_PROFILING, RequestTiming, TimedJinja2Templates
+from security_master import SecurityMaster
+from stock_analyzer import PriceContext, StockAnalyzer
+from trading_calendar import TradingCalendar
 
 # FastAPIアプリケーション
 app = FastAPI(title="LLM投資アイデア検証ツール")
 
-# テンプレート設定
-templates = Jinja2Templates(directory="templates")
+# テンプレート設定（描画時間をServer-Timingに含める）
+templates = TimedJinja2Templates(directory="templates")
+
+# DBクエリの実行時間をServer-Timingに含める
+RequestTiming.instrument_engine(engine)
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """処理時間の内訳をServer-Timingヘッダーで返す（?profile=1 はcProfileのレポートを返す）"""
+    profile = REQUEST_PROFILING and request.query_params.get("profile") == "1"
+    if not profile:
+        recorder = RequestTiming.start()
+        response = await call_next(request)
+        response.headers["Server-Timing"] = RequestTiming.server_timing_header(recorder)
+        return response
+
+    with RequestTiming.exclusive_profiling() as acquired:
+        if not acquired:
+            return PlainTextResponse(
+                "他のリクエストをプロファイル中です。完了後に再実行してください。",
+                status_code=409,
+            )
+
+        # イベントループ上の処理はこのプロファイルで、スレッドプールの処理は個別に計測する
+        # （同時に処理中の他のリクエストのコルーチンも含まれる）
+        recorder = RequestTiming.start(profile=True)
+        loop_profile = cProfile.Profile()
+        loop_profile.enable()
+        try:
+            response = await call_next(request)
+            # ストリーミングレスポンスも最後まで生成して計測に含める
+            async for _ in response.body_iterator:
+                pass
+        finally:
+            loop_profile.disable()
+
+    report = RequestTiming.profile_report(recorder, loop_profile)
+    return PlainTextResponse(
+        report,
+        headers={"Server-Timing": RequestTiming.server_timing_header(recorder)},
+    )
 
 
 # データベース初期化
 @app.on_event("startup")
 async def startup_event():
     print("🚀 アプリケーション起動中...")
-    result = DatabaseManager.init_database()
+    result = await run_db_io(DatabaseManager.init_database)
     if result:
         print("✅ データベース初期化完了")
     else:
         print("❌ データベース初期化に問題が発生しました")
 
+    # 上場銘柄マスタが古ければバックグラウンドで更新（起動は待たせない）
+    app.state.security_master_refresh = asyncio.create_task(
+        run_stock_io(SecurityMaster.refresh_if_stale)
+    )
+
 
 # ルート定義
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """ホームページ"""
-    stats = DatabaseManager.get_summary_stats()
+    stats = await run_db_io(DatabaseManager.get_summary_stats)
     return templates.TemplateResponse(
         "index.html", {"request": request, "stats": stats}
     )
@@ -45,7 +113,7 @@ async def fixed_stock_form(
     request: Request, success: Optional[str] = None, error: Optional[str] = None
 ):
     """固定銘柄分析フォーム"""
-    ai_models = DatabaseManager.get_ai_models()
+    ai_models = await run_db_io(DatabaseManager.get_ai_models)
     return templates.TemplateResponse(
         "fixed_stock.html",
         {
@@ -79,7 +147,7 @@ async def fixed_stock_submit(
                 {
                     "request": request,
                     "error_message": "必須項目を全て入力してください。",
-                    "ai_models": DatabaseManager.get_ai_models(),
+                    "ai_models": await run_db_io(DatabaseManager.get_ai_models),
                 },
             )
             
@@ -90,7 +158,7 @@ async def fixed_stock_submit(
                 {
                     "request": request,
                     "error_message": "最安値は最高値より低い値を入力してください。",
-                    "ai_models": DatabaseManager.get_ai_models(),
+                    "ai_models": await run_db_io(DatabaseManager.get_ai_models),
                 },
             )
             
@@ -100,7 +168,7 @@ async def fixed_stock_submit(
                 {
                     "request": request,
                     "error_message": "週末終値予想は最安値と最高値の間の値を入力してください。",
-                    "ai_models": DatabaseManager.get_ai_models(),
+                    "ai_models": await run_db_io(DatabaseManager.get_ai_models),
                 },
             )
 
@@ -131,13 +199,17 @@ async def fixed_stock_submit(
             )
 
         # 銘柄情報を取得して表示
-        stock_info = StockAnalyzer.get_stock_info(stock_code)
+        stock_info = await run_stock_io(StockAnalyzer.get_stock_info, stock_code)
         print(f"銘柄情報: {stock_info}")
 
-        # 株価データ取得
+        # 株価データを1回だけ取得し、購入・売却・最高最安値の計算で共有
+        price_context = await run_stock_io(
+            PriceContext, stock_code, buy_date, sell_date
+        )
+
         print(f"購入日の株価取得開始: {stock_code} - {buy_date}")
-        buy_price, actual_buy_date = StockAnalyzer.get_closest_business_day_price(
-            stock_code, buy_date
+        buy_price, actual_buy_date = price_context.get_closest_business_day_price(
+            buy_date
         )
 
         if buy_price is None:
@@ -150,8 +222,8 @@ async def fixed_stock_submit(
             )
 
         print(f"売却日の株価取得開始: {stock_code} - {sell_date}")
-        sell_price, actual_sell_date = StockAnalyzer.get_closest_business_day_price(
-            stock_code, sell_date
+        sell_price, actual_sell_date = price_context.get_closest_business_day_price(
+            sell_date
         )
 
         if sell_price is None:
@@ -165,8 +237,8 @@ async def fixed_stock_submit(
 
         # 期間中の最高・最安値を取得
         print(f"期間中の最高・最安値取得開始: {stock_code} - {buy_date} to {sell_date}")
-        actual_high, actual_low = StockAnalyzer.get_period_high_low_prices(
-            stock_code, buy_date, sell_date
+        actual_high, actual_low = price_context.get_period_high_low_prices(
+            buy_date, sell_date
         )
         
         if actual_high is None or actual_low is None:
@@ -193,7 +265,7 @@ async def fixed_stock_submit(
         predicted_price = predicted_close
         prediction_accuracy = close_accuracy
         
-        period_days = (sell_date_obj - buy_date_obj).days
+        period_days = TradingCalendar.period_days(buy_date_obj, sell_date_obj)
 
         # 結果表示
         result = {
@@ -235,6 +307,33 @@ async def fixed_stock_submit(
             "low_error": abs(actual_low - predicted_low),
         }
 
+        # 保存時に再計算・再送信しないよう、保存データをサーバー側に保持する
+        result["preview_token"] = PreviewCache.put(
+            "fixed",
+            {
+                "model_id": model_id,
+                "stock_code": stock_code,
+                "buy_date": actual_buy_date,
+                "buy_price": buy_price,
+                "sell_date": actual_sell_date,
+                "sell_price": sell_price,
+                "predicted_high": predicted_high,
+                "predicted_low": predicted_low,
+                "predicted_close": predicted_close,
+                "predicted_price": predicted_price,
+                "actual_high": actual_high,
+                "actual_low": actual_low,
+                "profit_loss": profit_loss,
+                "return_rate": return_rate,
+                "prediction_accuracy": prediction_accuracy,
+                "high_accuracy": high_accuracy,
+                "low_accuracy": low_accuracy,
+                "overall_score": overall_score,
+                "period_days": period_days,
+                "notes": notes,
+            },
+        )
+
         return templates.TemplateResponse(
             "fixed_stock.html", {"request": request, "result": result}
         )
@@ -262,73 +361,21 @@ async def fixed_stock_submit(
 
 
 @app.post("/fixed-stock/save")
-async def save_fixed_stock(
-    model_id: str = Form(...),
-    stock_code: str = Form(...),
-    buy_date: str = Form(...),
-    buy_price: float = Form(...),
-    sell_date: str = Form(...),
-    sell_price: float = Form(...),
-    
-    # 3つの予測値
-    predicted_high: float = Form(None),
-    predicted_low: float = Form(None),
-    predicted_close: float = Form(None),
-    predicted_price: float = Form(...),  # 下位互換性
-    
-    # 3つの実際値
-    actual_high: float = Form(None),
-    actual_low: float = Form(None),
-    
-    profit_loss: float = Form(...),
-    return_rate: float = Form(...),
-    
-    # 精度指標
-    prediction_accuracy: float = Form(...),
-    close_accuracy: float = Form(None),
-    high_accuracy: float = Form(None),
-    low_accuracy: float = Form(None),
-    overall_score: float = Form(None),
-    
-    period_days: int = Form(...),
-    notes: str = Form(""),
-):
-    """固定銘柄分析結果を保存"""
+async def save_fixed_stock(preview_token: str = Form(...)):
+    """固定銘柄分析結果を保存（プレビュー時に計算した結果をトークンで確定）"""
     try:
-        save_data = {
-            "execution_date": datetime.now(),
-            "model_id": model_id,
-            "stock_code": stock_code,
-            "buy_date": buy_date,
-            "buy_price": buy_price,
-            "sell_date": sell_date,
-            "sell_price": sell_price,
-            
-            # 3つの予測値
-            "predicted_high": predicted_high,
-            "predicted_low": predicted_low,
-            "predicted_close": predicted_close or predicted_price,
-            "predicted_price": predicted_price,
-            
-            # 3つの実際値
-            "actual_high": actual_high,
-            "actual_low": actual_low,
-            
-            "profit_loss": profit_loss,
-            "return_rate": return_rate,
-            
-            # 精度指標
-            "prediction_accuracy": prediction_accuracy,
-            "high_accuracy": high_accuracy,
-            "low_accuracy": low_accuracy,
-            "overall_score": overall_score,
-            
-            "period_days": period_days,
-            "notes": notes,
-        }
-
-        success = DatabaseManager.save_fixed_stock_analysis(save_data)
+        success = await run_db_io(
+            PreviewCache.commit,
+            preview_token,
+            "fixed",
+            DatabaseManager.save_fixed_stock_analysis,
+        )
 
+        if success is None:
+            return RedirectResponse(
+                url="/fixed-stock?error=分析結果の有効期限が切れました。もう一度分析してから保存してください。",
+                status_code=303,
+            )
         if success:
             return RedirectResponse(
                 url="/fixed-stock?success=データが正常に保存されました！履歴分析ページで確認できます。",
@@ -349,7 +396,7 @@ async def stock_selection_form(
     request: Request, success: Optional[str] = None, error: Optional[str] = None
 ):
     """銘柄選定分析フォーム"""
-    ai_models = DatabaseManager.get_ai_models()
+    ai_models = await run_db_io(DatabaseManager.get_ai_models)
     return templates.TemplateResponse(
         "stock_selection.html",
         {
@@ -405,15 +452,7 @@ async def stock_selection_submit(
             )
 
         # 売却日を計算
-        period_mapping = {
-            "1週間": 7,
-            "1ヶ月": 30,
-            "3ヶ月": 90,
-            "6ヶ月": 180,
-            "1年": 365,
-        }
-
-        if analysis_period not in period_mapping:
+        if analysis_period not in ANALYSIS_PERIOD_DAYS:
             return templates.TemplateResponse(
                 "stock_selection.html",
                 {
@@ -423,16 +462,21 @@ async def stock_selection_submit(
             )
 
         buy_date_obj = datetime.strptime(buy_date, "%Y-%m-%d").date()
-        sell_date_obj = buy_date_obj + timedelta(days=period_mapping[analysis_period])
+        sell_date_obj = buy_date_obj + timedelta(days=ANALYSIS_PERIOD_DAYS[analysis_period])
+        sell_date = sell_date_obj.strftime("%Y-%m-%d")
 
         # 銘柄情報を取得して表示
-        stock_info = StockAnalyzer.get_stock_info(stock_code)
+        stock_info = await run_stock_io(StockAnalyzer.get_stock_info, stock_code)
         print(f"銘柄情報: {stock_info}")
 
-        # 株価データ取得
+        # 株価データを1回だけ取得し、購入・売却の計算で共有
+        price_context = await run_stock_io(
+            PriceContext, stock_code, buy_date, sell_date
+        )
+
         print(f"購入日の株価取得開始: {stock_code} - {buy_date}")
-        buy_price, actual_buy_date = StockAnalyzer.get_closest_business_day_price(
-            stock_code, buy_date
+        buy_price, actual_buy_date = price_context.get_closest_business_day_price(
+            buy_date
         )
 
         if buy_price is None:
@@ -444,11 +488,9 @@ async def stock_selection_submit(
                 },
             )
 
-        print(
-            f"売却日の株価取得開始: {stock_code} - {sell_date_obj.strftime('%Y-%m-%d')}"
-        )
-        sell_price, actual_sell_date = StockAnalyzer.get_closest_business_day_price(
-            stock_code, sell_date_obj.strftime("%Y-%m-%d")
+        print(f"売却日の株価取得開始: {stock_code} - {sell_date}")
+        sell_price, actual_sell_date = price_context.get_closest_business_day_price(
+            sell_date
         )
 
         if sell_price is None:
@@ -463,10 +505,9 @@ async def stock_selection_submit(
         # 計算
         profit_loss = sell_price - buy_price
         return_rate = StockAnalyzer.calculate_return_rate(buy_price, sell_price)
-        actual_period_days = (
-            datetime.strptime(actual_sell_date, "%Y-%m-%d").date()
-            - datetime.strptime(actual_buy_date, "%Y-%m-%d").date()
-        ).days
+        actual_period_days = TradingCalendar.period_days(
+            actual_buy_date, actual_sell_date
+        )
 
         # 結果表示
         result = {
@@ -485,6 +526,25 @@ async def stock_selection_submit(
             "notes": notes,
         }
 
+        # 保存時に再計算・再送信しないよう、保存データをサーバー側に保持する
+        result["preview_token"] = PreviewCache.put(
+            "selection",
+            {
+                "analysis_period": analysis_period,
+                "model_id": model_id,
+                "stock_code": stock_code,
+                "selection_reason": selection_reason,
+                "buy_date": actual_buy_date,
+                "buy_price": buy_price,
+                "sell_date": actual_sell_date,
+                "sell_price": sell_price,
+                "profit_loss": profit_loss,
+                "return_rate": return_rate,
+                "period_days": actual_period_days,
+                "notes": notes,
+            },
+        )
+
         return templates.TemplateResponse(
             "stock_selection.html", {"request": request, "result": result}
         )
@@ -512,40 +572,21 @@ async def stock_selection_submit(
 
 
 @app.post("/stock-selection/save")
-async def save_stock_selection(
-    analysis_period: str = Form(...),
-    model_id: str = Form(...),
-    stock_code: str = Form(...),
-    selection_reason: str = Form(...),
-    buy_date: str = Form(...),
-    buy_price: float = Form(...),
-    sell_date: str = Form(...),
-    sell_price: float = Form(...),
-    profit_loss: float = Form(...),
-    return_rate: float = Form(...),
-    period_days: int = Form(...),
-    notes: str = Form(""),
-):
-    """銘柄選定分析結果を保存"""
+async def save_stock_selection(preview_token: str = Form(...)):
+    """銘柄選定分析結果を保存（プレビュー時に計算した結果をトークンで確定）"""
     try:
-        save_data = {
-            "execution_date": datetime.now(),
-            "analysis_period": analysis_period,
-            "model_id": model_id,
-            "stock_code": stock_code,
-            "selection_reason": selection_reason,
-            "buy_date": buy_date,
-            "buy_price": buy_price,
-            "sell_date": sell_date,
-            "sell_price": sell_price,
-            "profit_loss": profit_loss,
-            "return_rate": return_rate,
-            "period_days": period_days,
-            "notes": notes,
-        }
-
-        success = DatabaseManager.save_stock_selection_analysis(save_data)
+        success = await run_db_io(
+            PreviewCache.commit,
+            preview_token,
+            "selection",
+            DatabaseManager.save_stock_selection_analysis,
+        )
 
+        if success is None:
+            return RedirectResponse(
+                url="/stock-selection?error=分析結果の有効期限が切れました。もう一度分析してから保存してください。",
+                status_code=303,
+            )
         if success:
             return RedirectResponse(
                 url="/stock-selection?success=データが正常に保存されました！履歴分析ページで確認できます。",
@@ -562,6 +603,80 @@ async def save_stock_selection(
         )
 
 
+@app.post("/api/analyses/batch")
+async def submit_analyses_batch(submission: BatchSubmission):
+    """固定銘柄分析・銘柄選定分析をJSONで一括登録
+
+    銘柄ごとに全レコードの期間をまとめ、全銘柄の株価を1回で取得する。
+    株価を取得できない銘柄を含め、1件でも計算できないレコードがあれば
+    何も保存せずにエラーを返す。
+    """
+    try:
+        windows = BatchIngest.price_windows(submission)
+        bars_by_code = await run_stock_io(StockAnalyzer.load_bars_bulk, windows)
+
+        fixed_rows, selection_rows, errors = BatchIngest.build_rows(
+            submission, bars_by_code
+        )
+        if errors:
+            return JSONResponse({"saved": False, "errors": errors}, status_code=422)
+
+        success = await run_db_io(
+            DatabaseManager.save_analyses_bulk, fixed_rows, selection_rows
+        )
+        if not success:
+            return JSONResponse(
+                {"saved": False, "errors": [{"message": "データの保存に失敗しました。"}]},
+                status_code=500,
+            )
+
+        return {
+            "saved": True,
+            "fixed_stock": [
+                {
+                    "model_id": row["model_id"],
+                    "stock_code": row["stock_code"],
+                    "buy_date": row["buy_date"],
+                    "sell_date": row["sell_date"],
+                    "return_rate": row["return_rate"],
+                    "overall_score": row["overall_prediction_score"],
+                }
+                for row in fixed_rows
+            ],
+            "stock_selection": [
+                {
+                    "model_id": row["model_id"],
+                    "stock_code": row["stock_code"],
+                    "buy_date": row["buy_date"],
+                    "sell_date": row["sell_date"],
+                    "return_rate": row["return_rate"],
+                }
+                for row in selection_rows
+            ],
+        }
+    except Exception as e:
+        print(f"一括登録エラー: {str(e)}")
+        return JSONResponse(
+            {"saved": False, "errors": [{"message": str(e)}]}, status_code=500
+        )
+
+
+def safe_float_convert(value: Optional[str]) -> Optional[float]:
+    """文字列パラメータをfloatに変換（空・不正値はNone）"""
+    if value is None or value.strip() == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+@app.get("/api/metrics/db-pool")
+async def db_pool_metrics():
+    """DBコネクションプールの状態（接続数・取得待ち時間）"""
+    return DatabaseManager.get_pool_status()
+
+
 @app.get("/history", response_class=HTMLResponse)
 async def history(
     request: Request,
@@ -573,18 +688,13 @@ async def history(
     max_return: Optional[str] = None,
     sort_by: Optional[str] = "created_at",
     sort_order: Optional[str] = "desc",
+    page_size: Optional[str] = None,
+    fixed_cursor: Optional[str] = None,
+    selection_cursor: Optional[str] = None,
 ):
     """履歴分析ページ"""
 
     # 文字列パラメータを適切な型に変換
-    def safe_float_convert(value: Optional[str]) -> Optional[float]:
-        if value is None or value.strip() == "":
-            return None
-        try:
-            return float(value)
-        except ValueError:
-            return None
-
     min_return_float = safe_float_convert(min_return)
     max_return_float = safe_float_convert(max_return)
 
@@ -592,9 +702,19 @@ async def history(
     model_id = model_id if model_id and model_id.strip() else None
     start_date = start_date if start_date and start_date.strip() else None
     end_date = end_date if end_date and end_date.strip() else None
+    fixed_cursor = fixed_cursor or None
+    selection_cursor = selection_cursor or None
 
-    # フィルタリングされたデータを取得
-    filtered_data = ModelAnalytics.get_filtered_data(
+    # 1ページあたりの件数（範囲外は丸める）
+    try:
+        page_size_int = int(page_size) if page_size else DEFAULT_PAGE_SIZE
+    except ValueError:
+        page_size_int = DEFAULT_PAGE_SIZE
+    page_size_int = max(1, min(page_size_int, MAX_PAGE_SIZE))
+
+    # フィルタ結果・ランキング・チャート・統計を1回の読み込みでまとめて取得
+    page_data = await run_db_io(
+        ModelAnalytics.get_history_page_data,
         data_type=data_type,
         model_id=model_id,
         start_date=start_date,
@@ -603,19 +723,11 @@ async def history(
         max_return=max_return_float,
         sort_by=sort_by,
         sort_order=sort_order,
+        page_size=page_size_int,
+        fixed_cursor=fixed_cursor,
+        selection_cursor=selection_cursor,
     )
-
-    # モデルパフォーマンスランキングを取得
-    model_ranking = ModelAnalytics.get_model_performance_ranking()
-
-    # チャート用データを取得
-    chart_data = ModelAnalytics.get_model_comparison_chart_data()
-
-    # 統計情報を取得
-    stats = DatabaseManager.get_summary_stats()
-
-    # AIモデル一覧を取得（フィルタ用）
-    ai_models = DatabaseManager.get_ai_models()
+    filtered_data = page_data["filtered_data"]
 
     # フィルタ条件を保持
     filters = {
@@ -627,6 +739,32 @@ async def history(
         "max_return": max_return,
         "sort_by": sort_by,
         "sort_order": sort_order,
+        "page_size": page_size_int,
+    }
+
+    # 次ページへのリンク（フィルタ条件ともう一方のタブの位置を保持）
+    def page_url(**cursors) -> str:
+        params = {
+            **filters,
+            "fixed_cursor": fixed_cursor,
+            "selection_cursor": selection_cursor,
+            **cursors,
+        }
+        return "/history?" + urlencode(
+            {key: value for key, value in params.items() if value not in (None, "")}
+        )
+
+    pagination = {
+        "is_first_page": not (fixed_cursor or selection_cursor),
+        "first_page_url": page_url(fixed_cursor=None, selection_cursor=None),
+        "fixed_next_url": page_url(fixed_cursor=filtered_data["fixed_next_cursor"])
+        if filtered_data["fixed_next_cursor"]
+        else None,
+        "selection_next_url": page_url(
+            selection_cursor=filtered_data["selection_next_cursor"]
+        )
+        if filtered_data["selection_next_cursor"]
+        else None,
     }
 
     return templates.TemplateResponse(
@@ -636,15 +774,68 @@ async def history(
             "fixed_data": filtered_data["fixed_data"],
             "selection_data": filtered_data["selection_data"],
             "total_filtered_records": filtered_data["total_records"],
-            "model_ranking": model_ranking,
-            "chart_data": chart_data,
-            "stats": stats,
-            "ai_models": ai_models,
+            "model_ranking": page_data["model_ranking"],
+            "chart_data": page_data["chart_data"],
+            "stats": page_data["stats"],
+            "ai_models": page_data["ai_models"],
             "filters": filters,
+            "pagination": pagination,
         },
     )
 
 
+def csv_download_response(chunks, filename_prefix: str) -> StreamingResponse:
+    """CSVチャンクをダウンロード用のストリーミングレスポンスとして返す"""
+    # ファイル名を生成（日時付き）
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{filename_prefix}_{timestamp}.csv"
+
+    return StreamingResponse(
+        iterate_db_io(chunks),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+async def columnar_download_response(
+    model, export_format: str, filename_prefix: str, conditions=None
+) -> FileResponse:
+    """テーブルを列指向形式の一時ファイルに書き出し、ダウンロードレスポンスとして返す"""
+    extension, media_type = COLUMNAR_FORMATS[export_format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{filename_prefix}_{timestamp}{extension}"
+
+    # Parquetのフッターは書き込み完了後に確定するため、一時ファイル経由で送信する
+    fd, path = tempfile.mkstemp(suffix=extension)
+    os.close(fd)
+    try:
+        await run_db_io(
+            AnalysisExporter.write_columnar, model, export_format, path, conditions
+        )
+    except Exception:
+        os.remove(path)
+        raise
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+def unsupported_format_response(export_format: str) -> HTMLResponse:
+    """未対応のエクスポート形式が指定された場合のレスポンス
+
+    指定された値はクエリ文字列のため、HTMLに埋め込まずログにのみ出力する。
+    """
+    print(f"未対応のエクスポート形式: {export_format!r}")
+    return HTMLResponse(
+        content="<h1>エクスポートエラー</h1><p>未対応の形式です。</p>",
+        status_code=400,
+    )
+
+
 @app.get("/export/fixed-stock")
 async def export_fixed_stock(
     model_id: Optional[str] = None,
@@ -652,136 +843,31 @@ async def export_fixed_stock(
     end_date: Optional[str] = None,
     min_return: Optional[str] = None,
     max_return: Optional[str] = None,
+    export_format: str = Query("csv", alias="format"),
 ):
-    """固定銘柄分析データをCSVエクスポート"""
+    """固定銘柄分析データをエクスポート（CSVはサーバーサイドカーソルで逐次出力）"""
+    if export_format != "csv" and export_format not in COLUMNAR_FORMATS:
+        return unsupported_format_response(export_format)
+
     try:
-        # 文字列パラメータを適切な型に変換
-        def safe_float_convert(value: Optional[str]) -> Optional[float]:
-            if value is None or value.strip() == "":
-                return None
-            try:
-                return float(value)
-            except ValueError:
-                return None
-
-        min_return_float = safe_float_convert(min_return)
-        max_return_float = safe_float_convert(max_return)
-
-        # データを取得
-        fixed_df = DatabaseManager.load_fixed_stock_data()
-
-        # フィルタリング処理
-        if not fixed_df.empty:
-            # モデルIDでフィルタリング
-            if model_id:
-                fixed_df = fixed_df[fixed_df["model_id"] == model_id]
-
-            # 日付範囲でフィルタリング
-            if start_date:
-                start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-                fixed_df = fixed_df[
-                    pd.to_datetime(fixed_df["execution_date"]) >= start_date_obj
-                ]
-
-            if end_date:
-                end_date_obj = datetime.strptime(end_date, "%Y-%m-%d")
-                fixed_df = fixed_df[
-                    pd.to_datetime(fixed_df["execution_date"]) <= end_date_obj
-                ]
-
-            # 騰落率範囲でフィルタリング
-            if min_return_float is not None:
-                fixed_df = fixed_df[fixed_df["return_rate"] >= min_return_float]
-
-            if max_return_float is not None:
-                fixed_df = fixed_df[fixed_df["return_rate"] <= max_return_float]
-
-        if fixed_df.empty:
-            # 空の場合はヘッダーのみのCSVを返す
-            headers = [
-                "ID",
-                "実行日",
-                "LLMモデル",
-                "銘柄コード",
-                "購入日",
-                "購入価格",
-                "売却日",
-                "売却価格",
-                "予測価格",
-                "损益",
-                "騰落率(%)",
-                "予測精度(%)",
-                "保有期間(日)",
-                "備考",
-                "作成日時",
-            ]
-            empty_df = pd.DataFrame(columns=headers)
-            csv_content = empty_df.to_csv(index=False, encoding="utf-8-sig")
-        else:
-            # AIモデル情報を結合
-            ai_models = DatabaseManager.get_ai_models()
-            model_mapping = {
-                model["model_code"]: model["display_name"] for model in ai_models
-            }
-
-            # データを整形
-            export_df = fixed_df.copy()
-            export_df["model_display_name"] = (
-                export_df["model_id"].map(model_mapping).fillna(export_df["model_id"])
+        conditions = DatabaseManager.analysis_filter_conditions(
+            FixedStockAnalysis,
+            model_id=model_id,
+            start_date=start_date,
+            end_date=end_date,
+            min_return=safe_float_convert(min_return),
+            max_return=safe_float_convert(max_return),
+        )
+        if export_format in COLUMNAR_FORMATS:
+            return await columnar_download_response(
+                FixedStockAnalysis, export_format, "fixed_stock_analysis", conditions
             )
 
-            # 列名を日本語に変更
-            column_mapping = {
-                "id": "ID",
-                "execution_date": "実行日",
-                "model_display_name": "LLMモデル",
-                "stock_code": "銘柄コード",
-                "buy_date": "購入日",
-                "buy_price": "購入価格",
-                "sell_date": "売却日",
-                "sell_price": "売却価格",
-                "predicted_price": "予測価格",
-                "profit_loss": "损益",
-                "return_rate": "騰落率(%)",
-                "prediction_accuracy": "予測精度(%)",
-                "period_days": "保有期間(日)",
-                "notes": "備考",
-                "created_at": "作成日時",
-            }
-
-            # 必要な列を選択して並び替え
-            columns_to_export = [
-                "id",
-                "execution_date",
-                "model_display_name",
-                "stock_code",
-                "buy_date",
-                "buy_price",
-                "sell_date",
-                "sell_price",
-                "predicted_price",
-                "profit_loss",
-                "return_rate",
-                "prediction_accuracy",
-                "period_days",
-                "notes",
-                "created_at",
-            ]
-
-            export_df = export_df[columns_to_export].rename(columns=column_mapping)
-
-            # CSVとしてエクスポート
-            csv_content = export_df.to_csv(index=False, encoding="utf-8-sig")
+        model_mapping = await run_db_io(DatabaseManager.get_model_mapping)
 
-        # ファイル名を生成（日時付き）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"fixed_stock_analysis_{timestamp}.csv"
-
-        # CSVファイルとしてダウンロードさせる
-        return StreamingResponse(
-            io.StringIO(csv_content),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        return csv_download_response(
+            AnalysisExporter.stream_fixed_stock_csv(conditions, model_mapping),
+            "fixed_stock_analysis",
         )
 
     except Exception as e:
@@ -799,146 +885,35 @@ async def export_stock_selection(
     end_date: Optional[str] = None,
     min_return: Optional[str] = None,
     max_return: Optional[str] = None,
+    export_format: str = Query("csv", alias="format"),
 ):
-    """銘柄選定分析データをCSVエクスポート"""
+    """銘柄選定分析データをエクスポート（CSVはサーバーサイドカーソルで逐次出力）"""
+    if export_format != "csv" and export_format not in COLUMNAR_FORMATS:
+        return unsupported_format_response(export_format)
+
     try:
-        # 文字列パラメータを適切な型に変換
-        def safe_float_convert(value: Optional[str]) -> Optional[float]:
-            if value is None or value.strip() == "":
-                return None
-            try:
-                return float(value)
-            except ValueError:
-                return None
-
-        min_return_float = safe_float_convert(min_return)
-        max_return_float = safe_float_convert(max_return)
-
-        # データを取得
-        selection_df = DatabaseManager.load_stock_selection_data()
-
-        # フィルタリング処理
-        if not selection_df.empty:
-            # モデルIDでフィルタリング
-            if model_id:
-                selection_df = selection_df[selection_df["model_id"] == model_id]
-
-            # 分析期間でフィルタリング
-            if analysis_period:
-                selection_df = selection_df[
-                    selection_df["analysis_period"] == analysis_period
-                ]
-
-            # 日付範囲でフィルタリング
-            if start_date:
-                start_date_obj = datetime.strptime(start_date, "%Y-%m-%d")
-                selection_df = selection_df[
-                    pd.to_datetime(selection_df["execution_date"]) >= start_date_obj
-                ]
-
-            if end_date:
-                end_date_obj = datetime.strptime(end_date, "%Y-%m-%d")
-                selection_df = selection_df[
-                    pd.to_datetime(selection_df["execution_date"]) <= end_date_obj
-                ]
-
-            # 騰落率範囲でフィルタリング
-            if min_return_float is not None:
-                selection_df = selection_df[
-                    selection_df["return_rate"] >= min_return_float
-                ]
-
-            if max_return_float is not None:
-                selection_df = selection_df[
-                    selection_df["return_rate"] <= max_return_float
-                ]
-
-        if selection_df.empty:
-            # 空の場合はヘッダーのみのCSVを返す
-            headers = [
-                "ID",
-                "実行日",
-                "分析期間",
-                "LLMモデル",
-                "銘柄コード",
-                "選定理由",
-                "購入日",
-                "購入価格",
-                "売却日",
-                "売却価格",
-                "损益",
-                "騰落率(%)",
-                "保有期間(日)",
-                "備考",
-                "作成日時",
-            ]
-            empty_df = pd.DataFrame(columns=headers)
-            csv_content = empty_df.to_csv(index=False, encoding="utf-8-sig")
-        else:
-            # AIモデル情報を結合
-            ai_models = DatabaseManager.get_ai_models()
-            model_mapping = {
-                model["model_code"]: model["display_name"] for model in ai_models
-            }
-
-            # データを整形
-            export_df = selection_df.copy()
-            export_df["model_display_name"] = (
-                export_df["model_id"].map(model_mapping).fillna(export_df["model_id"])
+        conditions = DatabaseManager.analysis_filter_conditions(
+            StockSelectionAnalysis,
+            model_id=model_id,
+            start_date=start_date,
+            end_date=end_date,
+            min_return=safe_float_convert(min_return),
+            max_return=safe_float_convert(max_return),
+            analysis_period=analysis_period,
+        )
+        if export_format in COLUMNAR_FORMATS:
+            return await columnar_download_response(
+                StockSelectionAnalysis,
+                export_format,
+                "stock_selection_analysis",
+                conditions,
             )
 
-            # 列名を日本語に変更
-            column_mapping = {
-                "id": "ID",
-                "execution_date": "実行日",
-                "analysis_period": "分析期間",
-                "model_display_name": "LLMモデル",
-                "stock_code": "銘柄コード",
-                "selection_reason": "選定理由",
-                "buy_date": "購入日",
-                "buy_price": "購入価格",
-                "sell_date": "売却日",
-                "sell_price": "売却価格",
-                "profit_loss": "损益",
-                "return_rate": "騰落率(%)",
-                "period_days": "保有期間(日)",
-                "notes": "備考",
-                "created_at": "作成日時",
-            }
-
-            # 必要な列を選択して並び替え
-            columns_to_export = [
-                "id",
-                "execution_date",
-                "analysis_period",
-                "model_display_name",
-                "stock_code",
-                "selection_reason",
-                "buy_date",
-                "buy_price",
-                "sell_date",
-                "sell_price",
-                "profit_loss",
-                "return_rate",
-                "period_days",
-                "notes",
-                "created_at",
-            ]
-
-            export_df = export_df[columns_to_export].rename(columns=column_mapping)
+        model_mapping = await run_db_io(DatabaseManager.get_model_mapping)
 
-            # CSVとしてエクスポート
-            csv_content = export_df.to_csv(index=False, encoding="utf-8-sig")
-
-        # ファイル名を生成（日時付き）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"stock_selection_analysis_{timestamp}.csv"
-
-        # CSVファイルとしてダウンロードさせる
-        return StreamingResponse(
-            io.StringIO(csv_content),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
+        return csv_download_response(
+            AnalysisExporter.stream_stock_selection_csv(conditions, model_mapping),
+            "stock_selection_analysis",
         )
 
     except Exception as e:
@@ -949,119 +924,34 @@ async def export_stock_selection(
 
 
 @app.get("/export/all")
-async def export_all_data():
-    """全データを統合してCSVエクスポート"""
+async def export_all_data(export_format: str = Query("csv", alias="format")):
+    """全データを統合してCSVエクスポート（作成日時順にマージしながら逐次出力）"""
+    # 列指向形式はテーブルごとにスキーマが異なるため、個別のエクスポートを使用する
+    if export_format != "csv":
+        return unsupported_format_response(export_format)
+
     try:
-        # 両方のデータを取得
-        fixed_df = DatabaseManager.load_fixed_stock_data()
-        selection_df = DatabaseManager.load_stock_selection_data()
-
-        # AIモデル情報を取得
-        ai_models = DatabaseManager.get_ai_models()
-        model_mapping = {
-            model["model_code"]: model["display_name"] for model in ai_models
-        }
+        model_mapping = await run_db_io(DatabaseManager.get_model_mapping)
 
-        combined_data = []
-
-        # 固定銘柄分析データを追加
-        if not fixed_df.empty:
-            for _, row in fixed_df.iterrows():
-                combined_data.append(
-                    {
-                        "ID": row["id"],
-                        "分析タイプ": "固定銘柄分析",
-                        "実行日": row["execution_date"],
-                        "LLMモデル": model_mapping.get(
-                            row["model_id"], row["model_id"]
-                        ),
-                        "銘柄コード": row["stock_code"],
-                        "購入日": row["buy_date"],
-                        "購入価格": row["buy_price"],
-                        "売却日": row["sell_date"],
-                        "売却価格": row["sell_price"],
-                        "予測価格": row.get("predicted_price", ""),
-                        "损益": row["profit_loss"],
-                        "騰落率(%)": row["return_rate"],
-                        "予測精度(%)": row.get("prediction_accuracy", ""),
-                        "分析期間": "",
-                        "選定理由": "",
-                        "保有期間(日)": row["period_days"],
-                        "備考": row.get("notes", ""),
-                        "作成日時": row["created_at"],
-                    }
-                )
-
-        # 銘柄選定分析データを追加
-        if not selection_df.empty:
-            for _, row in selection_df.iterrows():
-                combined_data.append(
-                    {
-                        "ID": row["id"],
-                        "分析タイプ": "銘柄選定分析",
-                        "実行日": row["execution_date"],
-                        "LLMモデル": model_mapping.get(
-                            row["model_id"], row["model_id"]
-                        ),
-                        "銘柄コード": row["stock_code"],
-                        "購入日": row["buy_date"],
-                        "購入価格": row["buy_price"],
-                        "売却日": row["sell_date"],
-                        "売却価格": row["sell_price"],
-                        "予測価格": "",
-                        "损益": row["profit_loss"],
-                        "騰落率(%)": row["return_rate"],
-                        "予測精度(%)": "",
-                        "分析期間": row["analysis_period"],
-                        "選定理由": row["selection_reason"],
-                        "保有期間(日)": row["period_days"],
-                        "備考": row.get("notes", ""),
-                        "作成日時": row["created_at"],
-                    }
-                )
-
-        # DataFrameとして結合
-        if combined_data:
-            combined_df = pd.DataFrame(combined_data)
-            # 作成日時でソート（新しい順）
-            combined_df = combined_df.sort_values("作成日時", ascending=False)
-        else:
-            # データがない場合は空のDataFrame
-            columns = [
-                "ID",
-                "分析タイプ",
-                "実行日",
-                "LLMモデル",
-                "銘柄コード",
-                "購入日",
-                "購入価格",
-                "売却日",
-                "売却価格",
-                "予測価格",
-                "损益",
-                "騰落率(%)",
-                "予測精度(%)",
-                "分析期間",
-                "選定理由",
-                "保有期間(日)",
-                "備考",
-                "作成日時",
-            ]
-            combined_df = pd.DataFrame(columns=columns)
+        return csv_download_response(
+            AnalysisExporter.stream_all_csv(model_mapping), "all_analysis_data"
+        )
+
+    except Exception as e:
+        print(f"エクスポートエラー: {str(e)}")
+        return HTMLResponse(
+            content=f"<h1>エクスポートエラー</h1><p>{str(e)}</p>", status_code=500
+        )
 
-        # CSVとしてエクスポート
-        csv_content = combined_df.to_csv(index=False, encoding="utf-8-sig")
 
-        # ファイル名を生成（日時付き）
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"all_analysis_data_{timestamp}.csv"
+@app.get("/export/ai-models")
+async def export_ai_models(export_format: str = Query("parquet", alias="format")):
+    """AIモデルマスタを列指向形式でエクスポート"""
+    if export_format not in COLUMNAR_FORMATS:
+        return unsupported_format_response(export_format)
 
-        # CSVファイルとしてダウンロードさせる
-        return StreamingResponse(
-            io.StringIO(csv_content),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
+    try:
+        return await columnar_download_response(AIModel, export_format, "ai_models")
 
     except Exception as e:
         print(f"エクスポートエラー: {str(e)}")
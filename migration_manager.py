@@ -9,7 +9,7 @@ import traceback
 from sqlalchemy import text, Column, Integer, String, DateTime, Boolean
 from sqlalchemy.exc import ProgrammingError
 
-from database import engine, SessionLocal, Base
+from database import engine, session_scope, Base
 
 
 class Migration(Base):
@@ -41,34 +41,30 @@ class MigrationManager:
     def get_executed_migrations(self) -> List[str]:
         """実行済みマイグレーション一覧を取得"""
         try:
-            db = SessionLocal()
-            migrations = db.query(Migration).filter(Migration.success == True).all()
-            db.close()
-            return [m.migration_name for m in migrations]
+            with session_scope() as db:
+                migrations = db.query(Migration).filter(Migration.success == True).all()
+                return [m.migration_name for m in migrations]
         except:
             return []
     
     def execute_migration(self, migration_name: str, sql_commands: List[str]) -> bool:
         """マイグレーションを実行"""
         try:
-            db = SessionLocal()
-            
-            print(f"🔄 マイグレーション実行中: {migration_name}")
-            
-            # SQLコマンドを順次実行
-            for sql in sql_commands:
-                if sql.strip():
-                    db.execute(text(sql))
-            
-            # マイグレーション履歴に記録
-            migration_record = Migration(
-                migration_name=migration_name,
-                executed_at=datetime.now(),
-                success=True
-            )
-            db.add(migration_record)
-            db.commit()
-            db.close()
+            with session_scope() as db:
+                print(f"🔄 マイグレーション実行中: {migration_name}")
+                
+                # SQLコマンドを順次実行
+                for sql in sql_commands:
+                    if sql.strip():
+                        db.execute(text(sql))
+                
+                # マイグレーション履歴に記録
+                migration_record = Migration(
+                    migration_name=migration_name,
+                    executed_at=datetime.now(),
+                    success=True
+                )
+                db.add(migration_record)
             
             print(f"✅ マイグレーション完了: {migration_name}")
             return True
@@ -79,15 +75,13 @@ class MigrationManager:
             
             # 失敗記録
             try:
-                db = SessionLocal()
-                migration_record = Migration(
-                    migration_name=migration_name,
-                    executed_at=datetime.now(),
-                    success=False
-                )
-                db.add(migration_record)
-                db.commit()
-                db.close()
+                with session_scope() as db:
+                    migration_record = Migration(
+                        migration_name=migration_name,
+                        executed_at=datetime.now(),
+                        success=False
+                    )
+                    db.add(migration_record)
             except:
                 pass
                 
@@ -173,7 +167,47 @@ class MigrationManager:
                 ALTER TABLE fixed_stock_analysis 
                 ALTER COLUMN predicted_close SET NOT NULL;
                 """,
-            ]
+            ],
+
+            "005_add_analysis_indexes": [
+                # 履歴ページのフィルタ・ソート用インデックス
+                """
+                CREATE INDEX IF NOT EXISTS ix_fixed_stock_analysis_model_id_execution_date
+                ON fixed_stock_analysis (model_id, execution_date);
+                """,
+                """
+                CREATE INDEX IF NOT EXISTS ix_fixed_stock_analysis_return_rate
+                ON fixed_stock_analysis (return_rate);
+                """,
+                """
+                CREATE INDEX IF NOT EXISTS ix_stock_selection_analysis_model_id_execution_date
+                ON stock_selection_analysis (model_id, execution_date);
+                """,
+                """
+                CREATE INDEX IF NOT EXISTS ix_stock_selection_analysis_return_rate
+                ON stock_selection_analysis (return_rate);
+                """,
+            ],
+
+            "006_add_rescore_index": [
+                # 一括再計算で銘柄コード順に読み進めるためのインデックス
+                """
+                CREATE INDEX IF NOT EXISTS ix_fixed_stock_analysis_stock_code_id
+                ON fixed_stock_analysis (stock_code, id);
+                """,
+            ],
+
+            "007_price_bar_coverage_ranges": [
+                # 株価ストアの取得済み期間を銘柄ごとに複数持てるようにする
+                """
+                ALTER TABLE price_bar_coverage
+                DROP CONSTRAINT IF EXISTS price_bar_coverage_pkey;
+                """,
+                """
+                ALTER TABLE price_bar_coverage
+                ADD PRIMARY KEY (stock_code, covered_from);
+                """,
+            ],
         }
     
     def rollback_migration(self, migration_name: str):
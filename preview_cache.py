@@ -0,0 +1,66 @@
+"""
+分析プレビューのキャッシュ
+プレビュー時に計算した保存データをサーバー側に保持し、保存時はトークンだけで確定する
+
+同じトークンの保存は1回だけ実行され、再送（二重クリック・リトライ）は保存済みとして扱う。
+キャッシュはプロセス内のため、複数プロセスで動かす場合はプレビューと保存が同じプロセスに届く必要がある。
+"""
+
+import os
+import secrets
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from cache import SingleFlight, TTLCache
+
+# 保持するプレビューの最大件数
+PREVIEW_CACHE_SIZE = int(os.getenv("PREVIEW_CACHE_SIZE", "1000"))
+
+# プレビューの有効期限（秒）
+PREVIEW_CACHE_TTL = float(os.getenv("PREVIEW_CACHE_TTL", "3600"))
+
+
+class _Preview:
+    """保存待ちのプレビュー"""
+
+    def __init__(self, kind: str, data: Dict):
+        self.kind = kind
+        self.data = data
+        self.saved = False
+
+
+_previews = TTLCache(maxsize=PREVIEW_CACHE_SIZE, ttl=PREVIEW_CACHE_TTL)
+
+# 同じトークンの同時保存を1回にまとめる
+_save_flight = SingleFlight()
+
+
+class PreviewCache:
+    """プレビュー結果の保持と保存"""
+
+    @staticmethod
+    def put(kind: str, data: Dict) -> str:
+        """保存データを登録し、推測できないトークンを返す"""
+        token = secrets.token_urlsafe(16)
+        _previews.set(token, _Preview(kind, data))
+        return token
+
+    @staticmethod
+    def commit(
+        token: str, kind: str, save: Callable[[Dict], bool]
+    ) -> Optional[bool]:
+        """トークンのプレビューを保存（期限切れ・不明なトークンはNone、保存済みはTrue）"""
+
+        def save_once() -> Optional[bool]:
+            preview = _previews.get(token)
+            if preview is None or preview.kind != kind:
+                return None
+            if preview.saved:
+                print(f"保存済みのプレビューのためスキップ: {token}")
+                return True
+
+            success = save({**preview.data, "execution_date": datetime.now()})
+            preview.saved = success
+            return success
+
+        return _save_flight.do(token, save_once)
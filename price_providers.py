@@ -0,0 +1,606 @@
+"""
+株価データプロバイダー
+株価の取得元（yfinance・ローカルファイル・合成データ）を共通のインターフェースで切り替え、
+ローカル株価ストアによるキャッシュやフォールバックとして組み合わせる
+（サンプル銘柄は従来どおりStockAnalyzer側でサンプル価格を生成する）
+
+PRICE_PROVIDER環境変数で取得元を指定する（カンマ区切りで先頭から順にフォールバック）:
+    yfinance            yfinanceから取得し、ローカル株価ストアにキャッシュ（デフォルト）
+    local               PRICE_DATA_DIR の <銘柄コード>.parquet / .csv から読み込み
+    synthetic           再現可能な合成データを生成（ネットワーク不要）
+    local,yfinance      ローカルファイルになければyfinanceから取得
+"""
+
+import os
+import threading
+import warnings
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+from cache import SingleFlight, TTLCache
+from price_store import PriceStore
+from synthetic_data import DEFAULT_SEED, SyntheticPrices
+from trading_calendar import TradingCalendar
+
+# yfinanceの警告を無視
+warnings.filterwarnings("ignore")
+
+# 使用するプロバイダー（カンマ区切りでフォールバック順）
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "yfinance")
+
+# ローカルファイルプロバイダーの読み込み元
+PRICE_DATA_DIR = os.getenv("PRICE_DATA_DIR", "./price_data")
+
+# 合成データプロバイダーの乱数シード
+PRICE_SYNTHETIC_SEED = int(os.getenv("PRICE_SYNTHETIC_SEED", str(DEFAULT_SEED)))
+
+# 合成データの系列を保持する銘柄数（1銘柄あたりカレンダー全期間・約7000営業日分）
+SYNTHETIC_SERIES_CACHE_SIZE = 256
+
+# 要求期間で取得できなかった場合に広げる日数（開始日より前・終了日より後）
+WIDE_FETCH_BEFORE_DAYS = 90
+WIDE_FETCH_AFTER_DAYS = 30
+
+# 銘柄の存在確認で参照する直近の営業日数
+EXISTENCE_CHECK_SESSIONS = 5
+
+# 株価を取得できなかった銘柄を再試行しない期間（秒）
+NEGATIVE_CACHE_TTL = float(os.getenv("STOCK_NEGATIVE_CACHE_TTL", "600"))
+
+# 株価データが見つからなかった銘柄コード（無効など）、または (銘柄コード, 開始日, 終了日)
+# （期間指定で空だった場合は、その期間にデータがないだけのため期間ごとに記録する）
+_negative_cache = TTLCache(maxsize=1024, ttl=NEGATIVE_CACHE_TTL)
+
+# 存在確認（直近5日分の取得）の期間を表すキー
+RECENT_PROBE_WINDOW = ("period", "5d")
+
+# 同じ銘柄・期間の同時ダウンロードを1回にまとめる
+_download_flight = SingleFlight()
+
+
+class _ResponseTrackingSession(requests.Session):
+    """応答を得られなかった（通信エラー・タイムアウト・サーバーエラー）リクエストを記録するセッション
+
+    yfinanceは通信エラーを握りつぶして空のDataFrameを返すため、
+    「データが存在しない」と「取得に失敗した」をこの記録で区別する。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.failed_urls: List[str] = []
+
+    def request(self, method, url, *args, **kwargs):
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            self._record_failure(url)
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            self._record_failure(url)
+        return response
+
+    def _record_failure(self, url: str) -> None:
+        with self._lock:
+            self.failed_urls.append(url)
+
+    def failed_for(self, symbol: str) -> bool:
+        """銘柄のリクエストに応答を得られなかったものがあるか"""
+        with self._lock:
+            return any(
+                requests.utils.urlparse(url).path.endswith(f"/{symbol}")
+                for url in self.failed_urls
+            )
+
+
+class PriceProvider(ABC):
+    """株価データの取得元
+
+    戻り値は日付インデックスとOpen/High/Low/Close/Volume列を持つDataFrame
+    （タイムゾーンの有無は問わない）。取得できない場合はNoneを返す。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        """1銘柄の日次株価を取得"""
+
+    def get_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の日次株価を取得（取得できた銘柄のみ）"""
+        result = {}
+        for stock_code in stock_codes:
+            data = self.get_history(stock_code, start_date, end_date)
+            if data is not None and not data.empty:
+                result[stock_code] = data
+        return result
+
+    def has_history(self, stock_code: str) -> bool:
+        """銘柄の株価データが存在するか（直近の営業日の株価で確認）"""
+        end = TradingCalendar.last_completed_session()
+        start = TradingCalendar.shift_sessions(end, -(EXISTENCE_CHECK_SESSIONS - 1))
+        data = self.get_history(
+            stock_code, TradingCalendar.to_strings(start), end.strftime("%Y-%m-%d")
+        )
+        return data is not None and not data.empty
+
+    def is_known_unavailable(
+        self, stock_code: str, window: Optional[Tuple[str, str]] = None
+    ) -> bool:
+        """株価データが存在しないと確認できた銘柄（またはその期間）かどうか"""
+        return False
+
+    def get_info(self, stock_code: str) -> Optional[Dict]:
+        """銘柄の基本情報（symbol・name・currency・exchange、取得元が持たない場合はNone）"""
+        return None
+
+
+class YFinanceProvider(PriceProvider):
+    """yfinanceから取得（取得失敗の記録と同時リクエストの集約付き）"""
+
+    name = "yfinance"
+
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        if YFinanceProvider.is_known_unavailable(stock_code, (start_date, end_date)):
+            print(f"取得失敗を記録済みのためスキップ: {stock_code}")
+            return None
+
+        def download():
+            data, confirmed_empty = YFinanceProvider._download_with_fallbacks(
+                stock_code, start_date, end_date
+            )
+            # 最大期間の取得まで空だった場合のみ、期間によらずデータがない銘柄として記録する
+            # （通信エラー・タイムアウトによる失敗は一時的なものとして記録しない）
+            if data is None and confirmed_empty:
+                YFinanceProvider.mark_unavailable(stock_code)
+            return data
+
+        return _download_flight.do((stock_code, start_date, end_date), download)
+
+    def get_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の株価データを1回のリクエストで取得"""
+        stock_codes = [
+            stock_code
+            for stock_code in stock_codes
+            if not YFinanceProvider.is_known_unavailable(
+                stock_code, (start_date, end_date)
+            )
+        ]
+        if not stock_codes:
+            return {}
+
+        symbols = [f"{stock_code}.T" for stock_code in stock_codes]
+        print(f"複数銘柄一括取得: {', '.join(symbols)}")
+
+        session = _ResponseTrackingSession()
+        try:
+            # yfinanceのendは当日を含まないため1日延ばす
+            end_exclusive = (
+                datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+            ).strftime("%Y-%m-%d")
+            data = yf.download(
+                tickers=symbols,
+                start=start_date,
+                end=end_exclusive,
+                interval="1d",
+                group_by="ticker",
+                auto_adjust=True,
+                threads=True,
+                progress=False,
+                timeout=30,
+                session=session,
+            )
+        except Exception as e:
+            print(f"複数銘柄一括取得失敗: {str(e)}")
+            return {}
+        finally:
+            session.close()
+
+        result = {}
+        for stock_code, symbol in zip(stock_codes, symbols):
+            if data is None or data.empty:
+                stock_data = None
+            elif isinstance(data.columns, pd.MultiIndex):
+                if symbol in data.columns.get_level_values(0):
+                    stock_data = data[symbol].dropna(how="all")
+                else:
+                    stock_data = None
+            else:
+                # 1銘柄のみの場合は列がフラットになる
+                stock_data = data.dropna(how="all")
+
+            if stock_data is not None and not stock_data.empty:
+                result[stock_code] = stock_data
+            elif not session.failed_for(symbol):
+                # 応答は得られたがデータがなかった銘柄のみ、この期間について記録する
+                # （休日のみの期間や上場前の期間でも空になるため、銘柄全体は記録しない）
+                YFinanceProvider.mark_unavailable(stock_code, (start_date, end_date))
+
+        print(f"複数銘柄一括取得成功: {len(result)}/{len(stock_codes)}銘柄")
+        return result
+
+    def has_history(self, stock_code: str) -> bool:
+        """直近5日分の取得で銘柄の存在を確認"""
+        if YFinanceProvider.is_known_unavailable(stock_code, RECENT_PROBE_WINDOW):
+            return False
+
+        session = _ResponseTrackingSession()
+        try:
+            data = yf.Ticker(f"{stock_code}.T", session=session).history(
+                period="5d", timeout=10
+            )
+        except Exception as e:
+            print(f"銘柄確認失敗: {str(e)}")
+            return False
+        finally:
+            session.close()
+
+        if data.empty:
+            # 直近に取引がないだけで過去の株価はあり得るため、確認結果としてのみ記録する
+            if not session.failed_urls:
+                YFinanceProvider.mark_unavailable(stock_code, RECENT_PROBE_WINDOW)
+            return False
+        return True
+
+    def get_info(self, stock_code: str) -> Optional[Dict]:
+        try:
+            info = yf.Ticker(f"{stock_code}.T").info
+        except Exception as e:
+            print(f"銘柄情報取得失敗: {str(e)}")
+            return None
+
+        return {
+            "symbol": info.get("symbol", stock_code),
+            "name": info.get("shortName", info.get("longName", stock_code)),
+            "currency": info.get("currency", "JPY"),
+            "exchange": info.get("exchange", "JPX"),
+        }
+
+    @staticmethod
+    def is_known_unavailable(
+        stock_code: str, window: Optional[Tuple[str, str]] = None
+    ) -> bool:
+        """最近の取得で株価データが見つからなかった銘柄（またはその期間）かどうか"""
+        if _negative_cache.get(stock_code, False):
+            return True
+        return window is not None and _negative_cache.get((stock_code, *window), False)
+
+    @staticmethod
+    def mark_unavailable(
+        stock_code: str, window: Optional[Tuple[str, str]] = None
+    ) -> None:
+        """株価データが見つからなかった銘柄として記録（windowを渡すとその期間のみ）"""
+        key = stock_code if window is None else (stock_code, *window)
+        _negative_cache.set(key, True)
+
+    @staticmethod
+    def _download_with_fallbacks(
+        stock_code: str, start_date: str, end_date: str
+    ) -> Tuple[Optional[pd.DataFrame], bool]:
+        """yfinanceから株価データを取得（要求期間から順に範囲を広げて試行）
+
+        (データ, データが存在しないことを確認できたか) を返す。
+        いずれかの試行で例外・通信エラーが発生した場合、後者はFalseになる。
+        """
+        # 日本株の場合は.Tを追加
+        symbol = f"{stock_code}.T"
+        print(f"銘柄シンボル: {symbol}")
+
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d")
+
+        # (説明, history()の引数) の順に、取得できるまで範囲を広げる
+        attempts = [
+            # 方法1: 要求期間のみ（yfinanceのendは当日を含まないため1日延ばす）
+            (
+                "期間指定",
+                {
+                    "start": start_dt.strftime("%Y-%m-%d"),
+                    "end": (end_dt + timedelta(days=1)).strftime("%Y-%m-%d"),
+                },
+            ),
+            # 方法2: 開始日を3ヶ月前に、終了日を1ヶ月後に拡張
+            (
+                "拡張期間指定",
+                {
+                    "start": (
+                        start_dt - timedelta(days=WIDE_FETCH_BEFORE_DAYS)
+                    ).strftime("%Y-%m-%d"),
+                    "end": (end_dt + timedelta(days=WIDE_FETCH_AFTER_DAYS)).strftime(
+                        "%Y-%m-%d"
+                    ),
+                },
+            ),
+            # 方法3〜5: 期間指定で取得できない銘柄向けにperiod指定で取得
+            ("2年間", {"period": "2y"}),
+            ("5年間", {"period": "5y"}),
+            ("最大期間", {"period": "max"}),
+        ]
+
+        session = _ResponseTrackingSession()
+        stock = yf.Ticker(symbol, session=session)
+        # 株価取得の試行で例外が発生したか（発生した場合は存在しないと確認できていない）
+        history_failed = False
+        try:
+            for label, history_kwargs in attempts:
+                try:
+                    print(f"{label}でデータ取得を試行...")
+                    data = stock.history(
+                        interval="1d", auto_adjust=True, timeout=30, **history_kwargs
+                    )
+
+                    if not data.empty:
+                        print(
+                            f"株価データ取得成功 ({label}): {symbol}, データ数: {len(data)}"
+                        )
+                        print(
+                            f"データ期間: {data.index[0].strftime('%Y-%m-%d')} ~ {data.index[-1].strftime('%Y-%m-%d')}"
+                        )
+                        return data, False
+                except Exception as e:
+                    print(f"{label}取得失敗: {str(e)}")
+                    history_failed = True
+
+            # 方法6: 銘柄情報を確認
+            # （存在しない銘柄はエラー応答になるため、通信エラー以外の例外は失敗として扱わない）
+            try:
+                print("銘柄情報確認を試行...")
+                info = stock.info
+
+                if info and len(info) > 1:  # 空でない情報がある
+                    print(f"銘柄情報を取得: {info.get('shortName', 'N/A')}")
+                    # 情報が取得できるなら、再度データ取得を試行
+                    data = stock.history(period="1y", timeout=30)
+                    if not data.empty:
+                        print(f"銘柄情報確認後のデータ取得成功: {symbol}")
+                        return data, False
+            except Exception as e:
+                print(f"銘柄情報確認失敗: {str(e)}")
+        finally:
+            session.close()
+
+        print(f"すべての方法で株価データ取得に失敗: {symbol}")
+        # yfinanceは通信エラーを空のデータとして返すため、セッションの記録も確認する
+        confirmed_empty = not history_failed and not session.failed_urls
+        return None, confirmed_empty
+
+
+class LocalFileProvider(PriceProvider):
+    """ローカルファイル（<銘柄コード>.parquet または .csv）から読み込み"""
+
+    name = "local"
+
+    def __init__(self, directory: str = PRICE_DATA_DIR):
+        self.directory = directory
+
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        data = self._read(stock_code)
+        if data is None:
+            return None
+
+        data = data.loc[pd.Timestamp(start_date) : pd.Timestamp(end_date)]
+        return data if not data.empty else None
+
+    def _read(self, stock_code: str) -> Optional[pd.DataFrame]:
+        """銘柄のファイルを読み込み、日付インデックスに整形"""
+        parquet_path = os.path.join(self.directory, f"{stock_code}.parquet")
+        csv_path = os.path.join(self.directory, f"{stock_code}.csv")
+        try:
+            if os.path.exists(parquet_path):
+                data = pd.read_parquet(parquet_path)
+            elif os.path.exists(csv_path):
+                data = pd.read_csv(csv_path)
+            else:
+                return None
+        except Exception as e:
+            print(f"株価ファイル読み込みエラー: {stock_code}: {str(e)}")
+            return None
+
+        for column in ("Date", "date"):
+            if column in data.columns:
+                data = data.set_index(column)
+                break
+        data.index = pd.DatetimeIndex(pd.to_datetime(data.index))
+        return data.sort_index()
+
+
+class SyntheticProvider(PriceProvider):
+    """再現可能な合成データを生成（ネットワーク不要）
+
+    系列は銘柄ごとにカレンダーの全期間を1回だけ生成して保持し、そこから切り出すため、
+    取得範囲が異なっても同じ日付には同じ株価を返す。
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed: int = PRICE_SYNTHETIC_SEED):
+        self.seed = seed
+
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        return self.get_history_bulk([stock_code], start_date, end_date).get(
+            stock_code
+        )
+
+    def get_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        result = {}
+        for stock_code in stock_codes:
+            bars = _synthetic_series(stock_code, self.seed).loc[start_ts:end_ts]
+            if not bars.empty:
+                # 保持している系列を呼び出し元の変更から守るため複製して返す
+                result[stock_code] = bars.copy()
+        return result
+
+
+@lru_cache(maxsize=SYNTHETIC_SERIES_CACHE_SIZE)
+def _synthetic_series(stock_code: str, seed: int) -> pd.DataFrame:
+    """銘柄の合成株価をカレンダーの全期間について生成（銘柄・シードごとに1回）"""
+    sessions = TradingCalendar.sessions()
+    return SyntheticPrices.generate([stock_code], sessions[0], sessions[-1], seed)[
+        stock_code
+    ]
+
+
+class StoreCachedProvider(PriceProvider):
+    """ローカル株価ストアを優先し、不足期間のみ内側のプロバイダーから取得"""
+
+    def __init__(self, inner: PriceProvider):
+        self.inner = inner
+        self.name = f"store({inner.name})"
+
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        try:
+            return PriceStore.get_bars(
+                stock_code, start_date, end_date, self._fetch_history
+            )
+        except Exception as e:
+            print(f"株価ストア利用エラー: {str(e)} - 直接取得します")
+            return self.inner.get_history(stock_code, start_date, end_date)
+
+    def get_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        try:
+            return PriceStore.get_bars_bulk(
+                stock_codes, start_date, end_date, self._fetch_history_bulk
+            )
+        except Exception as e:
+            print(f"株価ストア利用エラー: {str(e)} - 直接取得します")
+            return self.inner.get_history_bulk(stock_codes, start_date, end_date)
+
+    def has_history(self, stock_code: str) -> bool:
+        # ストアに株価がある銘柄は取得元に問い合わせない
+        try:
+            if PriceStore.has_bars(stock_code):
+                return True
+        except Exception as e:
+            print(f"株価ストア利用エラー: {str(e)}")
+        return self.inner.has_history(stock_code)
+
+    def get_info(self, stock_code: str) -> Optional[Dict]:
+        return self.inner.get_info(stock_code)
+
+    def _fetch_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        """ストア用の取得関数（データがないと確認できた期間は空のDataFrameを返す）"""
+        data = self.inner.get_history(stock_code, start_date, end_date)
+        if data is None and self.inner.is_known_unavailable(
+            stock_code, (start_date, end_date)
+        ):
+            return pd.DataFrame()
+        return data
+
+    def _fetch_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        """ストア用の一括取得関数（データがないと確認できた銘柄は空のDataFrameを含める）"""
+        result = self.inner.get_history_bulk(stock_codes, start_date, end_date)
+        for stock_code in stock_codes:
+            if stock_code not in result and self.inner.is_known_unavailable(
+                stock_code, (start_date, end_date)
+            ):
+                result[stock_code] = pd.DataFrame()
+        return result
+
+
+class FallbackProvider(PriceProvider):
+    """先頭のプロバイダーから順に、取得できるまで試行"""
+
+    def __init__(self, providers: List[PriceProvider]):
+        self.providers = providers
+        self.name = ",".join(provider.name for provider in providers)
+
+    def get_history(
+        self, stock_code: str, start_date: str, end_date: str
+    ) -> Optional[pd.DataFrame]:
+        for provider in self.providers:
+            data = provider.get_history(stock_code, start_date, end_date)
+            if data is not None and not data.empty:
+                return data
+        return None
+
+    def get_history_bulk(
+        self, stock_codes: List[str], start_date: str, end_date: str
+    ) -> Dict[str, pd.DataFrame]:
+        result = {}
+        remaining = list(stock_codes)
+        for provider in self.providers:
+            if not remaining:
+                break
+            result.update(provider.get_history_bulk(remaining, start_date, end_date))
+            remaining = [code for code in remaining if code not in result]
+        return result
+
+    def has_history(self, stock_code: str) -> bool:
+        return any(provider.has_history(stock_code) for provider in self.providers)
+
+    def get_info(self, stock_code: str) -> Optional[Dict]:
+        for provider in self.providers:
+            info = provider.get_info(stock_code)
+            if info is not None:
+                return info
+        return None
+
+
+def build_price_provider(spec: str = PRICE_PROVIDER) -> PriceProvider:
+    """設定文字列からプロバイダーを組み立てる（カンマ区切りは先頭から順にフォールバック）"""
+    providers = []
+    for name in [part.strip() for part in spec.split(",") if part.strip()]:
+        if name == "yfinance":
+            providers.append(StoreCachedProvider(YFinanceProvider()))
+        elif name == "local":
+            providers.append(LocalFileProvider())
+        elif name == "synthetic":
+            providers.append(SyntheticProvider())
+        else:
+            raise ValueError(f"未対応の株価プロバイダーです: {name}")
+
+    if not providers:
+        raise ValueError("株価プロバイダーが指定されていません")
+
+    return providers[0] if len(providers) == 1 else FallbackProvider(providers)
+
+
+_provider: Optional[PriceProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_price_provider() -> PriceProvider:
+    """設定に基づくプロバイダーを取得（初回のみ組み立てる）"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_price_provider()
+                print(f"株価プロバイダー: {_provider.name}")
+    return _provider
+
+
+def set_price_provider(provider: Optional[PriceProvider]) -> None:
+    """使用するプロバイダーを差し替え（Noneで設定から組み立て直す）"""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,361 @@
+"""
+ローカル株価ストア
+銘柄ごとの日次OHLCVデータをデータベースに保存し、不足している期間のみ外部から補完する
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import and_, case, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql import func
+
+from database import PriceBar, PriceBarCoverage, session_scope
+from trading_calendar import TradingCalendar
+
+# 株価取得関数: (銘柄コード, 開始日, 終了日) -> DataFrame
+# （データがないと確認できた期間は空のDataFrame、取得に失敗した場合はNoneを返す）
+PriceFetcher = Callable[[str, str, str], Optional[pd.DataFrame]]
+
+# 複数銘柄の一括取得関数: (銘柄コード一覧, 開始日, 終了日) -> {銘柄コード: DataFrame}
+# （データがないと確認できた銘柄は空のDataFrame、取得に失敗した銘柄は含めない）
+BulkPriceFetcher = Callable[[List[str], str, str], Dict[str, pd.DataFrame]]
+
+# 取得データの先頭・末尾が要求範囲からこの日数以内なら範囲全体を取得済みとみなす（連休対策）
+COVERAGE_TOLERANCE_DAYS = 10
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class PriceStore:
+    """銘柄別の日次株価ストア"""
+
+    @staticmethod
+    def get_bars(
+        stock_code: str, start_date: str, end_date: str, fetcher: PriceFetcher
+    ) -> Optional[pd.DataFrame]:
+        """指定期間の株価を取得（ストアにない期間のみfetcherで取得して保存）"""
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = min(datetime.strptime(end_date, "%Y-%m-%d").date(), date.today())
+        # 日足が確定していない当日以降は取得対象にしない
+        settled_end = min(end, TradingCalendar.last_completed_session())
+
+        coverage = PriceStore.get_coverage(stock_code)
+        missing_ranges = PriceStore._missing_ranges(coverage, start, settled_end)
+
+        if not missing_ranges:
+            print(f"株価ストアから取得: {stock_code} ({start} ~ {end})")
+
+        for missing_start, missing_end in missing_ranges:
+            print(f"株価ストアに不足期間あり: {stock_code} ({missing_start} ~ {missing_end})")
+            data = fetcher(
+                stock_code,
+                missing_start.strftime("%Y-%m-%d"),
+                missing_end.strftime("%Y-%m-%d"),
+            )
+            if data is None:
+                # 取得失敗は取得済みにせず、次回の要求で再取得する
+                continue
+
+            # データがなかった期間も取得済みとして記録し、毎回の再取得を避ける
+            bars = PriceStore.normalize_bars(data)
+            PriceStore.save_bars(stock_code, bars, missing_start, missing_end)
+
+        return PriceStore.load_bars(stock_code, start, end)
+
+    @staticmethod
+    def get_bars_bulk(
+        stock_codes: List[str],
+        start_date: str,
+        end_date: str,
+        bulk_fetcher: BulkPriceFetcher,
+    ) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の株価を取得（ストアにない銘柄はbulk_fetcherで1回にまとめて取得）"""
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = min(datetime.strptime(end_date, "%Y-%m-%d").date(), date.today())
+        settled_end = min(end, TradingCalendar.last_completed_session())
+
+        # 不足期間がある銘柄は、全銘柄の不足期間を包む1つの範囲でまとめて取得する
+        fetch_codes = []
+        fetch_start, fetch_end = None, None
+        for stock_code in stock_codes:
+            coverage = PriceStore.get_coverage(stock_code)
+            for missing_start, missing_end in PriceStore._missing_ranges(
+                coverage, start, settled_end
+            ):
+                if stock_code not in fetch_codes:
+                    fetch_codes.append(stock_code)
+                fetch_start = min(fetch_start or missing_start, missing_start)
+                fetch_end = max(fetch_end or missing_end, missing_end)
+
+        if fetch_codes:
+            print(
+                f"株価ストアに不足期間あり: {len(fetch_codes)}銘柄 ({fetch_start} ~ {fetch_end})"
+            )
+            fetched = bulk_fetcher(
+                fetch_codes,
+                fetch_start.strftime("%Y-%m-%d"),
+                fetch_end.strftime("%Y-%m-%d"),
+            )
+            for stock_code, data in fetched.items():
+                if data is None:
+                    continue
+                bars = PriceStore.normalize_bars(data)
+                PriceStore.save_bars(stock_code, bars, fetch_start, fetch_end)
+
+        result = {}
+        for stock_code in stock_codes:
+            bars = PriceStore.load_bars(stock_code, start, end)
+            if bars is not None:
+                result[stock_code] = bars
+        return result
+
+    @staticmethod
+    def normalize_bars(data: pd.DataFrame) -> pd.DataFrame:
+        """yfinance形式のデータを日付インデックス（東京時間・タイムゾーンなし）に整形"""
+        if data.empty:
+            return pd.DataFrame(columns=OHLCV_COLUMNS, index=pd.DatetimeIndex([]))
+
+        bars = data.copy()
+        if bars.index.tz is not None:
+            bars.index = bars.index.tz_convert("Asia/Tokyo").tz_localize(None)
+        bars.index = pd.DatetimeIndex(bars.index).normalize()
+
+        for column in OHLCV_COLUMNS:
+            if column not in bars.columns:
+                bars[column] = None
+
+        bars = bars[OHLCV_COLUMNS].dropna(subset=["Close"])
+        bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+        return bars
+
+    @staticmethod
+    def get_coverage(stock_code: str) -> List[Tuple[date, date]]:
+        """銘柄の取得済み期間を取得（重なり・隣接する期間は結合し、開始日順に返す）"""
+        query = (
+            select(PriceBarCoverage.covered_from, PriceBarCoverage.covered_to)
+            .where(PriceBarCoverage.stock_code == stock_code)
+            .order_by(PriceBarCoverage.covered_from)
+        )
+        with session_scope() as db:
+            rows = db.execute(query).all()
+        return PriceStore._merge_ranges([(row[0], row[1]) for row in rows])
+
+    @staticmethod
+    def has_bars(stock_code: str) -> bool:
+        """銘柄の株価データが1件以上保存されているか"""
+        query = select(PriceBar.date).where(PriceBar.stock_code == stock_code).limit(1)
+        with session_scope() as db:
+            return db.execute(query).first() is not None
+
+    @staticmethod
+    def save_bars(
+        stock_code: str, bars: pd.DataFrame, requested_start: date, requested_end: date
+    ) -> None:
+        """株価データを保存し、取得済み期間を追加（データが空の場合は期間のみ記録）"""
+        records = [
+            {
+                "stock_code": stock_code,
+                "date": bar.Index.date(),
+                "open": PriceStore._to_float(bar.Open),
+                "high": PriceStore._to_float(bar.High),
+                "low": PriceStore._to_float(bar.Low),
+                "close": float(bar.Close),
+                "volume": PriceStore._to_float(bar.Volume),
+            }
+            for bar in bars.itertuples()
+        ]
+
+        if records:
+            covered_from, covered_to = PriceStore._covered_span(
+                records[0]["date"], records[-1]["date"], requested_start, requested_end
+            )
+        else:
+            # 上場前・休日のみなど、取得元に問い合わせてデータがなかった期間
+            covered_from = requested_start
+            covered_to = min(requested_end, TradingCalendar.last_completed_session())
+
+        with session_scope() as db:
+            dialect = db.get_bind().dialect.name
+            table = PriceBar.__table__
+
+            # 同じ日付の既存データは最新の取得結果で置き換える（同時保存でも主キー違反にしない）
+            if records:
+                statement = PriceStore._insert(dialect, table)
+                db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[table.c.stock_code, table.c.date],
+                        set_={
+                            column: statement.excluded[column]
+                            for column in ("open", "high", "low", "close", "volume")
+                        },
+                    ),
+                    records,
+                )
+
+            if covered_from <= covered_to:
+                PriceStore._add_coverage(
+                    db, dialect, stock_code, covered_from, covered_to
+                )
+
+        print(f"株価ストアに保存: {stock_code}, データ数: {len(records)}")
+
+    @staticmethod
+    def _add_coverage(
+        db, dialect: str, stock_code: str, covered_from: date, covered_to: date
+    ) -> None:
+        """取得済み期間を追加し、重なる・隣接する既存の期間と1行に結合"""
+        coverage = PriceBarCoverage
+        one_day = timedelta(days=1)
+        touching = and_(
+            coverage.stock_code == stock_code,
+            coverage.covered_from <= covered_to + one_day,
+            coverage.covered_to >= covered_from - one_day,
+        )
+
+        rows = db.execute(
+            select(coverage.covered_from, coverage.covered_to).where(touching)
+        ).all()
+        for row_from, row_to in rows:
+            covered_from = min(covered_from, row_from)
+            covered_to = max(covered_to, row_to)
+
+        if rows:
+            db.execute(
+                coverage.__table__.delete().where(
+                    and_(
+                        coverage.stock_code == stock_code,
+                        or_(*[coverage.covered_from == row[0] for row in rows]),
+                    )
+                )
+            )
+
+        # 同時に同じ開始日の期間が保存された場合は、長い方の終了日を残す
+        table = coverage.__table__
+        statement = PriceStore._insert(dialect, table).values(
+            stock_code=stock_code, covered_from=covered_from, covered_to=covered_to
+        )
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.stock_code, table.c.covered_from],
+                set_={
+                    "covered_to": case(
+                        (
+                            table.c.covered_to > statement.excluded.covered_to,
+                            table.c.covered_to,
+                        ),
+                        else_=statement.excluded.covered_to,
+                    ),
+                    "updated_at": func.now(),
+                },
+            )
+        )
+
+    @staticmethod
+    def _insert(dialect: str, table):
+        """ON CONFLICT DO UPDATEに対応したINSERT文（PostgreSQL・SQLite）"""
+        if dialect == "postgresql":
+            return postgresql.insert(table)
+        if dialect == "sqlite":
+            return sqlite.insert(table)
+        raise ValueError(f"株価ストアが対応していないデータベースです: {dialect}")
+
+    @staticmethod
+    def load_bars(
+        stock_code: str, start: date, end: date
+    ) -> Optional[pd.DataFrame]:
+        """ストアから指定期間の株価データを読み込み"""
+        query = (
+            select(
+                PriceBar.date,
+                PriceBar.open,
+                PriceBar.high,
+                PriceBar.low,
+                PriceBar.close,
+                PriceBar.volume,
+            )
+            .where(
+                and_(
+                    PriceBar.stock_code == stock_code,
+                    PriceBar.date >= start,
+                    PriceBar.date <= end,
+                )
+            )
+            .order_by(PriceBar.date)
+        )
+
+        with session_scope() as db:
+            rows = db.execute(query).all()
+
+        if not rows:
+            return None
+
+        data = pd.DataFrame.from_records(rows, columns=["Date"] + OHLCV_COLUMNS)
+        data.index = pd.DatetimeIndex(pd.to_datetime(data.pop("Date")))
+        return data
+
+    @staticmethod
+    def _missing_ranges(
+        coverage: List[Tuple[date, date]], start: date, end: date
+    ) -> List[Tuple[date, date]]:
+        """取得済み期間に含まれない範囲を計算（営業日を含まない範囲は除く）"""
+        missing = []
+        cursor = start
+        for covered_from, covered_to in coverage:
+            if cursor > end or covered_from > end:
+                break
+            if covered_to < cursor:
+                continue
+            if covered_from > cursor:
+                missing.append((cursor, covered_from - timedelta(days=1)))
+            cursor = covered_to + timedelta(days=1)
+        if cursor <= end:
+            missing.append((cursor, end))
+
+        # 週末・祝日だけの範囲は取得しても日足が存在しない
+        return [
+            (missing_start, missing_end)
+            for missing_start, missing_end in missing
+            if TradingCalendar.session_count(missing_start, missing_end) > 0
+        ]
+
+    @staticmethod
+    def _merge_ranges(ranges: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+        """重なる・隣接する期間を結合して開始日順に並べる"""
+        merged: List[Tuple[date, date]] = []
+        for range_from, range_to in sorted(ranges):
+            if merged and range_from <= merged[-1][1] + timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], range_to))
+            else:
+                merged.append((range_from, range_to))
+        return merged
+
+    @staticmethod
+    def _covered_span(
+        first_date: date, last_date: date, requested_start: date, requested_end: date
+    ) -> Tuple[date, date]:
+        """取得結果から取得済みとみなせる期間を計算"""
+        tolerance = timedelta(days=COVERAGE_TOLERANCE_DAYS)
+
+        if first_date <= requested_start + tolerance:
+            covered_from = min(first_date, requested_start)
+        else:
+            # 上場日より前など、要求範囲の先頭にデータが存在しない
+            covered_from = first_date
+
+        if last_date >= requested_end - tolerance:
+            covered_to = max(last_date, requested_end)
+        else:
+            covered_to = last_date
+
+        # 日足が確定していない当日分は取得済みにしない
+        covered_to = min(covered_to, TradingCalendar.last_completed_session())
+        return covered_from, covered_to
+
+    @staticmethod
+    def _to_float(value) -> Optional[float]:
+        """欠損値をNoneに変換してfloat化"""
+        if value is None or pd.isna(value):
+            return None
+        return float(value)
@@ -0,0 +1,213 @@
+"""
+リクエストごとの処理時間の内訳
+株価取得・DBクエリ・統計分析・テンプレート描画にかかった時間をリクエスト単位で集計し、
+Server-Timingヘッダーとして返す（ブラウザの開発者ツールのタイミング欄に表示される）
+
+各項目は排他的な内訳ではなく重なり合う。株価ストアの読み込み（stock）や
+統計分析（analytics）の中で実行したクエリは db にも加算されるため、
+項目の合計は total と一致しない（同じ項目の入れ子のみ二重に数えない）。
+
+?profile=1 を付けたリクエストはcProfileで計測し、レスポンスの代わりに
+関数ごとの累積時間のレポートを返す（REQUEST_PROFILING=true の場合のみ）。
+イベントループのプロファイラーは1つしか有効にできないため、同時にプロファイルできるのは
+1リクエストのみ（プロファイル中の他の ?profile=1 リクエストは409を返す）。
+
+集計先はcontextvarで保持するため、スレッドプールで実行した処理の時間も
+呼び出し元のリクエストに加算される。ストリーミングレスポンスは本文の送信前までを計測する。
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import event
+
+T = TypeVar("T")
+
+# ?profile=1 によるプロファイルを許可するか
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# プロファイルレポートに表示する関数の数
+PROFILE_REPORT_LIMIT = int(os.getenv("PROFILE_REPORT_LIMIT", "60"))
+
+# Server-Timingの項目名 -> 説明（ヘッダーはASCIIのみのため英語、項目間で時間は重なる）
+TIMING_METRICS = {
+    "stock": "Price provider",
+    "db": "DB queries",
+    "analytics": "ModelAnalytics",
+    "template": "Template rendering",
+}
+
+
+class _Recorder:
+    """1リクエスト分の項目別の合計時間・回数"""
+
+    def __init__(self, profile: bool = False):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.totals: Dict[str, List[float]] = {}
+        self.profiles: Optional[List[cProfile.Profile]] = [] if profile else None
+
+    def add(self, metric: str, seconds: float) -> None:
+        with self._lock:
+            total = self.totals.setdefault(metric, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def add_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self.profiles.append(profile)
+
+
+_recorder: ContextVar[Optional[_Recorder]] = ContextVar("request_timing", default=None)
+
+# プロファイル中のリクエストがあるか（cProfileはスレッドごとに1つしか有効にできない）
+_profiling_lock = threading.Lock()
+
+# 計測中の項目（入れ子の呼び出しを二重に数えないため）
+_active_metrics: ContextVar[frozenset] = ContextVar(
+    "request_timing_active", default=frozenset()
+)
+
+
+class RequestTiming:
+    """リクエスト単位の処理時間の計測"""
+
+    @staticmethod
+    def start(profile: bool = False) -> _Recorder:
+        """現在のコンテキストで計測を開始"""
+        recorder = _Recorder(profile=profile)
+        _recorder.set(recorder)
+        return recorder
+
+    @staticmethod
+    @contextmanager
+    def measure(metric: str) -> Iterator[None]:
+        """ブロックの処理時間を項目に加算（計測中でなければ何もしない）"""
+        recorder = _recorder.get()
+        active = _active_metrics.get()
+        if recorder is None or metric in active:
+            yield
+            return
+
+        token = _active_metrics.set(active | {metric})
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            recorder.add(metric, time.perf_counter() - started)
+            _active_metrics.reset(token)
+
+    @staticmethod
+    def timed(metric: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+        """関数の処理時間を項目に加算するデコレーター"""
+
+        def decorator(func: Callable[..., T]) -> Callable[..., T]:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with RequestTiming.measure(metric):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    @contextmanager
+    def exclusive_profiling() -> Iterator[bool]:
+        """プロファイルを1リクエストずつに制限（他のリクエストをプロファイル中ならFalse）"""
+        acquired = _profiling_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _profiling_lock.release()
+
+    @staticmethod
+    def profiled(func: Callable[..., T]) -> Callable[..., T]:
+        """プロファイル中のリクエストなら、スレッドプールで実行する関数もcProfileで計測"""
+        recorder = _recorder.get()
+        if recorder is None or recorder.profiles is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                recorder.add_profile(profile)
+
+        return wrapper
+
+    @staticmethod
+    def instrument_engine(engine) -> None:
+        """SQLAlchemyエンジンの全クエリの実行時間を db 項目に加算"""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(
+            connection, cursor, statement, parameters, context, executemany
+        ):
+            if _recorder.get() is not None:
+                connection.info.setdefault("request_timing", []).append(
+                    time.perf_counter()
+                )
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(
+            connection, cursor, statement, parameters, context, executemany
+        ):
+            recorder = _recorder.get()
+            started = connection.info.get("request_timing")
+            if recorder is not None and started:
+                recorder.add("db", time.perf_counter() - started.pop())
+
+    @staticmethod
+    def server_timing_header(recorder: _Recorder) -> str:
+        """Server-Timingヘッダーの値（項目ごとの合計ミリ秒と回数、末尾に全体時間）"""
+        entries = []
+        for metric, description in TIMING_METRICS.items():
+            total = recorder.totals.get(metric)
+            if total is None:
+                continue
+            seconds, count = total
+            entries.append(
+                f'{metric};dur={seconds * 1000:.1f};desc="{description} x{count}"'
+            )
+        total_ms = (time.perf_counter() - recorder.started) * 1000
+        entries.append(f'total;dur={total_ms:.1f};desc="Total"')
+        return ", ".join(entries)
+
+    @staticmethod
+    def profile_report(recorder: _Recorder, loop_profile: cProfile.Profile) -> str:
+        """イベントループとスレッドプールのプロファイルをまとめた累積時間順のレポート"""
+        stream = io.StringIO()
+        stream.write("Server-Timing: " + RequestTiming.server_timing_header(recorder))
+        stream.write("\n\n")
+
+        stats = pstats.Stats(loop_profile, stream=stream)
+        for profile in recorder.profiles:
+            stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(PROFILE_REPORT_LIMIT)
+        return stream.getvalue()
+
+
+class TimedJinja2Templates(Jinja2Templates):
+    """テンプレートの描画時間を template 項目に加算するJinja2Templates"""
+
+    def TemplateResponse(self, *args, **kwargs):
+        with RequestTiming.measure("template"):
+            return super().TemplateResponse(*args, **kwargs)
+
@@ -0,0 +1,342 @@
+"""
+固定銘柄分析の一括再計算
+保存済みの分析を銘柄コード順に読み進め、バッチ内の全銘柄の株価系列を1回でまとめて取得して
+実際の最高・最安値と各種精度・総合スコアを配列演算で再計算し、一括UPDATEで書き戻す
+
+処理済みの位置をチェックポイント（JSON）に保存するため、中断しても続きから再開できる
+
+最高・最安値は保存済みの購入日・売却日（実際に約定した営業日）の間で再計算する。
+分析時は入力された日付の間で計算しているため、売却日に休日を指定した分析では
+売却日が翌営業日に繰り下がった分だけ期間が1営業日延び、最高・最安値が変わることがある
+（入力された日付は保存していないため、実際の営業日の期間を正とする）
+
+コマンドラインから実行:
+    python rescore.py [--batch-size 5000] [--checkpoint ./rescore_checkpoint.json]
+                      [--keep-actuals] [--restart]
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func, or_, select, update
+
+from database import DatabaseManager, FixedStockAnalysis, engine, session_scope
+from stock_analyzer import StockAnalyzer
+
+# 1バッチあたりの読み込み行数
+RESCORE_BATCH_SIZE = 5000
+
+# チェックポイントの保存先
+RESCORE_CHECKPOINT_PATH = "./rescore_checkpoint.json"
+
+# 再計算に使用する列
+RESCORE_COLUMNS = [
+    "id",
+    "stock_code",
+    "buy_date",
+    "sell_date",
+    "buy_price",
+    "sell_price",
+    "predicted_high",
+    "predicted_low",
+    "predicted_close",
+    "actual_high",
+    "actual_low",
+]
+
+
+class Rescorer:
+    """固定銘柄分析の再計算"""
+
+    @staticmethod
+    def run(
+        batch_size: int = RESCORE_BATCH_SIZE,
+        checkpoint_path: str = RESCORE_CHECKPOINT_PATH,
+        refresh_actuals: bool = True,
+        restart: bool = False,
+    ) -> int:
+        """全件を再計算して更新件数を返す（完了時にチェックポイントを削除）"""
+        checkpoint = None if restart else Rescorer.load_checkpoint(checkpoint_path)
+        if checkpoint:
+            print(
+                f"チェックポイントから再開: {checkpoint['stock_code']} (id={checkpoint['id']}),"
+                f" 更新済み {checkpoint['updated_rows']}件"
+            )
+        updated_rows = checkpoint["updated_rows"] if checkpoint else 0
+        position = (checkpoint["stock_code"], checkpoint["id"]) if checkpoint else None
+
+        # 1バッチに収まらない銘柄の株価（続きのバッチでも取得し直さずに使う）
+        carried_bars: Dict[str, pd.DataFrame] = {}
+
+        while True:
+            frame = Rescorer._fetch_batch(position, batch_size)
+            if frame.empty:
+                break
+
+            # 末尾の銘柄が次のバッチに続く場合は次回にまとめて処理する
+            spans_batches = False
+            if len(frame) == batch_size:
+                last_code = frame["stock_code"].iloc[-1]
+                complete = frame["stock_code"] != last_code
+                if complete.any():
+                    frame = frame[complete]
+                else:
+                    # 1銘柄でバッチが埋まる場合は分割して処理する
+                    spans_batches = True
+
+            bars_by_code = {}
+            if refresh_actuals:
+                bars_by_code = Rescorer._load_bars(frame, carried_bars, spans_batches)
+                last_code = frame["stock_code"].iloc[-1]
+                carried_bars = (
+                    {last_code: bars_by_code[last_code]}
+                    if spans_batches and last_code in bars_by_code
+                    else {}
+                )
+
+            updates = []
+            for stock_code, rows in frame.groupby("stock_code", sort=False):
+                updates.extend(Rescorer.rescore_frame(rows, bars_by_code.get(stock_code)))
+
+            Rescorer._write_updates(updates)
+            updated_rows += len(updates)
+            position = (frame["stock_code"].iloc[-1], int(frame["id"].iloc[-1]))
+            Rescorer.save_checkpoint(checkpoint_path, position, updated_rows)
+            print(f"再計算: {updated_rows}件更新 ({position[0]}まで)")
+
+        # 集計テーブルのリターン・精度も書き換わるため作り直す
+        DatabaseManager.rebuild_model_performance_summary()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        print(f"✅ 再計算が完了しました: {updated_rows}件")
+        return updated_rows
+
+    @staticmethod
+    def rescore_frame(rows: pd.DataFrame, bars: Optional[pd.DataFrame]) -> List[Dict]:
+        """1銘柄分の行を再計算し、UPDATE用の辞書のリストを返す
+
+        最高・最安値は保存済みの購入日・売却日（実際の営業日）の間で計算する
+        """
+        buy_price = rows["buy_price"].to_numpy(dtype=float)
+        sell_price = rows["sell_price"].to_numpy(dtype=float)
+        actual_high = rows["actual_high"].to_numpy(dtype=float)
+        actual_low = rows["actual_low"].to_numpy(dtype=float)
+
+        if bars is not None:
+            high, low = StockAnalyzer.get_period_high_lows(
+                bars, rows["buy_date"].to_numpy(), rows["sell_date"].to_numpy()
+            )
+            actual_high = np.where(np.isnan(high), actual_high, high)
+            actual_low = np.where(np.isnan(low), actual_low, low)
+
+        # 最高・最安値が不明な場合は分析時と同じく購入・売却価格から推定
+        actual_high = np.where(
+            np.isnan(actual_high), np.maximum(buy_price, sell_price) * 1.01, actual_high
+        )
+        actual_low = np.where(
+            np.isnan(actual_low), np.minimum(buy_price, sell_price) * 0.99, actual_low
+        )
+
+        predicted_close = rows["predicted_close"].to_numpy(dtype=float)
+        predicted_high = rows["predicted_high"].to_numpy(dtype=float)
+        predicted_low = rows["predicted_low"].to_numpy(dtype=float)
+
+        close_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+            sell_price, predicted_close
+        )
+        high_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+            actual_high, predicted_high
+        )
+        low_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+            actual_low, predicted_low
+        )
+        overall_score = StockAnalyzer.calculate_overall_prediction_scores(
+            high_accuracy, low_accuracy, close_accuracy
+        )
+
+        # 予測値が未入力の行（旧形式のデータ）は精度・スコアをNULLのままにする
+        high_accuracy[np.isnan(predicted_high)] = np.nan
+        low_accuracy[np.isnan(predicted_low)] = np.nan
+        overall_score[
+            np.isnan(predicted_close) | np.isnan(predicted_high) | np.isnan(predicted_low)
+        ] = np.nan
+
+        result = pd.DataFrame(
+            {
+                "id": rows["id"].to_numpy(),
+                "actual_high": actual_high,
+                "actual_low": actual_low,
+                "profit_loss": sell_price - buy_price,
+                "return_rate": StockAnalyzer.calculate_return_rates(
+                    buy_price, sell_price
+                ),
+                "prediction_accuracy": close_accuracy,
+                "high_prediction_accuracy": high_accuracy,
+                "low_prediction_accuracy": low_accuracy,
+                "overall_prediction_score": overall_score,
+            }
+        )
+        return result.astype(object).where(result.notna(), None).to_dict("records")
+
+    @staticmethod
+    def load_checkpoint(path: str) -> Optional[Dict]:
+        """チェックポイントを読み込み（ない場合はNone）"""
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def save_checkpoint(
+        path: str, position: Tuple[str, int], updated_rows: int
+    ) -> None:
+        """処理済みの位置を保存（一時ファイルに書いてから置き換える）"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "stock_code": position[0],
+                    "id": position[1],
+                    "updated_rows": updated_rows,
+                    "updated_at": datetime.now().isoformat(),
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _fetch_batch(
+        position: Optional[Tuple[str, int]], batch_size: int
+    ) -> pd.DataFrame:
+        """(銘柄コード, id)の順で、前回の位置より後ろの行を取得"""
+        table = FixedStockAnalysis.__table__
+        query = select(*(table.c[column] for column in RESCORE_COLUMNS))
+        if position is not None:
+            stock_code, last_id = position
+            query = query.where(
+                or_(
+                    table.c.stock_code > stock_code,
+                    and_(table.c.stock_code == stock_code, table.c.id > last_id),
+                )
+            )
+        query = query.order_by(table.c.stock_code, table.c.id).limit(batch_size)
+
+        with engine.connect() as connection:
+            result = connection.execute(query)
+            return pd.DataFrame.from_records(
+                result.fetchall(), columns=list(result.keys())
+            )
+
+    @staticmethod
+    def _load_bars(
+        frame: pd.DataFrame,
+        carried_bars: Dict[str, pd.DataFrame],
+        spans_batches: bool,
+    ) -> Dict[str, pd.DataFrame]:
+        """バッチ内の全銘柄の株価を1回でまとめて取得（銘柄ごとに全行の期間をまとめる）
+
+        carried_barsの銘柄は取得済みの株価を使う。spans_batchesの場合（1銘柄で
+        バッチが埋まった場合）は、続きのバッチの行も含めた銘柄の全期間を取得する。
+        """
+        periods = frame.groupby("stock_code", sort=False).agg(
+            buy_date=("buy_date", "min"), sell_date=("sell_date", "max")
+        )
+        if spans_batches:
+            periods = Rescorer._stock_periods(list(periods.index))
+
+        bars_by_code = {
+            stock_code: carried_bars[stock_code]
+            for stock_code in periods.index
+            if stock_code in carried_bars
+        }
+        # サンプル銘柄は分析時もサンプル価格のため、保存済みの最高・最安値を使う
+        # （load_bars_bulkの戻り値に含まれない）
+        windows = {
+            stock_code: (
+                pd.Timestamp(row.buy_date).strftime("%Y-%m-%d"),
+                pd.Timestamp(row.sell_date).strftime("%Y-%m-%d"),
+            )
+            for stock_code, row in periods.iterrows()
+            if stock_code not in bars_by_code
+        }
+        if not windows:
+            return bars_by_code
+
+        try:
+            bars_by_code.update(StockAnalyzer.load_bars_bulk(windows))
+        except Exception as e:
+            print(f"株価取得エラー: {str(e)} - 保存済みの最高・最安値を使用")
+        return bars_by_code
+
+    @staticmethod
+    def _stock_periods(stock_codes: List[str]) -> pd.DataFrame:
+        """銘柄ごとの全行の期間（最初の購入日・最後の売却日）"""
+        table = FixedStockAnalysis.__table__
+        query = (
+            select(
+                table.c.stock_code,
+                func.min(table.c.buy_date).label("buy_date"),
+                func.max(table.c.sell_date).label("sell_date"),
+            )
+            .where(table.c.stock_code.in_(stock_codes))
+            .group_by(table.c.stock_code)
+        )
+        with engine.connect() as connection:
+            rows = connection.execute(query).all()
+        return pd.DataFrame.from_records(
+            rows, columns=["stock_code", "buy_date", "sell_date"]
+        ).set_index("stock_code")
+
+    @staticmethod
+    def _write_updates(updates: List[Dict]) -> None:
+        """主キー指定の一括UPDATE（1トランザクション）"""
+        if not updates:
+            return
+        with session_scope() as db:
+            db.execute(update(FixedStockAnalysis), updates)
+
+
+def main() -> None:
+    """コマンドラインから固定銘柄分析を再計算"""
+    parser = argparse.ArgumentParser(
+        description="固定銘柄分析の最高・最安値、精度、総合スコアを一括再計算"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=RESCORE_BATCH_SIZE,
+        help=f"1バッチあたりの行数（デフォルト: {RESCORE_BATCH_SIZE}）",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=RESCORE_CHECKPOINT_PATH,
+        help="チェックポイントファイルのパス",
+    )
+    parser.add_argument(
+        "--keep-actuals",
+        action="store_true",
+        help="株価を取得せず、保存済みの最高・最安値でスコアのみ再計算",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="チェックポイントを無視して最初から再計算",
+    )
+    args = parser.parse_args()
+
+    Rescorer.run(
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+        refresh_actuals=not args.keep_actuals,
+        restart=args.restart,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/bin/bash
+
+# データベース列指向エクスポートスクリプト（Parquet / Arrow IPC）
+# 使用方法: ./db_export_columnar.sh [parquet|arrow]
+
+echo "📊 Parquet / Arrow エクスポート"
+echo "=============================="
+echo ""
+
+# 引数チェック
+EXPORT_FORMAT=${1:-"parquet"}
+if [ "$EXPORT_FORMAT" != "parquet" ] && [ "$EXPORT_FORMAT" != "arrow" ]; then
+    echo "使用方法: $0 [parquet|arrow]"
+    echo "  parquet : zstd圧縮のParquet（デフォルト）"
+    echo "  arrow   : メモリマップ可能なArrow IPCファイル"
+    exit 1
+fi
+
+# Dockerコンテナ確認
+if ! docker compose ps | grep -q "web.*Up"; then
+    echo "❌ Webコンテナが起動していません"
+    echo "   docker compose up -d で起動してください"
+    exit 1
+fi
+
+# エクスポートディレクトリ（/appはホストのプロジェクトディレクトリにマウントされている）
+EXPORT_DIR="./columnar_exports"
+
+echo "📈 fixed_stock_analysis / stock_selection_analysis / ai_models をエクスポート中..."
+docker compose exec -T web python exporter.py --format "$EXPORT_FORMAT" --output-dir "$EXPORT_DIR"
+
+echo ""
+echo "📄 エクスポートファイル一覧:"
+echo "----------------------------"
+ls -lh $EXPORT_DIR
+
+echo ""
+echo "💡 読み込み例:"
+echo "-------------"
+echo "• pandas.read_parquet(\"$EXPORT_DIR/fixed_stock_analysis_<日時>.parquet\")"
+echo "• pyarrow.ipc.open_file(pyarrow.memory_map(\"<ファイル>.arrow\")).read_all()"
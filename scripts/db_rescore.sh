@@ -0,0 +1,19 @@
+#!/bin/bash
+
+# 固定銘柄分析の一括再計算スクリプト
+# 使用方法: ./db_rescore.sh [--keep-actuals] [--restart]
+
+echo "🔁 固定銘柄分析の一括再計算"
+echo "=========================="
+echo ""
+
+# Dockerコンテナ確認
+if ! docker compose ps | grep -q "web.*Up"; then
+    echo "❌ Webコンテナが起動していません"
+    echo "   docker compose up -d で起動してください"
+    exit 1
+fi
+
+echo "📈 最高・最安値、予測精度、総合スコアを再計算中..."
+echo "   （中断した場合は再実行するとチェックポイントから再開します）"
+docker compose exec -T web python rescore.py "$@"
@@ -61,6 +61,7 @@ docker exec $DB_CONTAINER psql -U $DB_USER -d $DB_NAME -c "
 DROP TABLE IF EXISTS fixed_stock_analysis CASCADE;
 DROP TABLE IF EXISTS stock_selection_analysis CASCADE;
 DROP TABLE IF EXISTS ai_models CASCADE;
+DROP TABLE IF EXISTS model_performance_summary CASCADE;
 "
 
 echo "✅ テーブル削除完了"
@@ -0,0 +1,27 @@
+#!/bin/bash
+
+# 負荷試験用の合成分析履歴の投入スクリプト
+# 使用方法: ./db_seed_synthetic.sh [--fixed-rows 500000] [--selection-rows 500000] [--seed 0] [--truncate]
+
+echo "🧪 合成分析履歴の投入"
+echo "===================="
+echo ""
+
+# Dockerコンテナ確認
+if ! docker compose ps | grep -q "web.*Up"; then
+    echo "❌ Webコンテナが起動していません"
+    echo "   docker compose up -d で起動してください"
+    exit 1
+fi
+
+if [[ " $* " == *" --truncate "* ]]; then
+    echo "⚠️  既存の分析データは全件削除されます"
+    read -p "続行しますか？ (yes/no): " confirm
+    if [ "$confirm" != "yes" ]; then
+        echo "❌ 投入をキャンセルしました"
+        exit 0
+    fi
+fi
+
+echo "📥 合成データを生成して COPY で投入中..."
+docker compose exec -T web python synthetic_history.py "$@"
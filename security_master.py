@@ -0,0 +1,177 @@
+"""
+上場銘柄マスタ
+JPXの上場銘柄一覧をローカルファイルから読み込み、銘柄コードの検証と銘柄名の取得をメモリ上で行う
+
+同梱の data/jpx_securities.csv は主要銘柄のみの初期データ。
+JPXから取得した全銘柄の一覧（更新ファイル）がある場合はそちらを優先し、網羅的なマスタとして扱う。
+
+コマンドラインから更新:
+    python security_master.py --refresh [--source <URLまたはファイルパス>]
+"""
+
+import argparse
+import csv
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 同梱の初期データ（主要銘柄のみ）
+BUNDLED_PATH = os.path.join(BASE_DIR, "data", "jpx_securities.csv")
+
+# JPXから取得した全銘柄の一覧の保存先
+REFRESHED_PATH = os.getenv(
+    "SECURITY_MASTER_PATH", os.path.join(BASE_DIR, "data", "jpx_securities_latest.csv")
+)
+
+# JPXが公開している上場銘柄一覧（Excel形式）
+JPX_LISTING_URL = os.getenv(
+    "SECURITY_MASTER_URL",
+    "https://www.jpx.co.jp/markets/statistics-equities/misc/tvdivq0000001vg2-att/data_j.xls",
+)
+
+# 更新ファイルがこの日数より古い場合はバックグラウンドで再取得する
+MAX_AGE_DAYS = float(os.getenv("SECURITY_MASTER_MAX_AGE_DAYS", "7"))
+
+# JPXの一覧の列名 -> マスタの列名
+JPX_COLUMNS = {"コード": "code", "銘柄名": "name", "市場・商品区分": "market"}
+
+
+class Security(NamedTuple):
+    """上場銘柄の情報"""
+
+    name: str
+    market: str
+    status: str
+
+
+class _Index(NamedTuple):
+    securities: Dict[str, Security]
+    authoritative: bool  # 全銘柄を網羅している（未登録なら存在しない銘柄）
+
+
+_index: Optional[_Index] = None
+_index_lock = threading.Lock()
+
+
+class SecurityMaster:
+    """上場銘柄マスタ（銘柄コード -> 銘柄情報）"""
+
+    @staticmethod
+    def lookup(stock_code: str) -> Optional[Security]:
+        """銘柄コードから銘柄情報を取得（未登録の場合はNone）"""
+        return SecurityMaster._get_index().securities.get(stock_code.strip().upper())
+
+    @staticmethod
+    def is_authoritative() -> bool:
+        """全銘柄の一覧を読み込んでいるか（Falseの場合は未登録でも存在する可能性がある）"""
+        return SecurityMaster._get_index().authoritative
+
+    @staticmethod
+    def reload() -> None:
+        """マスタを読み込み直す"""
+        global _index
+        with _index_lock:
+            _index = SecurityMaster._load_index()
+
+    @staticmethod
+    def refresh(source: str = JPX_LISTING_URL) -> int:
+        """JPXの上場銘柄一覧を取得して更新ファイルに保存し、件数を返す"""
+        if source.lower().endswith(".csv"):
+            listing = pd.read_csv(source, dtype=str)
+        else:
+            # JPXの一覧はxls形式のため、読み込みにxlrdを使用する
+            listing = pd.read_excel(source, dtype=str)
+
+        listing = listing.rename(columns=JPX_COLUMNS)
+        missing = [column for column in JPX_COLUMNS.values() if column not in listing]
+        if missing:
+            raise ValueError(f"上場銘柄一覧に必要な列がありません: {', '.join(missing)}")
+
+        listing = listing.dropna(subset=["code", "name"])
+        listing["code"] = listing["code"].str.strip().str.upper()
+        listing["status"] = "上場"
+
+        # 途中で失敗しても既存のファイルを壊さないよう、一時ファイルに書いてから置き換える
+        os.makedirs(os.path.dirname(REFRESHED_PATH), exist_ok=True)
+        temp_path = f"{REFRESHED_PATH}.tmp"
+        listing[["code", "name", "market", "status"]].to_csv(
+            temp_path, index=False, quoting=csv.QUOTE_MINIMAL
+        )
+        os.replace(temp_path, REFRESHED_PATH)
+
+        SecurityMaster.reload()
+        print(f"✅ 上場銘柄マスタを更新しました: {len(listing)}件")
+        return len(listing)
+
+    @staticmethod
+    def refresh_if_stale() -> None:
+        """更新ファイルがない・古い場合に再取得（失敗しても既存のマスタを使い続ける）"""
+        try:
+            if os.path.exists(REFRESHED_PATH):
+                age_days = (time.time() - os.path.getmtime(REFRESHED_PATH)) / 86400
+                if age_days < MAX_AGE_DAYS:
+                    return
+
+            SecurityMaster.refresh()
+        except Exception as e:
+            print(f"上場銘柄マスタ更新エラー: {str(e)} - 既存のマスタを使用します")
+
+    @staticmethod
+    def _get_index() -> _Index:
+        """マスタを取得（初回のみファイルから読み込む）"""
+        global _index
+        if _index is None:
+            with _index_lock:
+                if _index is None:
+                    _index = SecurityMaster._load_index()
+        return _index
+
+    @staticmethod
+    def _load_index() -> _Index:
+        """更新ファイル、なければ同梱の初期データからマスタを作成"""
+        authoritative = os.path.exists(REFRESHED_PATH)
+        path = REFRESHED_PATH if authoritative else BUNDLED_PATH
+
+        securities = {}
+        try:
+            with open(path, encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    securities[row["code"].strip().upper()] = Security(
+                        name=row["name"],
+                        market=row.get("market") or "",
+                        status=row.get("status") or "上場",
+                    )
+        except Exception as e:
+            print(f"上場銘柄マスタ読み込みエラー: {str(e)}")
+            return _Index(securities={}, authoritative=False)
+
+        print(f"上場銘柄マスタを読み込みました: {len(securities)}件 ({path})")
+        return _Index(securities=securities, authoritative=authoritative)
+
+
+def main() -> None:
+    """コマンドラインから上場銘柄マスタを更新"""
+    parser = argparse.ArgumentParser(description="上場銘柄マスタの更新")
+    parser.add_argument(
+        "--refresh", action="store_true", help="JPXの上場銘柄一覧を取得して更新"
+    )
+    parser.add_argument(
+        "--source",
+        default=JPX_LISTING_URL,
+        help="上場銘柄一覧のURLまたはファイルパス（xls / csv）",
+    )
+    args = parser.parse_args()
+
+    if args.refresh:
+        SecurityMaster.refresh(args.source)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,43 @@
-import warnings
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
 
-# yfinanceの警告を無視
-warnings.filterwarnings("ignore")
+from price_providers import get_price_provider
+from price_store import PriceStore
+from request_timing import RequestTiming
+from security_master import SecurityMaster
+from synthetic_data import SyntheticPrices
+from trading_calendar import TradingCalendar
+
+# サンプルデータで処理するテスト用銘柄
+SAMPLE_STOCK_CODES = ["7203", "6758", "9984", "8306", "4502", "1234", "5678"]
+
+# サンプル銘柄のうち実在する銘柄の名称（それ以外はテスト用の架空銘柄）
+SAMPLE_STOCK_NAMES = {
+    "7203": "トヨタ自動車",
+    "6758": "ソニーグループ",
+    "9984": "ソフトバンクグループ",
+    "8306": "三菱UFJフィナンシャルグループ",
+    "4502": "武田薬品工業",
+}
+
+# 直近営業日を探すために前後に取得する営業日数
+PRICE_CONTEXT_MARGIN_BUSINESS_DAYS = 5
+
+# 上記で直後の営業日が見つからない場合（長期休場など）に前後へ広げる日数
+PRICE_CONTEXT_WIDE_MARGIN_DAYS = 30
+
+# 総合予測スコアの重み（終値予測を最も重視し、最高・最安値は補助的に考慮）
+PREDICTION_SCORE_WEIGHTS = {
+    "close": 0.5,  # 終値予測の重み
+    "high": 0.25,  # 最高値予測の重み
+    "low": 0.25,  # 最安値予測の重み
+}
+
+# 配列版のスコア計算が受け付ける型
+ArrayLike = Union[np.ndarray, pd.Series]
 
 
 class StockAnalyzer:
@@ -18,36 +49,22 @@ class StockAnalyzer:
     ) -> Tuple[Optional[float], Optional[str]]:
         """サンプル価格を取得（テスト用）"""
         try:
-            import numpy as np
-
             target_dt = datetime.strptime(target_date, "%Y-%m-%d")
 
-            # 銘柄別の基本価格設定
-            base_prices = {
-                "7203": 2500,  # トヨタ
-                "6758": 12000,  # ソニー
-                "9984": 35000,  # ソフトバンク
-                "8306": 800,  # 三菱UFJ
-                "4502": 4500,  # 武田薬品
-                "1234": 1500,  # テスト銘柄1
-                "5678": 3000,  # テスト銘柄2
-            }
-
-            base_price = base_prices.get(stock_code, 1000)
+            base_price = SyntheticPrices.base_price(stock_code)
 
-            # 日付をシードにして一貫した価格を生成
+            # 日付をシードにして一貫した価格を生成（グローバルな乱数状態は変更しない）
             date_seed = int(target_dt.strftime("%Y%m%d")) + int(stock_code)
-            np.random.seed(date_seed)
+            random_state = np.random.RandomState(date_seed)
 
             # ランダムな変動を付与（±5%程度）
-            variation = np.random.uniform(-0.05, 0.05)
+            variation = random_state.uniform(-0.05, 0.05)
             price = base_price * (1 + variation)
 
-            # 最後の営業日を取得（土日曜日を除く）
-            while target_dt.weekday() >= 5:  # 土曜日（5）または日曜日（6）の場合
-                target_dt -= timedelta(days=1)
-
-            actual_date = target_dt.strftime("%Y-%m-%d")
+            # 指定日以前の最後の営業日（土日・祝日・年末年始を除く）
+            actual_date = TradingCalendar.to_strings(
+                TradingCalendar.prev_session(target_dt)
+            )
 
             print(f"サンプル価格生成: {stock_code} = ¥{price:,.2f} ({actual_date})")
             return round(price, 2), actual_date
@@ -57,315 +74,195 @@ class StockAnalyzer:
             # フォールバック価格
             return 1000.0, target_date
 
-    def _generate_sample_data(
-        stock_code: str, start_date: str, end_date: str
-    ) -> pd.DataFrame:
-        """テスト用サンプルデータを生成"""
-        try:
-            import numpy as np
-
-            start_dt = datetime.strptime(start_date, "%Y-%m-%d")
-            end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-
-            # 日付範囲を生成（土日曜日を除く）
-            date_range = pd.bdate_range(start=start_dt, end=end_dt)
-
-            # 銘柄別の基本価格設定
-            base_prices = {
-                "7203": 2500,  # トヨタ
-                "6758": 12000,  # ソニー
-                "9984": 35000,  # ソフトバンク
-                "8306": 800,  # 三菱UFJ
-                "4502": 4500,  # 武田薬品
-            }
-
-            base_price = base_prices.get(stock_code, 1000)
-
-            # ランダムウォークで価格を生成
-            np.random.seed(int(stock_code))  # 再現可能なデータのため
-
-            returns = np.random.normal(0.001, 0.02, len(date_range))  # 日次リターン
-            prices = [base_price]
-
-            for i in range(1, len(date_range)):
-                new_price = prices[-1] * (1 + returns[i])
-                prices.append(max(new_price, base_price * 0.5))  # 下限設定
-
-            # データフレームを作成
-            data = pd.DataFrame(
-                {
-                    "Open": [p * np.random.uniform(0.99, 1.01) for p in prices],
-                    "High": [p * np.random.uniform(1.00, 1.03) for p in prices],
-                    "Low": [p * np.random.uniform(0.97, 1.00) for p in prices],
-                    "Close": prices,
-                    "Volume": [np.random.randint(100000, 1000000) for _ in prices],
-                },
-                index=date_range,
-            )
-
-            # HighがOpen/Closeより低くならないよう調整
-            data["High"] = data[["Open", "Close", "High"]].max(axis=1)
-            data["Low"] = data[["Open", "Close", "Low"]].min(axis=1)
-
-            print(f"サンプルデータ生成完了: {stock_code}, データ数: {len(data)}")
-            return data
-
-        except Exception as e:
-            print(f"サンプルデータ生成エラー: {str(e)}")
-            return pd.DataFrame()
-
+    @staticmethod
+    @RequestTiming.timed("stock")
     def get_stock_data(
         stock_code: str, start_date: str, end_date: str
     ) -> Optional[pd.DataFrame]:
-        """株価データを取得（複数の方法を試行）"""
-        # 日本株の場合は.Tを追加
-        symbol = f"{stock_code}.T"
-        print(f"銘柄シンボル: {symbol}")
+        """設定された株価プロバイダーから株価データを取得"""
+        return get_price_provider().get_history(stock_code, start_date, end_date)
 
-        # 方法1: period指定で取得（最も安定）
-        try:
-            print("period指定でデータ取得を試行...")
-            stock = yf.Ticker(symbol)
-            data = stock.history(
-                period="2y",  # 2年間のデータ
-                interval="1d",
-                auto_adjust=True,
-                prepost=True,
-                timeout=30,
-            )
+    @staticmethod
+    @RequestTiming.timed("stock")
+    def load_bars_bulk(windows: Dict[str, Tuple[str, str]]) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の期間の株価を1回の取得でまとめて読み込み
+
+        windowsは銘柄コード -> (開始日, 終了日)。各期間の前後に直近営業日を探すための
+        営業日数を加え、全銘柄を包む範囲で1回だけ取得してから銘柄ごとの範囲に切り出す。
+        サンプル銘柄と株価を取得できなかった銘柄は戻り値に含まれない。
+        """
+        real_windows = {
+            stock_code: window
+            for stock_code, window in windows.items()
+            if stock_code not in SAMPLE_STOCK_CODES
+        }
+        if not real_windows:
+            return {}
 
-            if not data.empty:
-                print(
-                    f"株価データ取得成功 (period指定): {symbol}, データ数: {len(data)}"
-                )
-                print(
-                    f"データ期間: {data.index[0].strftime('%Y-%m-%d')} ~ {data.index[-1].strftime('%Y-%m-%d')}"
-                )
-                return data
-        except Exception as e:
-            print(f"period指定取得失敗: {str(e)}")
+        window_starts = TradingCalendar.shift_sessions(
+            pd.to_datetime([start for start, _ in real_windows.values()]),
+            -PRICE_CONTEXT_MARGIN_BUSINESS_DAYS,
+        )
+        window_ends = TradingCalendar.shift_sessions(
+            pd.to_datetime([end for _, end in real_windows.values()]),
+            PRICE_CONTEXT_MARGIN_BUSINESS_DAYS,
+        )
 
-        # 方法2: 5年間のデータを取得
-        try:
-            print("5年間データ取得を試行...")
-            stock = yf.Ticker(symbol)
-            data = stock.history(
-                period="5y", interval="1d", auto_adjust=True, timeout=30
-            )
+        data = get_price_provider().get_history_bulk(
+            list(real_windows),
+            TradingCalendar.to_strings(window_starts.min()),
+            TradingCalendar.to_strings(window_ends.max()),
+        )
 
-            if not data.empty:
-                print(f"株価データ取得成功 (5年間): {symbol}, データ数: {len(data)}")
-                return data
-        except Exception as e:
-            print(f"5年間データ取得失敗: {str(e)}")
+        bars_by_code = {}
+        for position, stock_code in enumerate(real_windows):
+            if stock_code not in data:
+                continue
+            bars = PriceStore.normalize_bars(data[stock_code]).loc[
+                pd.Timestamp(window_starts[position]) : pd.Timestamp(window_ends[position])
+            ]
+            if not bars.empty:
+                bars_by_code[stock_code] = bars
+        return bars_by_code
 
-        # 方法3: 最大期間で取得
-        try:
-            print("最大期間データ取得を試行...")
-            stock = yf.Ticker(symbol)
-            data = stock.history(
-                period="max", interval="1d", auto_adjust=True, timeout=30
+    @staticmethod
+    @RequestTiming.timed("stock")
+    def get_prices_bulk(
+        stock_codes: List[str],
+        target_dates: List[str],
+        bars_by_code: Optional[Dict[str, pd.DataFrame]] = None,
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """複数銘柄×複数日付の株価を一括で取得
+
+        各日付について指定日またはその直後の営業日の終値を求める。
+        戻り値は(終値, 実際の営業日)の2つのDataFrameで、いずれも
+        インデックスが指定日付、列が銘柄コードの横持ち形式。
+        取得できなかった組み合わせはNaN/Noneになる（サンプル銘柄以外の価格は生成しない）。
+        bars_by_codeにload_bars_bulkの結果を渡すと、株価を取得し直さずに解決する。
+        """
+        stock_codes = list(dict.fromkeys(stock_codes))
+        target_dates = list(dict.fromkeys(target_dates))
+        prices = pd.DataFrame(index=target_dates, columns=stock_codes, dtype=float)
+        actual_dates = pd.DataFrame(index=target_dates, columns=stock_codes, dtype=object)
+
+        if not stock_codes or not target_dates:
+            return prices, actual_dates
+
+        # サンプル銘柄は個別に生成
+        for stock_code in [c for c in stock_codes if c in SAMPLE_STOCK_CODES]:
+            for target_date in target_dates:
+                price, actual_date = StockAnalyzer._get_sample_price(
+                    stock_code, target_date
+                )
+                prices.at[target_date, stock_code] = price
+                actual_dates.at[target_date, stock_code] = actual_date
+
+        real_codes = [c for c in stock_codes if c not in SAMPLE_STOCK_CODES]
+        if not real_codes:
+            return prices, actual_dates
+
+        target_index = pd.DatetimeIndex(pd.to_datetime(target_dates))
+        if bars_by_code is None:
+            window = (
+                target_index.min().strftime("%Y-%m-%d"),
+                target_index.max().strftime("%Y-%m-%d"),
             )
-
-            if not data.empty:
-                print(f"株価データ取得成功 (最大期間): {symbol}, データ数: {len(data)}")
-                return data
-        except Exception as e:
-            print(f"最大期間データ取得失敗: {str(e)}")
-
-        # 方法4: 日付指定で取得（範囲を広げる）
-        try:
-            print("日付指定でデータ取得を試行...")
-            # 開始日を3ヶ月前に、終了日を1ヶ月後に拡張
-            extended_start = (
-                datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=90)
-            ).strftime("%Y-%m-%d")
-            extended_end = (
-                datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=30)
-            ).strftime("%Y-%m-%d")
-
-            stock = yf.Ticker(symbol)
-            data = stock.history(
-                start=extended_start,
-                end=extended_end,
-                interval="1d",
-                auto_adjust=True,
-                timeout=30,
+            bars_by_code = StockAnalyzer.load_bars_bulk(
+                {stock_code: window for stock_code in real_codes}
             )
 
-            if not data.empty:
-                print(f"株価データ取得成功 (日付指定): {symbol}, データ数: {len(data)}")
-                return data
-        except Exception as e:
-            print(f"日付指定取得失敗: {str(e)}")
+        bars_by_code = {
+            stock_code: bars_by_code[stock_code]
+            for stock_code in real_codes
+            if stock_code in bars_by_code
+        }
+        if not bars_by_code:
+            return prices, actual_dates
 
-        # 方法5: 銘柄情報を確認
-        try:
-            print("銘柄情報確認を試行...")
-            stock = yf.Ticker(symbol)
-            info = stock.info
-
-            if info and len(info) > 1:  # 空でない情報がある
-                print(f"銘柄情報を取得: {info.get('shortName', 'N/A')}")
-                # 情報が取得できるなら、再度データ取得を試行
-                data = stock.history(period="1y", timeout=30)
-                if not data.empty:
-                    print(f"銘柄情報確認後のデータ取得成功: {symbol}")
-                    return data
-        except Exception as e:
-            print(f"銘柄情報確認失敗: {str(e)}")
+        # 終値を横持ちにして、全日付の直近営業日を銘柄ごとに二分探索で解決
+        closes = pd.concat(
+            {code: bars["Close"] for code, bars in bars_by_code.items()}, axis=1
+        ).sort_index()
 
-        print(f"すべての方法で株価データ取得に失敗: {symbol}")
-        return None
+        for stock_code in closes.columns:
+            series = closes[stock_code].dropna()
+            if series.empty:
+                continue
+            positions = series.index.searchsorted(target_index)
+            positions = positions.clip(max=len(series) - 1)
+            prices[stock_code] = series.to_numpy()[positions]
+            actual_dates[stock_code] = series.index[positions].strftime("%Y-%m-%d")
+
+        return prices, actual_dates
 
     @staticmethod
     def get_closest_business_day_price(
         stock_code: str, target_date: str
     ) -> Tuple[Optional[float], Optional[str]]:
         """指定日またはその直後の営業日の株価を取得"""
-        try:
-            target_dt = datetime.strptime(target_date, "%Y-%m-%d")
-
-            print(f"株価データ取得開始: {stock_code}, 対象日: {target_date}")
-
-            # まずサンプルデータで試行（テスト目的）
-            if stock_code in ["7203", "6758", "9984", "8306", "4502", "1234", "5678"]:
-                print(f"サンプルデータで処理: {stock_code}")
-                return StockAnalyzer._get_sample_price(stock_code, target_date)
-
-            # 幅広い期間でデータを取得してからフィルタリング
-            start_date = (target_dt - timedelta(days=180)).strftime("%Y-%m-%d")
-            end_date = (target_dt + timedelta(days=180)).strftime("%Y-%m-%d")
-
-            data = StockAnalyzer.get_stock_data(stock_code, start_date, end_date)
-
-            if data is None or data.empty:
-                print(
-                    f"株価データが空またはNone: {stock_code} - サンプルデータでフォールバック"
-                )
-                return StockAnalyzer._get_sample_price(stock_code, target_date)
-
-            # タイムゾーンを除去して日付のみで比較
-            if data.index.tz is not None:
-                data.index = data.index.tz_convert("Asia/Tokyo").tz_localize(None)
-
-            print(
-                f"取得したデータ期間: {data.index[0].strftime('%Y-%m-%d')} ~ {data.index[-1].strftime('%Y-%m-%d')}"
-            )
-            print(f"データポイント数: {len(data)}")
-
-            # 指定日以降の最初の営業日を見つける
-            data_dates = [d.date() for d in data.index]
-            target_date_obj = target_dt.date()
-
-            # 指定日以降の日付を検索
-            valid_dates = [d for d in data_dates if d >= target_date_obj]
-
-            if not valid_dates:
-                # 指定日以降のデータがない場合、最後の営業日を使用
-                closest_date = max(data_dates)
-                print(f"指定日以降のデータなし、最後の営業日を使用: {closest_date}")
-            else:
-                closest_date = min(valid_dates)
-                print(f"最も近い営業日: {closest_date}")
-
-            closest_date_str = closest_date.strftime("%Y-%m-%d")
-
-            # その日の終値を取得
-            closest_datetime = pd.to_datetime(closest_date_str)
-            price_data = data[data.index.date == closest_date]
-
-            if price_data.empty:
-                print(
-                    f"指定日の価格データが見つかりません: {closest_date} - サンプルデータでフォールバック"
-                )
-                return StockAnalyzer._get_sample_price(stock_code, target_date)
-
-            price = float(price_data["Close"].iloc[0])
-            print(f"取得した株価: ¥{price:,.2f} ({closest_date_str})")
-
-            return price, closest_date_str
-
-        except Exception as e:
-            print(f"株価取得エラー: {str(e)}")
-            print(f"サンプルデータでフォールバック: {stock_code}")
-            return StockAnalyzer._get_sample_price(stock_code, target_date)
+        price_context = PriceContext(stock_code, target_date, target_date)
+        return price_context.get_closest_business_day_price(target_date)
 
     @staticmethod
     def validate_stock_code(stock_code: str) -> bool:
-        """銘柄コードの妥当性をチェック"""
+        """銘柄コードの妥当性をチェック（上場銘柄マスタを優先）"""
+        if SecurityMaster.lookup(stock_code) is not None:
+            return True
+        if SecurityMaster.is_authoritative():
+            return False
+
         try:
-            # 簡単なテスト取得
-            symbol = f"{stock_code}.T"
-            stock = yf.Ticker(symbol)
-            # period指定で取得してみる
-            data = stock.history(period="5d", timeout=10)
-            return not data.empty
-        except:
+            # マスタが初期データのみの場合は株価プロバイダーで直近の株価を確認
+            return get_price_provider().has_history(stock_code)
+        except Exception as e:
+            print(f"銘柄コード確認エラー: {str(e)}")
             return False
 
     @staticmethod
+    @RequestTiming.timed("stock")
     def get_stock_info(stock_code: str) -> dict:
         """銘柄の基本情報を取得"""
         try:
             # サンプル銘柄の場合は直接情報を返す
-            sample_info = {
-                "7203": {"name": "トヨタ自動車", "status": "アクティブ"},
-                "6758": {"name": "ソニーグループ", "status": "アクティブ"},
-                "9984": {"name": "ソフトバンクグループ", "status": "アクティブ"},
-                "8306": {
-                    "name": "三菱UFJフィナンシャルグループ",
-                    "status": "アクティブ",
-                },
-                "4502": {"name": "武田薬品工業", "status": "アクティブ"},
-                "1234": {"name": "テスト企業1", "status": "テスト"},
-                "5678": {"name": "テスト企業2", "status": "テスト"},
-            }
+            if stock_code in SAMPLE_STOCK_CODES:
+                return StockAnalyzer._sample_stock_info(stock_code)
 
-            if stock_code in sample_info:
-                info = sample_info[stock_code]
+            no_data_info = {
+                "symbol": stock_code,
+                "name": f"銘柄{stock_code}",
+                "currency": "JPY",
+                "exchange": "JPX",
+                "status": "データなし",
+            }
+            # 上場銘柄マスタから取得（ネットワークアクセスなし）
+            security = SecurityMaster.lookup(stock_code)
+            if security is not None:
                 return {
                     "symbol": stock_code,
-                    "name": info["name"],
+                    "name": security.name,
                     "currency": "JPY",
                     "exchange": "JPX",
-                    "status": info["status"],
+                    "market": security.market,
+                    "status": "アクティブ",
                 }
 
-            # 実際のyfinanceで取得を試行
-            symbol = f"{stock_code}.T"
-            stock = yf.Ticker(symbol)
+            if SecurityMaster.is_authoritative():
+                return no_data_info
 
-            # データ取得で銘柄の存在を確認
-            data = stock.history(period="5d", timeout=10)
+            # 株価プロバイダーで銘柄の存在を確認
+            provider = get_price_provider()
+            if not provider.has_history(stock_code):
+                return no_data_info
 
-            if data.empty:
-                return {
-                    "symbol": stock_code,
-                    "name": f"銘柄{stock_code}",
-                    "currency": "JPY",
-                    "exchange": "JPX",
-                    "status": "データなし",
-                }
-
-            # 情報取得を試行
-            try:
-                info = stock.info
-                return {
-                    "symbol": info.get("symbol", stock_code),
-                    "name": info.get("shortName", info.get("longName", stock_code)),
-                    "currency": info.get("currency", "JPY"),
-                    "exchange": info.get("exchange", "JPX"),
-                    "status": "アクティブ",
-                }
-            except:
-                return {
-                    "symbol": stock_code,
-                    "name": f"銘柄{stock_code}",
-                    "currency": "JPY",
-                    "exchange": "JPX",
-                    "status": "アクティブ",
-                }
+            # 情報取得を試行（取得元が銘柄情報を持たない場合は既定値）
+            info = provider.get_info(stock_code) or {}
+            return {
+                "symbol": info.get("symbol", stock_code),
+                "name": info.get("name", f"銘柄{stock_code}"),
+                "currency": info.get("currency", "JPY"),
+                "exchange": info.get("exchange", "JPX"),
+                "status": "アクティブ",
+            }
 
         except Exception as e:
             print(f"銘柄情報取得エラー: {str(e)}")
@@ -377,6 +274,27 @@ class StockAnalyzer:
                 "status": "エラー",
             }
 
+    @staticmethod
+    def _sample_stock_info(stock_code: str) -> dict:
+        """サンプル銘柄の基本情報（架空銘柄は「テスト企業N」）"""
+        name = SAMPLE_STOCK_NAMES.get(stock_code)
+        if name is None:
+            test_codes = [
+                code for code in SAMPLE_STOCK_CODES if code not in SAMPLE_STOCK_NAMES
+            ]
+            name = f"テスト企業{test_codes.index(stock_code) + 1}"
+            status = "テスト"
+        else:
+            status = "アクティブ"
+
+        return {
+            "symbol": stock_code,
+            "name": name,
+            "currency": "JPY",
+            "exchange": "JPX",
+            "status": status,
+        }
+
     @staticmethod
     def calculate_return_rate(buy_price: float, sell_price: float) -> float:
         """騰落率を計算"""
@@ -384,54 +302,48 @@ class StockAnalyzer:
             return 0
         return ((sell_price - buy_price) / buy_price) * 100
 
+    @staticmethod
+    def calculate_return_rates(buy_prices: ArrayLike, sell_prices: ArrayLike) -> ArrayLike:
+        """騰落率を配列単位で計算（calculate_return_rateと同じ結果）"""
+        buy = np.asarray(buy_prices, dtype=float)
+        sell = np.asarray(sell_prices, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = ((sell - buy) / buy) * 100
+        return _like(np.where(buy == 0, 0.0, rates), buy_prices)
+
     @staticmethod
     def get_period_high_low_prices(
         stock_code: str, start_date: str, end_date: str
     ) -> Tuple[Optional[float], Optional[float]]:
         """期間中の最高値と最安値を取得"""
-        try:
-            # サンプルデータの場合
-            if stock_code in ["7203", "6758", "9984", "8306", "4502", "1234", "5678"]:
-                # 簡単なシミュレーションで最高・最安値を生成
-                buy_price, _ = StockAnalyzer.get_closest_business_day_price(stock_code, start_date)
-                sell_price, _ = StockAnalyzer.get_closest_business_day_price(stock_code, end_date)
-                
-                if buy_price is None or sell_price is None:
-                    return None, None
-                
-                # 簡単なシミュレーション：最高値は+2%、最安値は-1.5%
-                price_range = max(buy_price, sell_price)
-                high_price = price_range * 1.02
-                low_price = min(buy_price, sell_price) * 0.985
-                
-                return high_price, low_price
-            
-            # 実際のデータ取得を試行
-            data = StockAnalyzer.get_stock_data(stock_code, start_date, end_date)
-            if data is None or data.empty:
-                return None, None
-            
-            # 期間でフィルタリング
-            start_dt = pd.to_datetime(start_date)
-            end_dt = pd.to_datetime(end_date)
-            
-            if data.index.tz is not None:
-                data.index = data.index.tz_convert("Asia/Tokyo").tz_localize(None)
-            
-            mask = (data.index >= start_dt) & (data.index <= end_dt)
-            period_data = data[mask]
-            
-            if period_data.empty:
-                return None, None
-            
-            high_price = float(period_data["High"].max())
-            low_price = float(period_data["Low"].min())
-            
-            return high_price, low_price
-            
-        except Exception as e:
-            print(f"期間最高・最安値取得エラー: {str(e)}")
-            return None, None
+        price_context = PriceContext(stock_code, start_date, end_date)
+        return price_context.get_period_high_low_prices(start_date, end_date)
+
+    @staticmethod
+    def get_period_high_lows(
+        bars: pd.DataFrame, start_dates: np.ndarray, end_dates: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """各期間（両端を含む）の最高値・最安値を一括で計算（期間内にデータがない行はNaN）"""
+        index = bars.index
+        left = index.searchsorted(pd.DatetimeIndex(start_dates), side="left")
+        right = index.searchsorted(pd.DatetimeIndex(end_dates), side="right")
+        empty = right <= left
+
+        # reduceatは[left, right)ごとに集約するため、末尾に番兵を足して全ての位置を有効にする
+        boundaries = np.column_stack([left, right]).ravel()
+        high_values = np.append(bars["High"].to_numpy(dtype=float), np.nan)
+        low_values = np.append(bars["Low"].to_numpy(dtype=float), np.nan)
+        high = np.fmax.reduceat(high_values, boundaries)[::2]
+        low = np.fmin.reduceat(low_values, boundaries)[::2]
+
+        high[empty] = np.nan
+        low[empty] = np.nan
+        return high, low
+
+    @staticmethod
+    def _get_sample_high_low(buy_price: float, sell_price: float) -> Tuple[float, float]:
+        """サンプル銘柄の期間最高・最安値（簡単なシミュレーション：最高値は+2%、最安値は-1.5%）"""
+        return max(buy_price, sell_price) * 1.02, min(buy_price, sell_price) * 0.985
 
     @staticmethod
     def calculate_prediction_accuracy(
@@ -443,23 +355,206 @@ class StockAnalyzer:
         error_rate = abs(actual_price - predicted_price) / actual_price
         accuracy = max(0, (1 - error_rate) * 100)
         return accuracy
-        
+
+    @staticmethod
+    def calculate_prediction_accuracies(
+        actual_prices: ArrayLike, predicted_prices: ArrayLike
+    ) -> ArrayLike:
+        """予測精度を配列単位で計算（calculate_prediction_accuracyと同じ結果）"""
+        actual = np.asarray(actual_prices, dtype=float)
+        predicted = np.asarray(predicted_prices, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error_rates = np.abs(actual - predicted) / actual
+        # max(0, NaN)は0になるため、NaNを無視するfmaxで合わせる
+        accuracies = np.fmax(0.0, (1 - error_rates) * 100)
+        return _like(np.where(actual == 0, 0.0, accuracies), actual_prices)
+
     @staticmethod
     def calculate_overall_prediction_score(
         high_accuracy: float, low_accuracy: float, close_accuracy: float
     ) -> float:
         """総合予測スコアを計算（終値を重視）"""
-        # 終値予測を最も重視し、最高・最安値は補助的に考慮
-        weights = {
-            'close': 0.5,   # 終値予測の重み
-            'high': 0.25,   # 最高値予測の重み
-            'low': 0.25     # 最安値予測の重み
-        }
-        
+        weights = PREDICTION_SCORE_WEIGHTS
+
         score = (
             close_accuracy * weights['close'] +
             high_accuracy * weights['high'] +
             low_accuracy * weights['low']
         )
-        
+
         return round(score, 2)
+
+    @staticmethod
+    def calculate_overall_prediction_scores(
+        high_accuracies: ArrayLike, low_accuracies: ArrayLike, close_accuracies: ArrayLike
+    ) -> ArrayLike:
+        """総合予測スコアを配列単位で計算（calculate_overall_prediction_scoreと同じ結果）"""
+        weights = PREDICTION_SCORE_WEIGHTS
+        scores = (
+            np.asarray(close_accuracies, dtype=float) * weights["close"]
+            + np.asarray(high_accuracies, dtype=float) * weights["high"]
+            + np.asarray(low_accuracies, dtype=float) * weights["low"]
+        )
+        return _like(_round_like_builtin(scores, 2), close_accuracies)
+
+
+def _like(values: np.ndarray, template: ArrayLike) -> ArrayLike:
+    """入力がSeriesの場合は同じインデックスのSeriesとして返す"""
+    if isinstance(template, pd.Series):
+        return pd.Series(values, index=template.index)
+    return values
+
+
+def _round_like_builtin(values: np.ndarray, digits: int) -> np.ndarray:
+    """組み込みのround()と同じ結果になる配列の丸め
+
+    np.roundは10**digits倍してから丸めるため、ちょうど中間付近の値で
+    round()（10進での正確な丸め）と結果が異なることがある。
+    中間付近の値のみround()で計算し直す。
+    """
+    rounded = np.round(values, digits)
+    scaled = values * 10**digits
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for position in np.flatnonzero(near_half):
+        rounded.flat[position] = round(float(values.flat[position]), digits)
+    return rounded
+
+
+class PriceContext:
+    """1リクエスト内で1銘柄の株価系列を共有するコンテキスト
+
+    購入日・売却日の株価と期間中の最高・最安値を、1回の株価データ取得で求める
+    """
+
+    def __init__(self, stock_code: str, start_date: str, end_date: str):
+        self.stock_code = stock_code
+        self.is_sample = stock_code in SAMPLE_STOCK_CODES
+        self.data: Optional[pd.DataFrame] = None
+
+        if self.is_sample:
+            print(f"サンプルデータで処理: {stock_code}")
+            return
+
+        try:
+            start_ts = pd.Timestamp(start_date)
+            end_ts = pd.Timestamp(end_date)
+            window_start = pd.Timestamp(
+                TradingCalendar.shift_sessions(
+                    start_ts, -PRICE_CONTEXT_MARGIN_BUSINESS_DAYS
+                )
+            )
+            window_end = pd.Timestamp(
+                TradingCalendar.shift_sessions(end_ts, PRICE_CONTEXT_MARGIN_BUSINESS_DAYS)
+            )
+
+            print(f"株価データ取得開始: {stock_code}, 期間: {start_date} ~ {end_date}")
+            data = self._load_window(window_start, window_end)
+
+            # 臨時休場などで終了日以降の営業日が窓に含まれない場合のみ範囲を広げる
+            needs_wider = data is None or (
+                data.index[-1] < end_ts and window_end < pd.Timestamp.today()
+            )
+            if needs_wider:
+                print(f"前後の営業日が見つからないため取得範囲を拡大: {stock_code}")
+                wide_margin = timedelta(days=PRICE_CONTEXT_WIDE_MARGIN_DAYS)
+                data = self._load_window(start_ts - wide_margin, end_ts + wide_margin)
+
+            if data is None:
+                print(f"株価データが空またはNone: {stock_code}")
+                return
+
+            # タイムゾーン除去・日付順の整列済み（二分探索のため）
+            self.data = data
+            print(
+                f"取得したデータ期間: {self.data.index[0].strftime('%Y-%m-%d')} ~ {self.data.index[-1].strftime('%Y-%m-%d')}"
+            )
+            print(f"データポイント数: {len(self.data)}")
+        except Exception as e:
+            print(f"株価データ取得エラー: {str(e)}")
+            self.data = None
+
+    def _load_window(
+        self, window_start: pd.Timestamp, window_end: pd.Timestamp
+    ) -> Optional[pd.DataFrame]:
+        """指定範囲の株価データを取得（日付インデックスに整形済み）"""
+        data = StockAnalyzer.get_stock_data(
+            self.stock_code,
+            window_start.strftime("%Y-%m-%d"),
+            window_end.strftime("%Y-%m-%d"),
+        )
+        if data is None or data.empty:
+            return None
+        return PriceStore.normalize_bars(data)
+
+    def get_closest_business_day_price(
+        self, target_date: str
+    ) -> Tuple[Optional[float], Optional[str]]:
+        """指定日またはその直後の営業日の株価を取得"""
+        if self.is_sample:
+            return StockAnalyzer._get_sample_price(self.stock_code, target_date)
+
+        try:
+            if self.data is None or self.data.empty:
+                print(
+                    f"株価データが空またはNone: {self.stock_code} - サンプルデータでフォールバック"
+                )
+                return StockAnalyzer._get_sample_price(self.stock_code, target_date)
+
+            # 指定日以降の最初の営業日を二分探索
+            position = self.data.index.searchsorted(pd.Timestamp(target_date))
+
+            if position >= len(self.data):
+                # 指定日以降のデータがない場合、最後の営業日を使用
+                position = len(self.data) - 1
+                print(
+                    f"指定日以降のデータなし、最後の営業日を使用: {self.data.index[position].date()}"
+                )
+            else:
+                print(f"最も近い営業日: {self.data.index[position].date()}")
+
+            closest_date_str = self.data.index[position].strftime("%Y-%m-%d")
+            price = float(self.data["Close"].iloc[position])
+            print(f"取得した株価: ¥{price:,.2f} ({closest_date_str})")
+
+            return price, closest_date_str
+
+        except Exception as e:
+            print(f"株価取得エラー: {str(e)}")
+            print(f"サンプルデータでフォールバック: {self.stock_code}")
+            return StockAnalyzer._get_sample_price(self.stock_code, target_date)
+
+    def get_period_high_low_prices(
+        self, start_date: str, end_date: str
+    ) -> Tuple[Optional[float], Optional[float]]:
+        """期間中の最高値と最安値を取得"""
+        try:
+            # サンプルデータの場合
+            if self.is_sample:
+                # 簡単なシミュレーションで最高・最安値を生成
+                buy_price, _ = self.get_closest_business_day_price(start_date)
+                sell_price, _ = self.get_closest_business_day_price(end_date)
+
+                if buy_price is None or sell_price is None:
+                    return None, None
+
+                return StockAnalyzer._get_sample_high_low(buy_price, sell_price)
+
+            if self.data is None or self.data.empty:
+                return None, None
+
+            # 期間の両端を二分探索で切り出す
+            left = self.data.index.searchsorted(pd.Timestamp(start_date), side="left")
+            right = self.data.index.searchsorted(pd.Timestamp(end_date), side="right")
+            period_data = self.data.iloc[left:right]
+
+            if period_data.empty:
+                return None, None
+
+            high_price = float(period_data["High"].max())
+            low_price = float(period_data["Low"].min())
+
+            return high_price, low_price
+
+        except Exception as e:
+            print(f"期間最高・最安値取得エラー: {str(e)}")
+            return None, None
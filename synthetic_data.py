@@ -0,0 +1,136 @@
+"""
+合成株価データ生成
+サンプル銘柄や負荷試験用に、東証の営業日に沿った日次OHLCVをベクトル演算で生成する
+"""
+
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from trading_calendar import TradingCalendar
+
+# 銘柄別の基本価格設定
+SAMPLE_BASE_PRICES = {
+    "7203": 2500,  # トヨタ
+    "6758": 12000,  # ソニー
+    "9984": 35000,  # ソフトバンク
+    "8306": 800,  # 三菱UFJ
+    "4502": 4500,  # 武田薬品
+    "1234": 1500,  # テスト銘柄1
+    "5678": 3000,  # テスト銘柄2
+}
+DEFAULT_BASE_PRICE = 1000
+
+# 日次リターンの平均・標準偏差
+DAILY_RETURN_MEAN = 0.001
+DAILY_RETURN_STD = 0.02
+
+# 基本価格に対する下限（これより下がらないようにクリップ）
+PRICE_FLOOR_RATIO = 0.5
+
+DEFAULT_SEED = 0
+
+
+class SyntheticPrices:
+    """合成株価データの生成"""
+
+    @staticmethod
+    def generate(
+        stock_codes: List[str],
+        start_date: str,
+        end_date: str,
+        seed: int = DEFAULT_SEED,
+    ) -> Dict[str, pd.DataFrame]:
+        """複数銘柄の日次OHLCVを生成（銘柄ごとに独立した再現可能な乱数列を使用）"""
+        sessions = pd.DatetimeIndex(
+            TradingCalendar.sessions_between(start_date, end_date)
+        )
+        return {
+            stock_code: pd.DataFrame(
+                SyntheticPrices._generate_arrays(stock_code, len(sessions), seed),
+                index=sessions,
+            )
+            for stock_code in stock_codes
+        }
+
+    @staticmethod
+    def generate_long(
+        stock_codes: List[str],
+        start_date: str,
+        end_date: str,
+        seed: int = DEFAULT_SEED,
+    ) -> pd.DataFrame:
+        """複数銘柄の日次OHLCVを縦持ち（stock_code, date, Open...）で生成"""
+        sessions = TradingCalendar.sessions_between(start_date, end_date)
+        columns: Dict[str, List[np.ndarray]] = {}
+        for stock_code in stock_codes:
+            arrays = SyntheticPrices._generate_arrays(stock_code, len(sessions), seed)
+            for column, values in arrays.items():
+                columns.setdefault(column, []).append(values)
+
+        data = pd.DataFrame(
+            {
+                "stock_code": np.repeat(
+                    np.asarray(stock_codes, dtype=object), len(sessions)
+                ),
+                "date": np.tile(sessions, len(stock_codes)),
+            }
+        )
+        for column, values in columns.items():
+            data[column] = np.concatenate(values)
+        return data
+
+    @staticmethod
+    def symbol_rng(
+        stock_code: str, seed: int = DEFAULT_SEED, stream: int = 0
+    ) -> np.random.Generator:
+        """銘柄ごとの乱数生成器（他の銘柄の有無に関係なく同じ系列になる）
+
+        streamは列ごとの系列番号。列ごとに独立した系列を使うことで、
+        生成する日数が変わっても先頭からの値は変わらない。
+        """
+        return np.random.default_rng(
+            [seed, zlib.crc32(stock_code.encode("utf-8")), stream]
+        )
+
+    @staticmethod
+    def base_price(stock_code: str) -> float:
+        """銘柄の基本価格"""
+        return SAMPLE_BASE_PRICES.get(stock_code, DEFAULT_BASE_PRICE)
+
+    @staticmethod
+    def _generate_arrays(
+        stock_code: str, length: int, seed: int
+    ) -> Dict[str, np.ndarray]:
+        """1銘柄分のOHLCV配列を生成"""
+        returns_rng, open_rng, high_rng, low_rng, volume_rng = (
+            SyntheticPrices.symbol_rng(stock_code, seed, stream) for stream in range(5)
+        )
+        base_price = SyntheticPrices.base_price(stock_code)
+
+        # ランダムウォーク（初日は基本価格、以降は日次リターンの累積積）
+        returns = returns_rng.normal(DAILY_RETURN_MEAN, DAILY_RETURN_STD, length)
+        if length:
+            returns[0] = 0.0
+        close = np.maximum(
+            base_price * np.cumprod(1 + returns), base_price * PRICE_FLOOR_RATIO
+        )
+
+        open_ = close * open_rng.uniform(0.99, 1.01, length)
+        high = close * high_rng.uniform(1.00, 1.03, length)
+        low = close * low_rng.uniform(0.97, 1.00, length)
+        volume = volume_rng.integers(100000, 1000000, length)
+
+        # HighがOpen/Closeより低く、LowがOpen/Closeより高くならないよう調整
+        high = np.maximum.reduce([open_, close, high])
+        low = np.minimum.reduce([open_, close, low])
+
+        return {
+            "Open": open_,
+            "High": high,
+            "Low": low,
+            "Close": close,
+            "Volume": volume,
+        }
@@ -0,0 +1,528 @@
+"""
+合成分析履歴の生成
+負荷試験・規模の検証用に、本番に近い固定銘柄分析・銘柄選定分析の行を
+ベクトル演算で生成し、PostgreSQLではCOPYで一括投入する（その他のDBは複数行INSERT）
+
+同じシード・行数・週数であれば常に同じデータを生成する。
+- モデル: ai_modelsに登録済みのモデルから、モデルごとに偏りのある比率で選ぶ
+- 日付: 週次運用と同じく週末に実行し、翌営業日に購入（固定銘柄分析は週末に売却）
+- 騰落率: モデルごとの得意・不得意を含む裾の重い分布
+- 選定理由: 数百文字の長文
+
+コマンドラインから実行:
+    python synthetic_history.py [--fixed-rows 500000] [--selection-rows 500000]
+                                [--seed 0] [--weeks 156] [--start-date 2023-01-02]
+                                [--truncate]
+"""
+
+import argparse
+import io
+import time
+from typing import Dict, Iterator, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, insert, text
+
+from batch_ingest import ANALYSIS_PERIOD_DAYS
+from database import (
+    DatabaseManager,
+    FixedStockAnalysis,
+    StockSelectionAnalysis,
+    engine,
+)
+from stock_analyzer import StockAnalyzer
+from trading_calendar import TradingCalendar
+
+DEFAULT_SEED = 0
+
+# 生成する期間（週数）と最初の週の月曜日
+DEFAULT_WEEKS = 156
+DEFAULT_START_DATE = "2023-01-02"
+
+# 1回に生成・投入する行数（シードが同じでも値が変わるため変更しないこと）
+GENERATE_CHUNK_SIZE = 200000
+
+# 複数行INSERTの1回あたりの行数（COPYを使えない場合）
+INSERT_CHUNK_SIZE = 10000
+
+# 銘柄数（LLMがよく選ぶ銘柄ほど多く出現する）
+STOCK_UNIVERSE_SIZE = 500
+
+# 選定理由の種類数
+REASON_POOL_SIZE = 2048
+
+# 銘柄選定分析の分析期間の比率（週次運用のため1週間が中心）
+ANALYSIS_PERIOD_WEIGHTS = {
+    "1週間": 0.6,
+    "1ヶ月": 0.2,
+    "3ヶ月": 0.1,
+    "6ヶ月": 0.06,
+    "1年": 0.04,
+}
+
+# 日次リターンの標準偏差
+DAILY_VOLATILITY = 0.02
+
+# 保有期間のリターンの範囲（-90%〜+400%、対数）
+MIN_LOG_RETURN = np.log(0.1)
+MAX_LOG_RETURN = np.log(5.0)
+
+# 乱数系列の番号（テーブル・用途ごとに独立させる）
+UNIVERSE_STREAM = 0
+FIXED_STREAM = 1
+SELECTION_STREAM = 2
+
+# 選定理由の文章の部品
+REASON_FRAGMENTS = [
+    "直近の決算で営業利益が市場予想を上回り、通期業績の上方修正余地がある。",
+    "為替が円安方向に推移しており、海外売上比率の高さが追い風になる。",
+    "半導体関連の設備投資が回復局面に入り、受注残が積み上がっている。",
+    "株主還元方針の強化により、配当利回りと自社株買いの下支えが期待できる。",
+    "PBRが1倍を割り込んでおり、資本効率改善の取り組みが評価される可能性が高い。",
+    "生成AI向けの需要拡大でデータセンター関連の引き合いが強い。",
+    "インバウンド需要の回復が続き、国内消費関連の売上が伸びている。",
+    "原材料価格の下落により、来期にかけて利益率の改善が見込まれる。",
+    "中期経営計画で新規事業の収益化時期が明確になった。",
+    "信用買い残が減少しており、需給面での重しが軽くなっている。",
+    "テクニカル面では25日移動平均線を上抜け、上昇トレンドへの転換が示唆される。",
+    "同業他社と比べて割安な水準にあり、見直し買いが入りやすい。",
+    "金利上昇局面で利ざやの改善が見込まれ、業績の上振れ余地がある。",
+    "海外投資家の買い越しが続いており、大型株に資金が流入している。",
+    "政策支援の対象分野であり、補助金による需要の押し上げが期待できる。",
+    "新製品の販売が好調で、今四半期の売上高は過去最高を更新する見込み。",
+    "一方で、景気減速による受注の先送りには注意が必要である。",
+    "ただし、為替が円高に振れた場合は業績予想の下方修正リスクがある。",
+    "来週の指標発表を控えて値動きが大きくなる可能性がある。",
+    "以上から、短期的な上昇余地が大きいと判断した。",
+]
+
+# 選定理由1件あたりの部品数
+REASON_FRAGMENTS_MIN = 6
+REASON_FRAGMENTS_MAX = 24
+
+
+class _Universe(NamedTuple):
+    """全チャンクで共通のモデル・銘柄の設定"""
+
+    model_ids: np.ndarray
+    model_weights: np.ndarray
+    model_drift: np.ndarray  # モデルごとの日次リターンの偏り（得意・不得意）
+    model_error: np.ndarray  # モデルごとの株価予測の誤差（標準偏差の比率）
+    stock_codes: np.ndarray
+    stock_weights: np.ndarray
+    stock_prices: np.ndarray
+    reasons: np.ndarray
+
+
+class SyntheticHistory:
+    """合成分析履歴の生成と一括投入"""
+
+    @staticmethod
+    def populate(
+        fixed_rows: int,
+        selection_rows: int,
+        seed: int = DEFAULT_SEED,
+        weeks: int = DEFAULT_WEEKS,
+        start_date: str = DEFAULT_START_DATE,
+        truncate: bool = False,
+    ) -> None:
+        """合成データを生成して投入し、モデル別集計を作り直す"""
+        if truncate:
+            SyntheticHistory.truncate()
+
+        model_ids = [model["model_code"] for model in DatabaseManager.get_ai_models()]
+        universe = SyntheticHistory.build_universe(model_ids, seed)
+
+        for model, frames in (
+            (
+                FixedStockAnalysis,
+                SyntheticHistory.generate_fixed(
+                    universe, fixed_rows, seed, weeks, start_date
+                ),
+            ),
+            (
+                StockSelectionAnalysis,
+                SyntheticHistory.generate_selection(
+                    universe, selection_rows, seed, weeks, start_date
+                ),
+            ),
+        ):
+            started = time.perf_counter()
+            loaded = 0
+            for frame in frames:
+                SyntheticHistory.load(model, frame)
+                loaded += len(frame)
+            if loaded:
+                print(
+                    f"{model.__tablename__}: {loaded}件を投入しました"
+                    f" ({time.perf_counter() - started:.1f}秒)"
+                )
+
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as connection:
+                connection.execute(text("ANALYZE fixed_stock_analysis"))
+                connection.execute(text("ANALYZE stock_selection_analysis"))
+
+        DatabaseManager.rebuild_model_performance_summary()
+
+    @staticmethod
+    def truncate() -> None:
+        """分析データを全件削除"""
+        with engine.begin() as connection:
+            if engine.dialect.name == "postgresql":
+                connection.execute(
+                    text(
+                        "TRUNCATE fixed_stock_analysis, stock_selection_analysis"
+                        " RESTART IDENTITY"
+                    )
+                )
+            else:
+                connection.execute(delete(FixedStockAnalysis))
+                connection.execute(delete(StockSelectionAnalysis))
+        print("分析データを削除しました")
+
+    @staticmethod
+    def build_universe(model_ids: List[str], seed: int = DEFAULT_SEED) -> _Universe:
+        """モデルの出現比率・予測の癖、銘柄、選定理由の候補を生成"""
+        if not model_ids:
+            raise ValueError("AIモデルが登録されていません")
+
+        rng = np.random.default_rng([seed, UNIVERSE_STREAM])
+        model_count = len(model_ids)
+
+        stock_codes = rng.choice(
+            np.arange(1300, 10000), STOCK_UNIVERSE_SIZE, replace=False
+        ).astype(str)
+        # 出現頻度は順位の逆数に比例（人気銘柄に集中する）
+        stock_weights = 1.0 / np.arange(1, STOCK_UNIVERSE_SIZE + 1)
+
+        fragments = np.asarray(REASON_FRAGMENTS, dtype=object)
+        reasons = np.asarray(
+            [
+                "".join(
+                    rng.choice(
+                        fragments,
+                        rng.integers(REASON_FRAGMENTS_MIN, REASON_FRAGMENTS_MAX + 1),
+                    )
+                )
+                for _ in range(REASON_POOL_SIZE)
+            ],
+            dtype=object,
+        )
+
+        return _Universe(
+            model_ids=np.asarray(model_ids, dtype=object),
+            model_weights=rng.dirichlet(np.full(model_count, 2.0)),
+            model_drift=rng.normal(0.0, 0.001, model_count),
+            model_error=rng.uniform(0.01, 0.06, model_count),
+            stock_codes=stock_codes,
+            stock_weights=stock_weights / stock_weights.sum(),
+            stock_prices=np.exp(rng.uniform(np.log(200), np.log(50000), STOCK_UNIVERSE_SIZE)),
+            reasons=reasons,
+        )
+
+    @staticmethod
+    def generate_fixed(
+        universe: _Universe,
+        count: int,
+        seed: int = DEFAULT_SEED,
+        weeks: int = DEFAULT_WEEKS,
+        start_date: str = DEFAULT_START_DATE,
+    ) -> Iterator[pd.DataFrame]:
+        """固定銘柄分析の行をチャンクごとのDataFrameとして生成"""
+        for chunk_index, offset in enumerate(range(0, count, GENERATE_CHUNK_SIZE)):
+            size = min(GENERATE_CHUNK_SIZE, count - offset)
+            rng = np.random.default_rng([seed, FIXED_STREAM, chunk_index])
+            columns, models = SyntheticHistory._base_columns(
+                rng, universe, offset, size, count, weeks, start_date
+            )
+
+            # 週初めに購入し、同じ週の最終営業日に売却
+            sell_dates = TradingCalendar.prev_session(
+                columns["week_start"] + np.timedelta64(4, "D")
+            )
+            sell_dates = np.maximum(sell_dates, columns["buy_dates"])
+            buy_price, sell_price = SyntheticHistory._prices(
+                rng, universe, columns, models, sell_dates
+            )
+
+            # 期間中の最高・最安値は購入・売却価格の外側に出る
+            actual_high = np.round(
+                np.maximum(buy_price, sell_price)
+                * (1 + np.abs(rng.normal(0, DAILY_VOLATILITY, size))),
+                1,
+            )
+            actual_low = np.round(
+                np.minimum(buy_price, sell_price)
+                * (1 - np.abs(rng.normal(0, DAILY_VOLATILITY, size))),
+                1,
+            )
+
+            # モデルごとの誤差で予測し、最安値 <= 終値 <= 最高値の順に並べ直す
+            error = universe.model_error[models][:, None]
+            predictions = np.sort(
+                np.column_stack([actual_low, sell_price, actual_high])
+                * (1 + rng.normal(0, 1, (size, 3)) * error),
+                axis=1,
+            ).round(1)
+            predicted_low, predicted_close, predicted_high = predictions.T
+
+            close_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+                sell_price, predicted_close
+            )
+            high_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+                actual_high, predicted_high
+            )
+            low_accuracy = StockAnalyzer.calculate_prediction_accuracies(
+                actual_low, predicted_low
+            )
+
+            yield SyntheticHistory._frame(
+                columns,
+                {
+                    "buy_date": columns["buy_dates"],
+                    "buy_price": buy_price,
+                    "sell_date": sell_dates,
+                    "sell_price": sell_price,
+                    "predicted_high": predicted_high,
+                    "predicted_low": predicted_low,
+                    "predicted_close": predicted_close,
+                    "actual_high": actual_high,
+                    "actual_low": actual_low,
+                    "predicted_price": predicted_close,
+                    "profit_loss": sell_price - buy_price,
+                    "return_rate": StockAnalyzer.calculate_return_rates(
+                        buy_price, sell_price
+                    ),
+                    "prediction_accuracy": close_accuracy,
+                    "high_prediction_accuracy": high_accuracy,
+                    "low_prediction_accuracy": low_accuracy,
+                    "overall_prediction_score": StockAnalyzer.calculate_overall_prediction_scores(
+                        high_accuracy, low_accuracy, close_accuracy
+                    ),
+                    "period_days": TradingCalendar.period_days(
+                        columns["buy_dates"], sell_dates
+                    ),
+                },
+            )
+
+    @staticmethod
+    def generate_selection(
+        universe: _Universe,
+        count: int,
+        seed: int = DEFAULT_SEED,
+        weeks: int = DEFAULT_WEEKS,
+        start_date: str = DEFAULT_START_DATE,
+    ) -> Iterator[pd.DataFrame]:
+        """銘柄選定分析の行をチャンクごとのDataFrameとして生成"""
+        periods = np.asarray(list(ANALYSIS_PERIOD_WEIGHTS), dtype=object)
+        period_days = np.asarray([ANALYSIS_PERIOD_DAYS[period] for period in periods])
+        period_weights = np.asarray(list(ANALYSIS_PERIOD_WEIGHTS.values()))
+
+        for chunk_index, offset in enumerate(range(0, count, GENERATE_CHUNK_SIZE)):
+            size = min(GENERATE_CHUNK_SIZE, count - offset)
+            rng = np.random.default_rng([seed, SELECTION_STREAM, chunk_index])
+            columns, models = SyntheticHistory._base_columns(
+                rng, universe, offset, size, count, weeks, start_date
+            )
+
+            # 分析期間後の日付（休日の場合は直後の営業日）に売却
+            period_index = rng.choice(len(periods), size, p=period_weights)
+            sell_dates = TradingCalendar.next_session(
+                columns["buy_dates"] + period_days[period_index].astype("timedelta64[D]")
+            )
+            buy_price, sell_price = SyntheticHistory._prices(
+                rng, universe, columns, models, sell_dates
+            )
+
+            yield SyntheticHistory._frame(
+                columns,
+                {
+                    "analysis_period": periods[period_index],
+                    "selection_reason": universe.reasons[
+                        rng.integers(0, len(universe.reasons), size)
+                    ],
+                    "buy_date": columns["buy_dates"],
+                    "buy_price": buy_price,
+                    "sell_date": sell_dates,
+                    "sell_price": sell_price,
+                    "profit_loss": sell_price - buy_price,
+                    "return_rate": StockAnalyzer.calculate_return_rates(
+                        buy_price, sell_price
+                    ),
+                    "period_days": TradingCalendar.period_days(
+                        columns["buy_dates"], sell_dates
+                    ),
+                },
+            )
+
+    @staticmethod
+    def load(model, frame: pd.DataFrame) -> None:
+        """DataFrameをテーブルに一括投入（PostgreSQLはCOPY、その他は複数行INSERT）"""
+        if frame.empty:
+            return
+        if engine.dialect.name == "postgresql":
+            SyntheticHistory._copy(model, frame)
+            return
+
+        for offset in range(0, len(frame), INSERT_CHUNK_SIZE):
+            chunk = frame.iloc[offset : offset + INSERT_CHUNK_SIZE]
+            records = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+            with engine.begin() as connection:
+                connection.execute(insert(model), records)
+
+    @staticmethod
+    def _copy(model, frame: pd.DataFrame) -> None:
+        """COPY FROM STDIN（CSV形式）で投入"""
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False, na_rep="\\N")
+        buffer.seek(0)
+
+        columns = ", ".join(frame.columns)
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {model.__tablename__} ({columns}) FROM STDIN"
+                    " WITH (FORMAT csv, NULL '\\N')",
+                    buffer,
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _base_columns(
+        rng: np.random.Generator,
+        universe: _Universe,
+        offset: int,
+        size: int,
+        count: int,
+        weeks: int,
+        start_date: str,
+    ):
+        """実行日時・モデル・銘柄・購入日（両テーブル共通）"""
+        # 行の順番に週を割り当て、IDと作成日時の順序を本番と揃える
+        week = (np.arange(offset, offset + size) * weeks) // max(count, 1)
+        week_start = np.datetime64(start_date, "D") + (week * 7).astype("timedelta64[D]")
+
+        # 週末（土日）に実行し、数分以内に保存
+        execution_date = (
+            week_start.astype("datetime64[s]")
+            - np.timedelta64(2, "D")
+            + np.sort(rng.integers(0, 2 * 24 * 3600, size)).astype("timedelta64[s]")
+        )
+        created_at = execution_date + rng.integers(0, 600, size).astype(
+            "timedelta64[s]"
+        )
+
+        models = rng.choice(len(universe.model_ids), size, p=universe.model_weights)
+        stocks = rng.choice(len(universe.stock_codes), size, p=universe.stock_weights)
+        return (
+            {
+                "week_start": week_start,
+                "execution_date": execution_date,
+                "created_at": created_at,
+                "model_id": universe.model_ids[models],
+                "stock_code": universe.stock_codes[stocks],
+                "stocks": stocks,
+                "buy_dates": TradingCalendar.next_session(week_start),
+            },
+            models,
+        )
+
+    @staticmethod
+    def _prices(
+        rng: np.random.Generator,
+        universe: _Universe,
+        columns: Dict,
+        models: np.ndarray,
+        sell_dates: np.ndarray,
+    ):
+        """購入・売却価格（保有営業日数に応じた裾の重いリターン）"""
+        size = len(models)
+        buy_price = np.round(
+            universe.stock_prices[columns["stocks"]]
+            * np.exp(rng.normal(0, 0.2, size)),
+            1,
+        )
+        sessions = np.maximum(
+            TradingCalendar.session_count(columns["buy_dates"], sell_dates) - 1, 1
+        )
+        # 自由度4のt分布（分散が1になるよう調整）で急騰・急落を含める
+        shocks = rng.standard_t(4, size) / np.sqrt(2)
+        log_returns = (
+            universe.model_drift[models] * sessions
+            + DAILY_VOLATILITY * np.sqrt(sessions) * shocks
+        ).clip(MIN_LOG_RETURN, MAX_LOG_RETURN)
+        sell_price = np.round(buy_price * np.exp(log_returns), 1)
+        return buy_price, sell_price
+
+    @staticmethod
+    def _frame(columns: Dict, values: Dict) -> pd.DataFrame:
+        """テーブルの列順のDataFrameを作成（日付列は保存形式のYYYY-MM-DD文字列にする）"""
+        for name in ("buy_date", "sell_date"):
+            values[name] = np.datetime_as_string(values[name], unit="D")
+        return pd.DataFrame(
+            {
+                "execution_date": columns["execution_date"],
+                "model_id": columns["model_id"],
+                "stock_code": columns["stock_code"],
+                **values,
+                "notes": "",
+                "created_at": columns["created_at"],
+            }
+        )
+
+
+def main() -> None:
+    """コマンドラインから合成分析履歴を投入"""
+    parser = argparse.ArgumentParser(
+        description="負荷試験用の合成分析履歴を生成して一括投入"
+    )
+    parser.add_argument(
+        "--fixed-rows", type=int, default=500000, help="固定銘柄分析の行数"
+    )
+    parser.add_argument(
+        "--selection-rows", type=int, default=500000, help="銘柄選定分析の行数"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=DEFAULT_SEED, help="乱数シード"
+    )
+    parser.add_argument(
+        "--weeks",
+        type=int,
+        default=DEFAULT_WEEKS,
+        help=f"生成する期間の週数（デフォルト: {DEFAULT_WEEKS}）",
+    )
+    parser.add_argument(
+        "--start-date",
+        default=DEFAULT_START_DATE,
+        help=f"最初の週の月曜日（デフォルト: {DEFAULT_START_DATE}）",
+    )
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="投入前に既存の分析データを全件削除",
+    )
+    args = parser.parse_args()
+
+    DatabaseManager.init_database()
+    started = time.perf_counter()
+    SyntheticHistory.populate(
+        fixed_rows=args.fixed_rows,
+        selection_rows=args.selection_rows,
+        seed=args.seed,
+        weeks=args.weeks,
+        start_date=args.start_date,
+        truncate=args.truncate,
+    )
+    print(f"✅ 合成分析履歴の投入が完了しました ({time.perf_counter() - started:.1f}秒)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+取引カレンダー
+東証（JPX）の営業日を祝日・年末年始休業を含めて事前計算し、配列の二分探索で日付を解決する
+"""
+
+import os
+from datetime import date, time, timedelta
+from functools import lru_cache
+from typing import List, Set, Union
+
+import numpy as np
+import pandas as pd
+
+# カレンダーを作成する年の範囲
+CALENDAR_START_YEAR = int(os.getenv("TRADING_CALENDAR_START_YEAR", "2000"))
+CALENDAR_END_YEAR = int(
+    os.getenv("TRADING_CALENDAR_END_YEAR", str(date.today().year + 2))
+)
+
+DateLike = Union[str, date, np.datetime64, pd.Timestamp]
+
+# 東証の取引終了時刻（この時刻以降は当日の日足が確定したとみなす）
+MARKET_TIMEZONE = "Asia/Tokyo"
+MARKET_CLOSE_TIME = time(15, 30)
+
+
+def _nth_monday(year: int, month: int, n: int) -> date:
+    """指定月の第n月曜日"""
+    first = date(year, month, 1)
+    offset = (7 - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _vernal_equinox_day(year: int) -> date:
+    """春分の日（1980〜2099年の近似式）"""
+    day = int(20.8431 + 0.242194 * (year - 1980) - int((year - 1980) / 4))
+    return date(year, 3, day)
+
+
+def _autumnal_equinox_day(year: int) -> date:
+    """秋分の日（1980〜2099年の近似式）"""
+    day = int(23.2488 + 0.242194 * (year - 1980) - int((year - 1980) / 4))
+    return date(year, 9, day)
+
+
+def japanese_holidays(year: int) -> Set[date]:
+    """指定年の国民の祝日・振替休日・国民の休日を計算"""
+    holidays = {
+        date(year, 1, 1),  # 元日
+        date(year, 2, 11),  # 建国記念の日
+        _vernal_equinox_day(year),  # 春分の日
+        date(year, 4, 29),  # 昭和の日
+        date(year, 5, 3),  # 憲法記念日
+        date(year, 5, 4),  # みどりの日
+        date(year, 5, 5),  # こどもの日
+        _autumnal_equinox_day(year),  # 秋分の日
+        date(year, 11, 3),  # 文化の日
+        date(year, 11, 23),  # 勤労感謝の日
+        _nth_monday(year, 1, 2),  # 成人の日
+        _nth_monday(year, 9, 3),  # 敬老の日
+    }
+
+    if year >= 2020:
+        holidays.add(date(year, 2, 23))  # 天皇誕生日
+    elif 1989 <= year <= 2018:
+        holidays.add(date(year, 12, 23))  # 天皇誕生日（平成）
+
+    # 東京オリンピック・パラリンピックに伴う移動
+    if year == 2020:
+        holidays |= {date(2020, 7, 23), date(2020, 7, 24), date(2020, 8, 10)}
+    elif year == 2021:
+        holidays |= {date(2021, 7, 22), date(2021, 7, 23), date(2021, 8, 8)}
+    else:
+        holidays.add(_nth_monday(year, 7, 3))  # 海の日
+        holidays.add(_nth_monday(year, 10, 2))  # スポーツの日（体育の日）
+        if year >= 2016:
+            holidays.add(date(year, 8, 11))  # 山の日
+
+    # 天皇の即位に伴う休日
+    if year == 2019:
+        holidays |= {date(2019, 5, 1), date(2019, 10, 22)}
+
+    # 国民の休日（祝日に挟まれた平日）
+    for holiday in sorted(holidays):
+        between = holiday + timedelta(days=1)
+        if (
+            between + timedelta(days=1) in holidays
+            and between not in holidays
+            and between.weekday() != 6
+        ):
+            holidays.add(between)
+
+    # 振替休日（日曜日の祝日の後の最初の平日。2006年以前は翌日のみ）
+    for holiday in sorted(holidays):
+        if holiday.weekday() == 6:
+            substitute = holiday + timedelta(days=1)
+            while substitute in holidays and year >= 2007:
+                substitute += timedelta(days=1)
+            if substitute not in holidays:
+                holidays.add(substitute)
+
+    return holidays
+
+
+def jpx_closed_days(year: int) -> Set[date]:
+    """東証の休業日（土日を除く）: 祝日と年末年始（12/31〜1/3）"""
+    return japanese_holidays(year) | {
+        date(year, 1, 2),
+        date(year, 1, 3),
+        date(year, 12, 31),
+    }
+
+
+@lru_cache(maxsize=1)
+def _session_array() -> np.ndarray:
+    """カレンダー範囲内の全営業日（datetime64[D]の昇順配列）"""
+    closed_days = set()
+    for year in range(CALENDAR_START_YEAR, CALENDAR_END_YEAR + 1):
+        closed_days |= jpx_closed_days(year)
+
+    days = np.arange(
+        np.datetime64(f"{CALENDAR_START_YEAR}-01-01"),
+        np.datetime64(f"{CALENDAR_END_YEAR + 1}-01-01"),
+        dtype="datetime64[D]",
+    )
+    holidays = np.array(sorted(closed_days), dtype="datetime64[D]")
+    return days[np.is_busday(days, holidays=holidays)]
+
+
+class TradingCalendar:
+    """東証の営業日カレンダー
+
+    日付の引数は文字列・date・datetime64のいずれか、またはその配列を受け付け、
+    配列を渡した場合は一括で（ループせずに）解決する。
+    """
+
+    @staticmethod
+    def sessions() -> np.ndarray:
+        """全営業日の配列"""
+        return _session_array()
+
+    @staticmethod
+    def is_session(dates) -> Union[bool, np.ndarray]:
+        """営業日かどうか"""
+        values = TradingCalendar._to_days(dates)
+        sessions = _session_array()
+        positions = np.searchsorted(sessions, values).clip(max=len(sessions) - 1)
+        result = sessions[positions] == values
+        return result if np.ndim(result) else bool(result)
+
+    @staticmethod
+    def next_session(dates) -> Union[np.datetime64, np.ndarray]:
+        """指定日またはその直後の営業日"""
+        sessions = _session_array()
+        positions = np.searchsorted(sessions, TradingCalendar._to_days(dates))
+        return sessions[positions.clip(max=len(sessions) - 1)]
+
+    @staticmethod
+    def prev_session(dates) -> Union[np.datetime64, np.ndarray]:
+        """指定日またはその直前の営業日"""
+        sessions = _session_array()
+        positions = (
+            np.searchsorted(sessions, TradingCalendar._to_days(dates), side="right")
+            - 1
+        )
+        return sessions[positions.clip(min=0)]
+
+    @staticmethod
+    def last_completed_session() -> date:
+        """日足が確定している直近の営業日（当日は取引終了後のみ含める）"""
+        now = pd.Timestamp.now(tz=MARKET_TIMEZONE)
+        today = now.date()
+        if now.time() < MARKET_CLOSE_TIME:
+            today -= timedelta(days=1)
+        return pd.Timestamp(TradingCalendar.prev_session(today)).date()
+
+    @staticmethod
+    def shift_sessions(dates, sessions_count: int) -> Union[np.datetime64, np.ndarray]:
+        """指定日から営業日数だけ前後にずらした営業日
+
+        正の値は指定日以降の最初の営業日から、負の値は指定日以前の最後の営業日から数える。
+        """
+        sessions = _session_array()
+        values = TradingCalendar._to_days(dates)
+        if sessions_count >= 0:
+            positions = np.searchsorted(sessions, values) + sessions_count
+        else:
+            positions = (
+                np.searchsorted(sessions, values, side="right") - 1 + sessions_count
+            )
+        return sessions[np.clip(positions, 0, len(sessions) - 1)]
+
+    @staticmethod
+    def sessions_between(start: DateLike, end: DateLike) -> np.ndarray:
+        """開始日〜終了日（両端を含む）の営業日"""
+        sessions = _session_array()
+        left = np.searchsorted(sessions, TradingCalendar._to_days(start))
+        right = np.searchsorted(
+            sessions, TradingCalendar._to_days(end), side="right"
+        )
+        return sessions[left:right]
+
+    @staticmethod
+    def session_count(start, end) -> Union[int, np.ndarray]:
+        """開始日〜終了日（両端を含む）の営業日数"""
+        sessions = _session_array()
+        left = np.searchsorted(sessions, TradingCalendar._to_days(start))
+        right = np.searchsorted(
+            sessions, TradingCalendar._to_days(end), side="right"
+        )
+        count = (right - left).clip(min=0)
+        return count if np.ndim(count) else int(count)
+
+    @staticmethod
+    def period_days(start, end) -> Union[int, np.ndarray]:
+        """保有期間の日数（開始日から終了日までの暦日数）"""
+        days = (
+            TradingCalendar._to_days(end) - TradingCalendar._to_days(start)
+        ).astype(int)
+        return days if np.ndim(days) else int(days)
+
+    @staticmethod
+    def to_strings(dates) -> Union[str, List[str]]:
+        """datetime64をYYYY-MM-DD形式の文字列に変換"""
+        values = np.datetime_as_string(np.asarray(dates, dtype="datetime64[D]"))
+        return values.tolist()
+
+    @staticmethod
+    def _to_days(dates) -> Union[np.datetime64, np.ndarray]:
+        """日付（または日付の配列）をdatetime64[D]に変換"""
+        if isinstance(dates, (str, date, np.datetime64, pd.Timestamp)):
+            return np.datetime64(pd.Timestamp(dates).date(), "D")
+        return pd.DatetimeIndex(dates).values.astype("datetime64[D]")